@@ -3,6 +3,7 @@ import datetime
 import random
 
 from src.lib import set_log_level, LogLevel
+from src.tide_cache import TableCache
 from src.tide_closest_hw import find_closest_high_water
 from src.tide_height_intervals import determine_min_water_height_interval, \
 	determine_max_water_height_intervals
@@ -19,6 +20,7 @@ if __name__ == '__main__':
 		description="PyTide: Generate realistic tide tables, curves.  "
 					"Solve common tide problems")
 	ap.add_argument("-v", action='store_true', help="Be more verbose, helps debugging problems")
+	ap.add_argument("--cache-dir", help="Cache the generated tide tables in this directory")
 	args = ap.parse_args()
 	set_log_level(LogLevel.INFO)
 	if args.v:
@@ -26,9 +28,13 @@ if __name__ == '__main__':
 
 	cycle_length = random.randint(7, 9)
 	start_date = reset_day() + datetime.timedelta(hours=3, minutes=10)
-	tide_days = generate_tide_days(start_date=start_date, cycle_length=cycle_length,
-								   time_delta=datetime.timedelta(hours=6, minutes=20), min_water_factor=2,
-								   max_water_factor=5)
+	generation_params = dict(start_date=start_date, cycle_length=cycle_length,
+							 time_delta=datetime.timedelta(hours=6, minutes=20), min_water_factor=2,
+							 max_water_factor=5)
+	if args.cache_dir:
+		tide_days = TableCache(args.cache_dir).generate_tide_table(**generation_params)
+	else:
+		tide_days = generate_tide_days(**generation_params)
 
 	print(f"Month: {start_date.strftime('%B')}, generating a full cycle of {cycle_length} days length")
 	print()
@@ -0,0 +1,150 @@
+import functools
+import hashlib
+import inspect
+import json
+import os
+import tempfile
+
+from src import tide_columns, tide_constituents, tide_curves, tide_model, tide_storage, tide_tables, \
+	tide_time_utils
+from src.tide_columns import generate_tide_table
+from src.tide_storage import save_table, load_table, encode_tide_model, encode_parameter
+
+# The modules whose source determines the content of a generated table
+GENERATION_MODULES = (tide_tables, tide_columns, tide_model, tide_curves, tide_constituents, tide_storage,
+					  tide_time_utils)
+
+
+@functools.cache
+def generation_version():
+	"""
+	Returns a hash of the source of the generation code, so that any change to it
+	invalidates the tables cached by previous versions.
+	"""
+	digest = hashlib.blake2b(digest_size=16)
+	for module in GENERATION_MODULES:
+		digest.update(inspect.getsource(module).encode())
+	return digest.hexdigest()
+
+
+class TableCache:
+	"""
+	An opt-in, on-disk cache of generated tide tables.
+
+	Tables are stored in the binary tide table format, in files named after a hash of
+	the generation parameters, the tide model and the generation code version.  The least
+	recently used files are evicted once the cache grows over `max_bytes`, and files are
+	written to a temporary file first, then atomically renamed, so concurrent processes
+	never read a partial table.
+
+	Attributes:
+	- directory: the directory of the cache files, created if needed.
+	- max_bytes: the maximum total size of the cache files.
+	- hits, misses, evictions: the statistics of this cache object.
+	"""
+	SUFFIX = '.tide'
+
+	def __init__(self, directory, *, max_bytes=256 * 1024 * 1024):
+		self.directory = directory
+		self.max_bytes = max_bytes
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		os.makedirs(directory, exist_ok=True)
+
+	@staticmethod
+	def parameters_of(**parameters):
+		"""
+		Returns all the generate_tide_table() arguments of a call with `parameters`, defaults
+		included, except the tide model and the state.
+		"""
+		arguments = inspect.signature(generate_tide_table).bind(**parameters)
+		arguments.apply_defaults()
+		return {name: value for name, value in arguments.arguments.items() if name not in ('tide_model', 'state')}
+
+	def key(self, **parameters):
+		"""Returns the stable hash of a generation, the name of its cache file without the suffix."""
+		model = encode_tide_model(parameters.get('tide_model', tide_model.semidiurnal_tide))
+		content = json.dumps(dict(parameters=self.parameters_of(**parameters), tide_model=model,
+								  version=generation_version()),
+							 sort_keys=True, default=encode_parameter)
+		return hashlib.blake2b(content.encode(), digest_size=20).hexdigest()
+
+	def path_of(self, key: str):
+		return os.path.join(self.directory, key + self.SUFFIX)
+
+	def generate_tide_table(self, **parameters):
+		"""
+		Returns the table generate_tide_table(**parameters) would return, loaded from the cache when possible.
+		Tables loaded from the cache have no generation state and cannot be extended.
+		A generation without a start_date, or from a given state, is not cached.  A cache file
+		that cannot be loaded, e.g. truncated by a full disk, is a miss and is generated again.
+		"""
+		if parameters.get('start_date') is None or parameters.get('state') is not None:
+			return generate_tide_table(**parameters)
+
+		path = self.path_of(self.key(**parameters))
+		try:
+			table = load_table(path)
+			# Record the use for the LRU eviction
+			os.utime(path)
+			self.hits += 1
+			return table
+		except FileNotFoundError:
+			pass
+		except (ValueError, KeyError):
+			# A corrupt file is replaced by the new one
+			pass
+
+		self.misses += 1
+		table = generate_tide_table(**parameters)
+		fd, temporary_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+		os.close(fd)
+		try:
+			save_table(temporary_path, table, parameters=self.parameters_of(**parameters))
+			os.replace(temporary_path, path)
+		except BaseException:
+			os.unlink(temporary_path)
+			raise
+		self._evict(keep=path)
+		return table
+
+	def _entries(self):
+		entries = []
+		for entry in os.scandir(self.directory):
+			if entry.name.endswith(self.SUFFIX):
+				try:
+					stat = entry.stat()
+				except FileNotFoundError:
+					continue
+				entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+		return entries
+
+	def _evict(self, keep: str):
+		entries = sorted(self._entries())
+		total = sum(size for _, size, _ in entries)
+		for _, size, path in entries:
+			if total <= self.max_bytes:
+				break
+			if path == keep:
+				continue
+			try:
+				os.unlink(path)
+				self.evictions += 1
+			except FileNotFoundError:
+				pass
+			total -= size
+
+	def stats(self):
+		"""Returns the statistics of the cache, as a dict."""
+		entries = self._entries()
+		return dict(hits=self.hits, misses=self.misses, evictions=self.evictions,
+					entries=len(entries), bytes=sum(size for _, size, _ in entries), max_bytes=self.max_bytes)
+
+	def clear(self):
+		"""Deletes all the cache files."""
+		for _, _, path in self._entries():
+			try:
+				os.unlink(path)
+			except FileNotFoundError:
+				pass
@@ -1,7 +1,14 @@
 import datetime
+import sys
+
+import numpy as np
 
 from src.lib import debug, debug_func
-from src.tide_tables import TideHeight
+from src.tide_columns import HW_CODE
+from src.tide_index import TideIndex
+from src.tide_tables import TideHeight, TideDay
+from src.tide_time_utils import EPOCH, MICROSECONDS_PER_DAY, time_to_microseconds, offsets_to_seconds, \
+	timedeltas_to_twelve_based_tide_hours
 
 
 class ClosestHighWater:
@@ -30,41 +37,92 @@ class ClosestHighWater:
 		minutes = (total_seconds % 3600) // 60  # Use modulus by 3600 to get remaining seconds, then divide by 60 to get minutes
 		if minutes > 30:
 			hours += 1
-		sign = ''
-		if hours > 0:
-			sign = '+'
-		hours_str = f"{sign}{hours}"
-		if hours == 0:
-			hours_str = ''
-		return f"HW{hours_str}"
+		return hw_hour_string(hours)
+
+
+def hw_hour_string(hours: int):
+	"""Returns the label of a whole number of hours from HW, e.g. 'HW-2', 'HW' or 'HW+3'."""
+	sign = ''
+	if hours > 0:
+		sign = '+'
+	hours_str = f"{sign}{hours}"
+	if hours == 0:
+		hours_str = ''
+	return f"HW{hours_str}"
+
+
+# The interned hw_hour_string labels, by hours from HW
+_hw_hour_labels = {}
+
+
+def hw_hour_label(hours: int):
+	"""Returns the interned `hw_hour_string` label of a whole number of hours from HW."""
+	label = _hw_hour_labels.get(hours)
+	if label is None:
+		label = _hw_hour_labels[hours] = sys.intern(hw_hour_string(hours))
+	return label
+
+
+def offsets_to_hw_hours(offsets):
+	"""
+	The array version of the rounding of `ClosestHighWater.get_hw_hour_string`: the whole hours
+	of each offset from HW, plus one when the remaining minutes are over 30.
+
+	Parameters:
+	- offsets: the offsets from HW, as accepted by `offsets_to_seconds`.
+
+	Returns:
+	- An int64 array of hours.
+	"""
+	# int(total_seconds()) truncates towards zero, the hours and minutes then floor
+	total_seconds = np.trunc(offsets_to_seconds(offsets)).astype(np.int64)
+	hours = total_seconds // 3600
+	minutes = (total_seconds % 3600) // 60
+	return hours + (minutes > 30)
+
+
+def offsets_to_hw_hour_labels(offsets):
+	"""
+	The array version of `ClosestHighWater.get_hw_hour_string`, as categorical codes.
+
+	Parameters:
+	- offsets: the offsets from HW, as accepted by `offsets_to_seconds`.
+
+	Returns:
+	- A tuple (codes, labels): an int32 array with the index of the label of each offset in
+	  `labels`, and the list of the distinct interned labels, in increasing hours.
+	"""
+	unique_hours, codes = np.unique(offsets_to_hw_hours(offsets), return_inverse=True)
+	return codes.reshape(-1).astype(np.int32), [hw_hour_label(int(hours)) for hours in unique_hours]
 
 
 def find_closest_high_water(*, tide_days, day_number, given_time):
-	min_time_diff = datetime.timedelta.max
+	min_time_diff = None
 	closest_hw_time = None
 	day_index = day_number - 1
+	# Times are integer microseconds since midnight of the given day
+	given_microseconds = time_to_microseconds(given_time)
 
 	# Helper function to update the closest HW tide based on a new candidate
 	def update_closest_hw(*, candidate_time, candidate_day_number, candidate_tide_number, day_step):
 		nonlocal closest_hw_time, min_time_diff
-		day_of_reference = datetime.date.today()
+		candidate_microseconds = time_to_microseconds(candidate_time)
 		if day_step < 0:
-			day_of_reference -= datetime.timedelta(days=1)
+			candidate_microseconds -= MICROSECONDS_PER_DAY
 		elif day_step > 0:
-			day_of_reference += datetime.timedelta(days=1)
-		candidate_datetime = datetime.datetime.combine(day_of_reference, candidate_time)
-		given_datetime = datetime.datetime.combine(datetime.date.today(), given_time)
-		time_diff = given_datetime - candidate_datetime
+			candidate_microseconds += MICROSECONDS_PER_DAY
+		time_diff = given_microseconds - candidate_microseconds
 		abs_time_diff = abs(time_diff)
-		debug(f"Candidate: {candidate_datetime}, given: {given_datetime}, time diff: {abs_time_diff}")
+		debug_func(lambda: debug(f"Candidate: {candidate_time} (day step {day_step}), given: {given_time}, "
+								 f"time diff: {datetime.timedelta(microseconds=abs_time_diff)}"))
 
-		if abs_time_diff < min_time_diff:
+		if min_time_diff is None or abs_time_diff < min_time_diff:
 			min_time_diff = abs_time_diff
 			closest_hw_time = ClosestHighWater(
 				time=candidate_time,
 				day_number=candidate_day_number,
 				tide_number=candidate_tide_number,
-				hw_diff=time_diff)
+				hw_diff=datetime.timedelta(microseconds=time_diff))
 			debug('Chosen')
 
 	# Search for the closest HW tide in the current, previous, and next day
@@ -87,7 +145,7 @@ def find_closest_high_water(*, tide_days, day_number, given_time):
 				if tide.type == TideHeight.HW:
 					update_closest_hw(
 						candidate_time=tide.time, candidate_day_number=current_day_index + 1,
-						candidate_tide_number=tide_days[current_day_index].heights.index(tide) + 1,
+						candidate_tide_number=k + 1,
 						day_step=index_offset)
 
 	if closest_hw_time is not None:
@@ -96,3 +154,103 @@ def find_closest_high_water(*, tide_days, day_number, given_time):
 		raise ValueError("No high water found in the provided data.")
 
 
+class ClosestHighWaters:
+	"""
+	The closest high waters of many given times, as returned by `find_closest_high_waters`.
+
+	Attributes:
+	- ordinals: int64 TideIndex ordinals of the closest HW of each given time.
+	- day_numbers, tide_numbers: the 1-based day and tide numbers of the closest HW of each given time.
+	- hw_diffs: int64 signed microseconds from the closest HW to each given time, like `ClosestHighWater.hw_diff`.
+	"""
+
+	def __init__(self, *, index: TideIndex, ordinals: np.ndarray, hw_diffs: np.ndarray):
+		self.index = index
+		self.ordinals = ordinals
+		self.day_numbers = index.day_of_tide[ordinals] + 1
+		self.tide_numbers = ordinals - index.day_offsets[index.day_of_tide[ordinals]] + 1
+		self.hw_diffs = hw_diffs
+
+	def __len__(self):
+		return len(self.ordinals)
+
+	def __getitem__(self, i):
+		"""Returns the ClosestHighWater of the i-th given time."""
+		return ClosestHighWater(
+			time=self.index.tide(int(self.ordinals[i])).time,
+			day_number=int(self.day_numbers[i]),
+			tide_number=int(self.tide_numbers[i]),
+			hw_diff=datetime.timedelta(microseconds=int(self.hw_diffs[i])))
+
+	def hw_hours(self):
+		"""Returns the whole hours from HW of each given time, rounded like `ClosestHighWater.get_hw_hour_string`."""
+		return offsets_to_hw_hours(self.hw_diffs.astype('timedelta64[us]'))
+
+	def hw_hour_strings(self):
+		"""Returns the interned `ClosestHighWater.get_hw_hour_string` label of each given time."""
+		codes, labels = offsets_to_hw_hour_labels(self.hw_diffs.astype('timedelta64[us]'))
+		return [labels[code] for code in codes]
+
+	def tide_hours(self):
+		"""Returns the 12-based tide hour of each given time, like `timedelta_to_twelve_based_tide_hours`."""
+		return timedeltas_to_twelve_based_tide_hours(self.hw_diffs.astype('timedelta64[us]'))
+
+
+def find_closest_high_waters(*, tide_days: list[TideDay], day_numbers=None, given_times=None, timestamps=None,
+							 index: TideIndex = None):
+	"""
+	The batch `find_closest_high_water`: finds the closest HW of many given times in one
+	vectorized binary search over the high water times.
+
+	The results are the same as `find_closest_high_water` for each (day_number, given_time)
+	pair, including the choice between two equally close high waters.
+
+	Parameters:
+	- tide_days: List of TideDay objects, or a TideTable.
+	- day_numbers, given_times: sequences of 1-based day numbers and `datetime.time` objects.
+	- timestamps: instead of day numbers and given times, naive datetimes or numpy datetime64
+	  values; their day number counts from the date of the first tide day.
+	- index: an optional TideIndex of tide_days, built if not given.
+
+	Returns:
+	- A ClosestHighWaters object.
+	"""
+	if index is None:
+		index = TideIndex(tide_days)
+
+	# Place the tides and the given times on a common microsecond axis, where day number `d`
+	# starts at (d - 1) days, like the day steps of find_closest_high_water
+	if timestamps is not None:
+		first_day = np.datetime64(datetime.datetime.combine(tide_days[0].date, datetime.time()), 'us')
+		given = (np.asarray(timestamps, dtype='datetime64[us]') - first_day).astype(np.int64)
+		day_indices = given // MICROSECONDS_PER_DAY
+	else:
+		day_indices = np.asarray(day_numbers, dtype=np.int64) - 1
+		time_of_day = np.array([(datetime.datetime.combine(EPOCH, t) - EPOCH) // datetime.timedelta(microseconds=1)
+								for t in given_times], dtype=np.int64)
+		given = day_indices * MICROSECONDS_PER_DAY + time_of_day
+
+	hw_ordinals = np.flatnonzero(index.types == HW_CODE)
+	hw_days = index.day_of_tide[hw_ordinals]
+	hw_times = hw_days * MICROSECONDS_PER_DAY + index.times[hw_ordinals] % MICROSECONDS_PER_DAY
+
+	# The closest HW is the last one at or before the given time, or the first one after
+	# it, among the HW of the previous, current and next days
+	right = np.searchsorted(hw_times, given, side='right')
+	left = right - 1
+	has_left = left >= 0
+	has_left[has_left] &= hw_days[left[has_left]] >= day_indices[has_left] - 1
+	has_right = right < len(hw_times)
+	has_right[has_right] &= hw_days[right[has_right]] <= day_indices[has_right] + 1
+	if not (has_left | has_right).all():
+		raise ValueError("No high water found in the provided data.")
+
+	left = np.where(has_left, left, 0)
+	right = np.where(has_right, right, 0)
+	left_diff = given - hw_times[left]
+	right_diff = hw_times[right] - given
+	# On a tie, the scan keeps the HW of the given day, else the earlier HW
+	right_wins_tie = (hw_days[right] == day_indices) & (hw_days[left] == day_indices - 1)
+	use_right = has_right & (~has_left | (right_diff < left_diff) | ((right_diff == left_diff) & right_wins_tie))
+	chosen = np.where(use_right, right, left)
+	return ClosestHighWaters(index=index, ordinals=hw_ordinals[chosen], hw_diffs=given - hw_times[chosen])
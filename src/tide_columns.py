@@ -0,0 +1,525 @@
+import datetime
+
+import numpy as np
+
+from src.tide_curves import shared_curve_registry
+from src.tide_model import semidiurnal_tide
+from src.tide_tables import TideHeight, TideDay, NeapDirection, GenerationState, \
+	next_tide_hour, water_factor_sequence, water_factors_after
+from src.tide_time_utils import MINUTES_PER_DAY, MICROSECONDS_PER_MINUTE, EPOCH, datetime_to_epoch_minutes, \
+	datetime_to_epoch_microseconds, epoch_minutes_to_time
+
+LW_CODE = 0
+HW_CODE = 1
+LIFE_CYCLE_CODES = {TideHeight.LW: LW_CODE, TideHeight.HW: HW_CODE}
+LIFE_CYCLES = {code: life_cycle for life_cycle, code in LIFE_CYCLE_CODES.items()}
+
+
+class TideTable:
+	"""
+	A tide table stored as a struct of NumPy arrays, one entry per tide.
+
+	The table behaves like a `list[TideDay]`: indexing it returns cheap `TideDay`
+	views whose heights are `TideHeight` views, so it can be passed to any function
+	taking `tide_days`.  Tide height functions are rebuilt on demand from the tide
+	model, the water factors and the neap level of each tide.
+
+	Attributes:
+	- times: int64 minutes since EPOCH of each tide.
+	- heights: float32 height of each tide, in meters.
+	- types: int8 life cycle code of each tide, LW_CODE or HW_CODE.
+	- neap_levels: float64 neap level of each tide, exact so the curves rebuilt from it are the generated ones.
+	- day_offsets: int64 prefix offsets, day `i` holds tides `day_offsets[i]:day_offsets[i + 1]`.
+	- day_neap_levels: float32 neap level of each day.
+	- factor_starts: int64 indices of the tides where the water factors change, starting with 0.
+	- min_water_factors, max_water_factors: the water factors in effect from each of `factor_starts`.
+	- tide_model: the factory of the tide height functions, e.g. `semidiurnal_tide`.
+	- state: the GenerationState after the last tide, for generated tables, or None.
+	"""
+	TIDE_COLUMNS = ('times', 'heights', 'types', 'neap_levels')
+	DAY_COLUMNS = ('day_offsets', 'day_neap_levels')
+	FACTOR_COLUMNS = ('factor_starts', 'min_water_factors', 'max_water_factors')
+	COLUMNS = TIDE_COLUMNS + DAY_COLUMNS + FACTOR_COLUMNS
+
+	def __init__(self, *, times, heights, types, neap_levels, day_offsets, day_neap_levels,
+				 factor_starts, min_water_factors, max_water_factors,
+				 tide_model=semidiurnal_tide):
+		self.times = np.asarray(times, dtype=np.int64)
+		self.heights = np.asarray(heights, dtype=np.float32)
+		self.types = np.asarray(types, dtype=np.int8)
+		self.neap_levels = np.asarray(neap_levels, dtype=float)
+		self.day_offsets = np.asarray(day_offsets, dtype=np.int64)
+		self.day_neap_levels = np.asarray(day_neap_levels, dtype=np.float32)
+		self.factor_starts = np.asarray(factor_starts, dtype=np.int64)
+		self.min_water_factors = np.asarray(min_water_factors, dtype=float)
+		self.max_water_factors = np.asarray(max_water_factors, dtype=float)
+		self.tide_model = tide_model
+		self.state = None
+		self._buffers = {}
+
+	@staticmethod
+	def from_tide_days(tide_days: list[TideDay], tide_model=semidiurnal_tide):
+		"""
+		Builds a columnar table from a list of TideDay objects.
+		The water factors are read from the `min_water_factor` / `max_water_factor`
+		attributes of the tide height functions, as found on `HarmonicModel` curves.
+		"""
+		times, heights, types, neap_levels = [], [], [], []
+		day_offsets = [0]
+		factor_starts, min_water_factors, max_water_factors = [], [], []
+		for tide_day in tide_days:
+			day_start = datetime.datetime.combine(tide_day.date, datetime.time())
+			for tide in tide_day.heights:
+				times.append(datetime_to_epoch_minutes(datetime.datetime.combine(day_start, tide.time)))
+				heights.append(tide.height)
+				types.append(LIFE_CYCLE_CODES[tide.type])
+				neap_levels.append(tide.neap_level)
+				factors = (getattr(tide.compute_height, 'min_water_factor', 0.0),
+						   getattr(tide.compute_height, 'max_water_factor', 0.0))
+				if not factor_starts or factors != (min_water_factors[-1], max_water_factors[-1]):
+					factor_starts.append(len(times) - 1)
+					min_water_factors.append(factors[0])
+					max_water_factors.append(factors[1])
+			day_offsets.append(len(times))
+		return TideTable(
+			times=times, heights=heights, types=types, neap_levels=neap_levels,
+			day_offsets=day_offsets,
+			day_neap_levels=[tide_day.neap_level for tide_day in tide_days],
+			factor_starts=factor_starts or [0],
+			min_water_factors=min_water_factors or [0.0],
+			max_water_factors=max_water_factors or [0.0],
+			tide_model=tide_model)
+
+	def to_tide_days(self):
+		"""Materializes the table as a list of TideDay objects holding TideHeight objects."""
+		return [
+			TideDay(
+				tide_date=tide_day.date,
+				neap_level=tide_day.neap_level,
+				heights=[TideHeight(time=tide.time, height=tide.height, life_cycle=tide.type,
+									neap_level=tide.neap_level, compute_height=tide.compute_height)
+						 for tide in tide_day.heights])
+			for tide_day in self]
+
+	@property
+	def tides_count(self):
+		return len(self.times)
+
+	@property
+	def nbytes(self):
+		"""The memory used by the arrays of the table, in bytes."""
+		return sum(getattr(self, name).nbytes for name in self.COLUMNS)
+
+	def __getstate__(self):
+		# Pickle the columns without the spare capacity of their buffers
+		state = self.__dict__.copy()
+		state['_buffers'] = {}
+		return state
+
+	def _append_to_column(self, name: str, values: np.ndarray, keep: int):
+		"""
+		Replaces a column with its first `keep` values followed by `values`.
+		Columns grow inside buffers with spare capacity, so appending is amortized O(len(values)).
+		Replacing values of the column copies it to a new buffer instead, so the arrays previously
+		read from the table never change.
+		"""
+		column = getattr(self, name)
+		size = keep + len(values)
+		buffer = self._buffers.get(name)
+		if buffer is None or len(buffer) < size or not np.shares_memory(buffer, column) or keep < len(column):
+			buffer = np.empty(max(2 * size, 16), dtype=column.dtype)
+			buffer[:keep] = column[:keep]
+			self._buffers[name] = buffer
+		buffer[keep:size] = values
+		setattr(self, name, buffer[:size])
+
+	def append(self, other: 'TideTable', merge_first_day=False):
+		"""
+		Appends the tides and days of another table, in place.
+		If merge_first_day is set, the first day of `other` continues the last day of this
+		table and its neap level replaces the level of that day.
+		"""
+		tides_count = self.tides_count
+		days_count = len(self)
+		if merge_first_day:
+			days_count -= 1
+		for name in self.TIDE_COLUMNS:
+			self._append_to_column(name, getattr(other, name), tides_count)
+		self._append_to_column('day_offsets', other.day_offsets[1:] + tides_count, days_count + 1)
+		self._append_to_column('day_neap_levels', other.day_neap_levels, days_count)
+
+		# Keep one run per change of the water factors
+		factor_starts = other.factor_starts + tides_count
+		min_water_factors, max_water_factors = other.min_water_factors, other.max_water_factors
+		if tides_count > 0 and len(factor_starts) > 0 and (min_water_factors[0], max_water_factors[0]) == \
+				(self.min_water_factors[-1], self.max_water_factors[-1]):
+			factor_starts, min_water_factors, max_water_factors = \
+				factor_starts[1:], min_water_factors[1:], max_water_factors[1:]
+		if tides_count == 0:
+			self.factor_starts, self.min_water_factors, self.max_water_factors = \
+				other.factor_starts, other.min_water_factors, other.max_water_factors
+		else:
+			self.factor_starts = np.concatenate((self.factor_starts, factor_starts))
+			self.min_water_factors = np.concatenate((self.min_water_factors, min_water_factors))
+			self.max_water_factors = np.concatenate((self.max_water_factors, max_water_factors))
+
+	def water_factors(self, index: int):
+		"""Returns the (min_water_factor, max_water_factor) in effect for the tide at `index`."""
+		run = np.searchsorted(self.factor_starts, index, side='right') - 1
+		return float(self.min_water_factors[run]), float(self.max_water_factors[run])
+
+	def curve(self, index: int):
+		"""Returns the tide height function of the tide at `index`, shared through the curve registry."""
+		min_water_factor, max_water_factor = self.water_factors(index)
+		return shared_curve_registry.get(self.tide_model, min_water_factor=min_water_factor,
+										 max_water_factor=max_water_factor,
+										 neap_factor=float(self.neap_levels[index]))
+
+	def day_index_of(self, index: int):
+		"""Returns the 0-based index of the day holding the tide at `index`."""
+		return int(np.searchsorted(self.day_offsets, index, side='right')) - 1
+
+	def max_height(self, life_cycle: str):
+		"""Returns the maximum height among the tides of the given life cycle, or 0 if there are none."""
+		heights = self.heights[self.types == LIFE_CYCLE_CODES[life_cycle]]
+		return float(heights.max()) if len(heights) > 0 else 0
+
+	def __len__(self):
+		return len(self.day_offsets) - 1
+
+	def __getitem__(self, day_index):
+		if isinstance(day_index, slice):
+			return [self[i] for i in range(*day_index.indices(len(self)))]
+		if day_index < 0:
+			day_index += len(self)
+		if not 0 <= day_index < len(self):
+			raise IndexError('tide day index out of range')
+		return TideDayView(self, day_index)
+
+	def __iter__(self):
+		return (TideDayView(self, i) for i in range(len(self)))
+
+
+class TideHeightView(TideHeight):
+	"""A read-only TideHeight backed by one entry of a TideTable."""
+
+	def __init__(self, table: TideTable, index: int):
+		self._table = table
+		self._index = index
+
+	@property
+	def index(self):
+		return self._index
+
+	@property
+	def time(self):
+		return epoch_minutes_to_time(self._table.times[self._index])
+
+	@property
+	def height(self):
+		return float(self._table.heights[self._index])
+
+	@property
+	def type(self):
+		return LIFE_CYCLES[int(self._table.types[self._index])]
+
+	@property
+	def neap_level(self):
+		return float(self._table.neap_levels[self._index])
+
+	@property
+	def compute_height(self):
+		return self._table.curve(self._index)
+
+	def __eq__(self, other):
+		if isinstance(other, TideHeightView):
+			return self._table is other._table and self._index == other._index
+		return NotImplemented
+
+	def __hash__(self):
+		return hash((id(self._table), self._index))
+
+
+class TideDayView(TideDay):
+	"""A read-only TideDay backed by one day of a TideTable."""
+
+	def __init__(self, table: TideTable, day_index: int):
+		self._table = table
+		self._day_index = day_index
+
+	@property
+	def date(self):
+		first_tide_time = self._table.times[self._table.day_offsets[self._day_index]]
+		return (EPOCH + datetime.timedelta(days=int(first_tide_time // MINUTES_PER_DAY))).date()
+
+	@property
+	def neap_level(self):
+		return float(self._table.day_neap_levels[self._day_index])
+
+	@property
+	def heights(self):
+		start, stop = self._table.day_offsets[self._day_index:self._day_index + 2]
+		return [TideHeightView(self._table, i) for i in range(start, stop)]
+
+
+def _neap_segment(level: float, tide_range_should_increase: bool, step: float):
+	"""
+	Returns the neap levels that NeapDirection.get_next() visits from `level` until
+	it reaches springs or neaps (inclusive), or None if the level never changes.
+	The levels are accumulated sequentially, exactly like the generation loop does.
+	"""
+	max_level = NeapDirection.get_max()
+	if step == 0:
+		if tide_range_should_increase and level < 0.05:
+			return np.array([0.0])
+		if not tide_range_should_increase and level > max_level - 0.05:
+			return np.array([max_level])
+		return None
+
+	count = int((max_level + abs(level)) / step) + 2
+	increments = np.full(count + 1, -step if tide_range_should_increase else step)
+	increments[0] = level
+	levels = np.cumsum(increments)[1:]
+	if tide_range_should_increase:
+		end = np.flatnonzero(levels < 0.05)[0]
+		levels[end] = 0.0
+	else:
+		end = np.flatnonzero(levels > max_level - 0.05)[0]
+		levels[end] = max_level
+	return levels[:end + 1]
+
+
+def _neap_levels(level: float, tide_range_should_increase: bool, step: float, count: int):
+	"""
+	Returns the neap levels L[0..count], where L[j] is the level after j calls to
+	NeapDirection.get_next() from `level`, and the sorted steps j at which the direction is reversed.
+	"""
+	segments = [np.array([level])]
+	reversal_steps = [np.zeros(0, dtype=np.int64)]
+	length = 1
+	while length <= count:
+		segment = _neap_segment(level, tide_range_should_increase, step)
+		if segment is None:
+			segments.append(np.full(count + 1 - length, level))
+			break
+		segments.append(segment)
+		length += len(segment)
+		reversal_steps.append(np.array([length - 1]))
+		level = segment[-1]
+		tide_range_should_increase = not tide_range_should_increase
+
+		# From springs or neaps on, the levels repeat with a period of two segments
+		first = _neap_segment(level, tide_range_should_increase, step)
+		if first is None or length > count:
+			continue
+		second = _neap_segment(first[-1], not tide_range_should_increase, step)
+		period = len(first) + len(second)
+		repeats = (count + 1 - length) // period + 1
+		segments.append(np.tile(np.concatenate((first, second)), repeats))
+		period_starts = length + period * np.arange(repeats)
+		reversal_steps.append(np.column_stack((
+			period_starts + len(first) - 1, period_starts + period - 1)).ravel())
+		break
+
+	reversal_steps = np.concatenate(reversal_steps).astype(np.int64)
+	return np.concatenate(segments)[:count + 1], reversal_steps[reversal_steps <= count]
+
+
+def _water_factor_runs(min_water_factor, max_water_factor, first_reversal_count: int, reversals_count: int):
+	"""
+	Returns the water factors after `first_reversal_count` to `first_reversal_count + reversals_count`
+	reversals, see water_factors_after().
+	"""
+	min_water_factors, max_water_factors = water_factor_sequence(
+		min_water_factor, max_water_factor, first_reversal_count + reversals_count)
+	return min_water_factors[first_reversal_count:], max_water_factors[first_reversal_count:]
+
+
+def _generate_columns(state: GenerationState, heights_count: int, days_count: int):
+	"""
+	Generates, as a TideTable, the tides that iter_tide_days(state=state, ...) would generate,
+	and advances the state past them.
+	"""
+	neap_dir = state.neap_dir
+	cycle_offset = state.neaps_cycle_count
+
+	# Tide times, including the time of the first tide that is not generated.  They are exact
+	# in microseconds, like the loop adding time_delta, and stored in minutes dropping seconds
+	start_microseconds = datetime_to_epoch_microseconds(state.date)
+	delta_microseconds = state.time_delta // datetime.timedelta(microseconds=1)
+	times = (start_microseconds + delta_microseconds * np.arange(heights_count + 1, dtype=np.int64)) // \
+		MICROSECONDS_PER_MINUTE
+	tide_indices = np.arange(heights_count)
+
+	# Neap levels change every two tides, and reverse at springs and neaps
+	levels, reversal_steps = _neap_levels(
+		state.neap_level, neap_dir.tide_range_should_increase, neap_dir.step,
+		(cycle_offset + heights_count) // 2)
+	pair_indices = (cycle_offset + tide_indices) // 2
+	neap_levels = levels[pair_indices]
+
+	# The curve of step j is built before the factors are adjusted for a reversal at step j
+	factor_pairs = reversal_steps + 1
+	if state.should_vary_water_factors:
+		min_water_factors, max_water_factors = _water_factor_runs(
+			*state.base_water_factors, state.reversal_count, len(reversal_steps))
+		if state.curve_water_factors != (min_water_factors[0], max_water_factors[0]):
+			# The current curve predates the last reversal, the next one has the adjusted factors
+			min_water_factors = np.concatenate(([state.curve_water_factors[0]], min_water_factors))
+			max_water_factors = np.concatenate(([state.curve_water_factors[1]], max_water_factors))
+			factor_pairs = np.concatenate(([1], factor_pairs))
+		factor_starts = np.concatenate(([0], 2 * factor_pairs - cycle_offset))
+		runs = np.searchsorted(factor_pairs, pair_indices, side='right')
+	else:
+		min_water_factors, max_water_factors = (np.array([f], dtype=float) for f in state.curve_water_factors)
+		factor_starts = np.array([0])
+		runs = np.zeros(heights_count, dtype=np.int64)
+
+	# Life cycles alternate, tide hours follow a period of four tides
+	first_code = LIFE_CYCLE_CODES[state.life_cycle]
+	types = np.where(tide_indices % 2 == 0, first_code, 1 - first_code).astype(np.int8)
+	tide_hour, old_low_tide_hour = state.tide_hour, state.old_low_tide_hour
+	period_tide_hours = []
+	for _ in range(4):
+		period_tide_hours.append(tide_hour)
+		tide_hour, old_low_tide_hour = next_tide_hour(tide_hour, old_low_tide_hour)
+	tide_hours = np.array(period_tide_hours)[tide_indices % 4]
+
+	if state.tide_model is semidiurnal_tide:
+		heights = semidiurnal_tide(min_water_factor=min_water_factors[runs], max_water_factor=max_water_factors[runs],
+								   neap_factor=neap_levels)(tide_hours)
+	else:
+		heights = np.empty(heights_count)
+		curve_firsts = np.flatnonzero(np.diff(pair_indices, prepend=-1))
+		for first, last in zip(curve_firsts, np.append(curve_firsts[1:], heights_count)):
+			compute_height = shared_curve_registry.get(state.tide_model,
+													   min_water_factor=float(min_water_factors[runs[first]]),
+													   max_water_factor=float(max_water_factors[runs[first]]),
+													   neap_factor=float(neap_levels[first]))
+			heights[first:last] = [compute_height(h) for h in tide_hours[first:last]]
+
+	# Days start where the date changes
+	days = times // MINUTES_PER_DAY
+	day_starts = np.flatnonzero(np.diff(days[:heights_count])) + 1
+	day_offsets = np.concatenate(([0], day_starts, [heights_count])) if heights_count > 0 else np.array([0])
+	if days_count > 0:
+		day_offsets = day_offsets[:days_count + 1]
+	tides_count = int(day_offsets[-1])
+	day_firsts, day_ends = day_offsets[:-1], day_offsets[1:]
+
+	# A completed day takes the neap level of the next tide, or the level of the springs
+	# or neaps it contains; the first day may also start with the pending state day level
+	day_neap_levels = levels[(cycle_offset + day_ends) // 2]
+	last_reversals = np.searchsorted(reversal_steps, (cycle_offset + day_ends) // 2, side='right') - 1
+	has_reversal = last_reversals >= 0
+	has_reversal[has_reversal] = \
+		reversal_steps[last_reversals[has_reversal]] >= (cycle_offset + day_firsts[has_reversal]) // 2 + 1
+	day_neap_levels[has_reversal] = levels[reversal_steps[last_reversals[has_reversal]]]
+	if len(day_neap_levels) > 0 and not has_reversal[0] and state.day_neap_level is not None:
+		day_neap_levels[0] = state.day_neap_level
+	# The last day is incomplete when the next tide falls on the same day
+	is_last_day_complete = len(day_neap_levels) == 0 or days[tides_count] != days[tides_count - 1]
+	if not is_last_day_complete:
+		day_pending_level = None
+		if has_reversal[-1]:
+			day_pending_level = float(day_neap_levels[-1])
+		elif len(day_neap_levels) == 1:
+			day_pending_level = state.day_neap_level
+		day_neap_levels[-1] = levels[(cycle_offset + tides_count) // 2]
+
+	runs_count = max(np.count_nonzero(factor_starts < tides_count), 1)
+	table = TideTable(
+		times=times[:tides_count], heights=heights[:tides_count], types=types[:tides_count],
+		neap_levels=neap_levels[:tides_count],
+		day_offsets=day_offsets, day_neap_levels=day_neap_levels,
+		factor_starts=factor_starts[:runs_count],
+		min_water_factors=min_water_factors[:runs_count], max_water_factors=max_water_factors[:runs_count],
+		tide_model=state.tide_model)
+
+	# Advance the state past the generated tides
+	steps = (cycle_offset + tides_count) // 2
+	reversals_count = int(np.searchsorted(reversal_steps, steps, side='right'))
+	if tides_count % 2 == 1:
+		state.life_cycle = LIFE_CYCLES[1 - first_code]
+	for _ in range(tides_count % 4):
+		state.tide_hour, state.old_low_tide_hour = next_tide_hour(state.tide_hour, state.old_low_tide_hour)
+	state.tide_index += tides_count
+	state.date += tides_count * state.time_delta
+	state.neaps_cycle_count = (cycle_offset + tides_count) % 2
+	if steps > 0:
+		state.neap_level = float(levels[steps])
+		if state.should_vary_water_factors:
+			state.curve_water_factors = water_factors_after(
+				*state.base_water_factors,
+				state.reversal_count + int(np.searchsorted(reversal_steps, steps, side='left')))
+		state._compute_height = None
+	if reversals_count % 2 == 1:
+		neap_dir.reverse()
+	state.reversal_count += reversals_count
+	if tides_count > 0:
+		state.day_neap_level = None if is_last_day_complete else day_pending_level
+	return table
+
+
+# Generates a columnar tide table, equivalent to TideTable.from_tide_days(generate_tide_days(...)),
+# deriving all the tides in a few NumPy array operations instead of stepping through them.
+# Times are stored with a resolution of one minute, dropping seconds like from_tide_days does.
+# The table keeps the generation state after its last tide, so it can be extended.
+# See iter_tide_days for the parameters; heights_count must be finite.
+def generate_tide_table(start_date=None,
+						days_count=0, heights_count=1, cycle_length=0,
+						time_delta=datetime.timedelta(hours=6, minutes=0),
+						start_life_cycle=TideHeight.HW,
+						min_water_factor=2, max_water_factor=5, go_towards_springs=True,
+						start_days_after_neaps=None,
+						should_vary_water_factors=False,
+						tide_model=semidiurnal_tide,
+						state: GenerationState = None):
+	if days_count == 0:
+		days_count = cycle_length
+	if days_count > 0:
+		heights_count = days_count * 4
+	if heights_count is None:
+		raise ValueError("Bulk generation needs a finite heights_count, use iter_tide_days instead.")
+
+	if state is None:
+		neap_dir = NeapDirection(cycle_length=cycle_length,
+								 tide_range_should_increase=go_towards_springs,
+								 start_days_after_neaps=start_days_after_neaps)
+		state = GenerationState(
+			date=datetime.datetime.now() if start_date is None else start_date,
+			time_delta=time_delta, life_cycle=start_life_cycle, neap_dir=neap_dir,
+			min_water_factor=min_water_factor, max_water_factor=max_water_factor,
+			should_vary_water_factors=should_vary_water_factors, tide_model=tide_model)
+	else:
+		state = state.copy()
+	table = _generate_columns(state, heights_count, days_count)
+	table.state = state
+	return table
+
+
+def extend(table: TideTable, days: int):
+	"""
+	Appends `days` days to a table made by generate_tide_table(), in place, resuming the
+	generation from the state the table keeps after its last tide.
+	The cost only depends on `days`, and the table ends up identical to a single generation
+	of the whole range, including across springs and neaps reversals.  The columns read from
+	the table before the extension keep their values.
+
+	Returns:
+	- The extended table.
+	"""
+	if table.state is None:
+		raise ValueError("The table has no generation state, only generated tables can be extended.")
+	if days <= 0:
+		return table
+
+	state = table.state.copy()
+	# A last day that ended with the generation continues with the first appended tides
+	is_last_day_incomplete = table.tides_count > 0 and \
+		datetime_to_epoch_minutes(state.date) // MINUTES_PER_DAY == table.times[-1] // MINUTES_PER_DAY
+	days_count = days + 1 if is_last_day_incomplete else days
+	appended = _generate_columns(state, days_count * 4, days_count)
+	table.append(appended, merge_first_day=is_last_day_incomplete)
+	table.state = state
+	return table
@@ -0,0 +1,218 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+from src.tide_model import NEAP_MAX
+
+# Angular speeds, in degrees per hour, of the 37 standard harmonic constituents
+# Source https://tidesandcurrents.noaa.gov/about_harmonic_constituents.html
+CONSTITUENT_SPEEDS = {
+	'M2': 28.9841042, 'S2': 30.0, 'N2': 28.4397295, 'K1': 15.0410686,
+	'M4': 57.9682084, 'O1': 13.9430356, 'M6': 86.9523127, 'MK3': 44.0251729,
+	'S4': 60.0, 'MN4': 57.4238337, 'NU2': 28.5125831, 'S6': 90.0,
+	'MU2': 27.9682084, '2N2': 27.8953548, 'OO1': 16.1391017, 'LAM2': 29.4556253,
+	'S1': 15.0, 'M1': 14.4966939, 'J1': 15.5854433, 'MM': 0.5443747,
+	'SSA': 0.0821373, 'SA': 0.0410686, 'MSF': 1.0158958, 'MF': 1.0980331,
+	'RHO': 13.4715145, 'Q1': 13.3986609, 'T2': 29.9589333, 'R2': 30.0410667,
+	'2Q1': 12.8542862, 'P1': 14.9589314, '2SM2': 31.0158958, 'M3': 43.4761563,
+	'L2': 29.5284789, '2MK3': 42.9271398, 'K2': 30.0821373, 'M8': 115.9364166,
+	'MS4': 58.9841042,
+}
+
+
+class Constituent:
+	"""
+	One harmonic constituent of a tide: amplitude * cos(speed * t - phase).
+
+	Attributes:
+	- name: the constituent name, e.g. 'M2'.
+	- amplitude: the amplitude, in meters.
+	- phase: the phase lag, in degrees.
+	- speed: the angular speed, in degrees per hour; defaults to the standard speed of `name`.
+	"""
+
+	def __init__(self, *, name: str, amplitude: float, phase=0.0, speed=None):
+		self.name = name
+		self.amplitude = amplitude
+		self.phase = phase
+		self.speed = CONSTITUENT_SPEEDS[name] if speed is None else speed
+
+	def to_dict(self):
+		return dict(name=self.name, amplitude=self.amplitude, phase=self.phase, speed=self.speed)
+
+
+def _basis(speeds_radians: np.ndarray, tide_time: np.ndarray):
+	angles = np.multiply.outer(tide_time, speeds_radians)
+	return np.concatenate((np.cos(angles), np.sin(angles)), axis=-1)
+
+
+class BasisCache:
+	"""
+	A bounded LRU cache of cos/sin design matrices.
+
+	Matrices are keyed by the constituent speeds and the content of the time vector,
+	so models of different ports that share a time grid and a constituent set reuse
+	the same matrix.  The cache holds at most `maxsize` matrices and `max_bytes` bytes;
+	larger matrices are built on every call and not kept.
+	"""
+
+	def __init__(self, maxsize=8, max_bytes=64 << 20):
+		self.maxsize = maxsize
+		self.max_bytes = max_bytes
+		self.nbytes = 0
+		self._matrices = OrderedDict()
+
+	def caches(self, speeds_radians: np.ndarray, tide_time: np.ndarray):
+		"""Returns whether the matrix of the given times is small enough to be cached."""
+		return tide_time.size * 2 * len(speeds_radians) * np.dtype(float).itemsize <= self.max_bytes
+
+	def get(self, speeds_radians: np.ndarray, tide_time: np.ndarray):
+		if not self.caches(speeds_radians, tide_time):
+			return _basis(speeds_radians, tide_time)
+		key = (speeds_radians.tobytes(), tide_time.shape,
+			   hashlib.blake2b(tide_time.tobytes(), digest_size=16).digest())
+		matrix = self._matrices.get(key)
+		if matrix is not None:
+			self._matrices.move_to_end(key)
+			return matrix
+
+		matrix = _basis(speeds_radians, tide_time)
+		self._matrices[key] = matrix
+		self.nbytes += matrix.nbytes
+		while len(self._matrices) > self.maxsize or self.nbytes > self.max_bytes:
+			self.nbytes -= self._matrices.popitem(last=False)[1].nbytes
+		return matrix
+
+	def clear(self):
+		self._matrices.clear()
+		self.nbytes = 0
+
+
+shared_basis_cache = BasisCache()
+
+# The number of times evaluated at once for the grids too large for the basis cache
+CHUNK_SIZE = 1 << 14
+
+
+class ConstituentModel:
+	"""
+	A tide curve synthesized from a table of harmonic constituents:
+	height(t) = datum + sum(amplitude * cos(speed * (t - time_offset) - phase)).
+
+	Arrays of times are evaluated with a single matrix-vector product between the
+	cos/sin design matrix of the times (see `BasisCache`) and the coefficient vector
+	[amplitude * cos(phase)..., amplitude * sin(phase)...].  Grids too large for the
+	cache are evaluated in chunks of CHUNK_SIZE times, without a design matrix.
+	"""
+
+	def __init__(self, constituents: list[Constituent], *, datum=0.0, time_offset=0.0,
+				 basis_cache: BasisCache = None):
+		self.constituents = constituents
+		self.datum = datum
+		self.time_offset = time_offset
+		self.basis_cache = shared_basis_cache if basis_cache is None else basis_cache
+
+		self._amplitudes = np.array([c.amplitude for c in constituents], dtype=float)
+		self._speeds = np.radians([c.speed for c in constituents])
+		# Fold the time offset into the phases, so that the design matrix
+		# only depends on the time vector and can be shared
+		self._phases = np.radians([c.phase for c in constituents]) + self._speeds * time_offset
+		self._coefficients = np.concatenate((
+			self._amplitudes * np.cos(self._phases),
+			self._amplitudes * np.sin(self._phases)))
+
+	def basis(self, tide_time):
+		"""Returns the (times x 2 * constituents) cos/sin design matrix of the given times."""
+		return self.basis_cache.get(self._speeds, np.ascontiguousarray(tide_time, dtype=float))
+
+	def __getstate__(self):
+		# The basis cache is a per-process cache, the unpickled model uses the shared one
+		state = self.__dict__.copy()
+		del state['basis_cache']
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self.basis_cache = shared_basis_cache
+
+	def __call__(self, tide_time):
+		if np.ndim(tide_time) == 0:
+			return self.datum + np.dot(self._amplitudes, np.cos(self._speeds * tide_time - self._phases))
+		tide_time = np.ascontiguousarray(tide_time, dtype=float)
+		if self.basis_cache.caches(self._speeds, tide_time):
+			return self.datum + self.basis(tide_time) @ self._coefficients
+		times = tide_time.ravel()
+		heights = np.empty(len(times))
+		for start in range(0, len(times), CHUNK_SIZE):
+			angles = np.multiply.outer(times[start:start + CHUNK_SIZE], self._speeds) - self._phases
+			heights[start:start + CHUNK_SIZE] = np.cos(angles) @ self._amplitudes
+		return self.datum + heights.reshape(tide_time.shape)
+
+	def derivative(self, tide_time):
+		"""Computes the derivative of the tide height, in meters per hour, at the given time(s)."""
+		angles = np.multiply.outer(tide_time, self._speeds) - self._phases
+		return -(np.sin(angles) @ (self._amplitudes * self._speeds))
+
+
+def _time_of_max(constituents: list[Constituent]):
+	"""
+	Returns the hour, within the first lunar day, of the highest water of the constituents,
+	found on a one-minute grid and refined with Newton steps on the derivative.
+	"""
+	model = ConstituentModel(constituents, basis_cache=BasisCache(maxsize=1))
+	tide_time = np.arange(0, 24.84, 1 / 60)
+	t = float(tide_time[np.argmax(model(tide_time))])
+	amplitudes = np.array([c.amplitude for c in constituents], dtype=float)
+	speeds = np.radians([c.speed for c in constituents])
+	phases = np.radians([c.phase for c in constituents])
+	for _ in range(8):
+		angles = speeds * t - phases
+		second_derivative = -np.dot(amplitudes * speeds ** 2, np.cos(angles))
+		if second_derivative >= 0:
+			break
+		t -= float(model.derivative(t)) / second_derivative
+	return t
+
+
+class ConstituentTide:
+	"""
+	A tide model factory, interchangeable with `semidiurnal_tide`, that builds
+	`ConstituentModel` curves from a constituent table.
+
+	The curves follow the conventions of the generated tide tables: when `centered_on_hw`
+	is set, the curves are shifted so that tide hour 6 is the highest water of the first
+	lunar day of the constituents, and, when `max_water_factor` is set, the curve is scaled
+	so that springs span from `min_water_factor` to `max_water_factor`.  Towards neaps, the
+	range shrinks around the mean level by up to `neap_range_reduction`.
+	"""
+
+	def __init__(self, constituents: list[Constituent], *, neap_range_reduction=0.5):
+		self.constituents = constituents
+		self.neap_range_reduction = neap_range_reduction
+		self._total_amplitude = sum(c.amplitude for c in constituents)
+		# Scaling the amplitudes keeps the time of the highest water
+		self._hw_offset = 6 - _time_of_max(constituents) if constituents else 6
+
+	def __call__(self, *, min_water_factor=0.0, max_water_factor=0.0, neap_factor=0.0, centered_on_hw=True):
+		constituents = self.constituents
+		datum = 0.0
+		if max_water_factor > 0:
+			if min_water_factor > max_water_factor:
+				min_water_factor = max_water_factor
+			datum = (min_water_factor + max_water_factor) / 2
+			half_range = (max_water_factor - min_water_factor) / 2
+			half_range *= 1 - self.neap_range_reduction * neap_factor / NEAP_MAX
+			scale = half_range / self._total_amplitude
+			constituents = [Constituent(name=c.name, amplitude=c.amplitude * scale, phase=c.phase, speed=c.speed)
+							for c in constituents]
+		return ConstituentModel(constituents, datum=datum, time_offset=self._hw_offset if centered_on_hw else 0)
+
+	def to_dict(self):
+		return dict(constituents=[c.to_dict() for c in self.constituents],
+					neap_range_reduction=self.neap_range_reduction)
+
+	@staticmethod
+	def from_dict(d):
+		return ConstituentTide([Constituent(**c) for c in d['constituents']],
+							   neap_range_reduction=d['neap_range_reduction'])
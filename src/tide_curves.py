@@ -0,0 +1,63 @@
+from collections import OrderedDict
+
+
+class CurveRegistry:
+	"""
+	A bounded LRU registry of interned tide height functions.
+
+	Curves are keyed by their tide model and their exact (min_water_factor,
+	max_water_factor, neap_factor) triple, so every tide generated with the same
+	parameters shares one curve object, computing the heights the tide model does.
+	The generated neap levels and water factors repeat exactly along the cycles.
+
+	Attributes:
+	- maxsize: the maximum number of curves kept, the least recently used are evicted first.
+	- hits, misses: the number of lookups that found, or had to build, their curve.
+	"""
+
+	def __init__(self, maxsize=1024):
+		self.maxsize = maxsize
+		self.hits = 0
+		self.misses = 0
+		self._curves = OrderedDict()
+
+	def get(self, tide_model, *, min_water_factor=0.0, max_water_factor=0.0, neap_factor=0.0):
+		"""
+		Returns the curve of the given tide model and parameters, building it on the first lookup.
+
+		Parameters:
+		- tide_model: the factory of the tide height functions, e.g. `semidiurnal_tide`.
+		- min_water_factor, max_water_factor, neap_factor: the curve parameters.
+
+		Returns:
+		- The shared tide height function.
+		"""
+		key = (tide_model, float(min_water_factor), float(max_water_factor), float(neap_factor))
+		curve = self._curves.get(key)
+		if curve is not None:
+			self.hits += 1
+			self._curves.move_to_end(key)
+			return curve
+
+		self.misses += 1
+		curve = tide_model(min_water_factor=key[1], max_water_factor=key[2], neap_factor=key[3])
+		self._curves[key] = curve
+		if len(self._curves) > self.maxsize:
+			self._curves.popitem(last=False)
+		return curve
+
+	def info(self):
+		"""Returns the hit / miss statistics of the registry, as a dict."""
+		return dict(hits=self.hits, misses=self.misses, size=len(self._curves), maxsize=self.maxsize)
+
+	def clear(self):
+		"""Drops all the curves and resets the statistics."""
+		self._curves.clear()
+		self.hits = 0
+		self.misses = 0
+
+	def __len__(self):
+		return len(self._curves)
+
+
+shared_curve_registry = CurveRegistry()
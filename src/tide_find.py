@@ -1,7 +1,7 @@
 from src.tide_tables import TideHeight, TideDay
 
 
-def find_previous_tide(*, tide_days: list[TideDay], day_number: int, tide_number: int):
+def find_previous_tide(*, tide_days: list[TideDay], day_number: int, tide_number: int, index=None):
 	"""
 	Finds the previous high water (HW) or low water (LW) tide in a list of TideDay objects.
 
@@ -9,11 +9,14 @@ def find_previous_tide(*, tide_days: list[TideDay], day_number: int, tide_number
 	- tide_days: List of TideDay objects.
 	- day_number: The day number (1-based index) to start the search from.
 	- tide_number: The tide number (1-based index) within the start day to start the search from.
+	- index: An optional TideIndex of tide_days, for an O(1) lookup instead of a scan.
 
 	Returns:
 	- A tuple (tide_height, day_number, tide_number) indicating the tide height object, and the
 	day and tide number of the previous HW or LW.
 	"""
+	if index is not None:
+		return index.previous_tide(day_number, tide_number)
 
 	# Adjust to 0-based index for iteration
 	day_index = day_number - 1
@@ -23,7 +26,7 @@ def find_previous_tide(*, tide_days: list[TideDay], day_number: int, tide_number
 		tide_day = tide_days[day_index]
 		while tide_index >= 0:
 			tide = tide_day.heights[tide_index]
-			if tide.type in [TideHeight.HW, TideHeight.LW]:
+			if tide.type in (TideHeight.HW, TideHeight.LW):
 				return tide, day_index + 1, tide_index + 1  # Convert back to 1-based index for result
 			tide_index -= 1
 		# Move to the previous day and start from the last tide of that day
@@ -34,7 +37,7 @@ def find_previous_tide(*, tide_days: list[TideDay], day_number: int, tide_number
 	return None, 0, 0  # Return None if no previous HW or LW is found
 
 
-def find_next_tide(*, tide_days: list[TideDay], day_number: int, tide_number: int):
+def find_next_tide(*, tide_days: list[TideDay], day_number: int, tide_number: int, index=None):
 	"""
 	Finds the next high water (HW) or low water (LW) tide in a list of TideDay objects.
 
@@ -42,11 +45,14 @@ def find_next_tide(*, tide_days: list[TideDay], day_number: int, tide_number: in
 	- tide_days: List of TideDay objects.
 	- day_number: The day number (1-based index) to start the search from.
 	- tide_number: The tide number (1-based index) within the start day to start the search from.
+	- index: An optional TideIndex of tide_days, for an O(1) lookup instead of a scan.
 
 	Returns:
 	- A tuple (tide_height, day_number, tide_number) indicating the tide height object, and the
 	day and tide number of the next HW or LW.
 	"""
+	if index is not None:
+		return index.next_tide(day_number, tide_number)
 	day_index = day_number - 1  # Convert to 0-based index for iteration
 	tide_index = tide_number  # Start search from the tide immediately after the given tide_number
 
@@ -54,7 +60,7 @@ def find_next_tide(*, tide_days: list[TideDay], day_number: int, tide_number: in
 		tide_day = tide_days[day_index]
 		while tide_index < len(tide_day.heights):
 			tide = tide_day.heights[tide_index]
-			if tide.type in [TideHeight.HW, TideHeight.LW]:
+			if tide.type in (TideHeight.HW, TideHeight.LW):
 				return tide, day_index + 1, tide_index + 1  # Convert back to 1-based index for result
 			tide_index += 1
 		# Move to the next day and start from the first tide of that day
@@ -65,7 +71,7 @@ def find_next_tide(*, tide_days: list[TideDay], day_number: int, tide_number: in
 
 
 def find_this_or_next_water(*, tide_days: list[TideDay], life_cycle: str,
-							day_number: int, tide_number: int):
+							day_number: int, tide_number: int, index=None):
 	"""
 	Finds the next high water (HW) or low water (LW) tide in a list of TideDay objects,
 	starting from the given day and tide number.
@@ -76,6 +82,7 @@ def find_this_or_next_water(*, tide_days: list[TideDay], life_cycle: str,
 	- life_cycle: The type of tide to find (HW or LW).
 	- day_number: The day number (1-based index) to start the search from.
 	- tide_number: The tide number (1-based index) within the start day to start the search from.
+	- index: An optional TideIndex of tide_days, for O(1) lookups instead of scans.
 
 	Returns:
 	- A tuple (tide_height, day_number, tide_number) indicating the tide height object, and the day and tide number of the next HW or LW.
@@ -88,7 +95,7 @@ def find_this_or_next_water(*, tide_days: list[TideDay], life_cycle: str,
 		cw, cw_day_number, cw_tide_number = specified_tide, day_number, tide_number
 	else:
 		cw, cw_day_number, cw_tide_number = find_next_tide(
-			tide_days=tide_days, day_number=day_number, tide_number=tide_number)
+			tide_days=tide_days, day_number=day_number, tide_number=tide_number, index=index)
 		if cw.type != life_cycle:
 			raise ValueError(f"No {life_cycle} found in the provided data.")
 	return cw, cw_day_number, cw_tide_number
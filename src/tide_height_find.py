@@ -1,14 +1,107 @@
 import datetime
 
+import numpy as np
+
 from src.lib import debug, debug_func
-from src.tide_tables import TideHeight
+from src.tide_columns import HW_CODE, LW_CODE
+from src.tide_index import TideIndex
+from src.tide_inverse import shared_inverse_cache
+from src.tide_model import HarmonicModel
+from src.tide_tables import TideHeight, TideDay
+from src.tide_time_utils import MICROSECONDS_PER_MINUTE, MICROSECONDS_PER_DAY, time_to_microseconds, \
+	epoch_microseconds_to_datetime, divide_round_half_even, scale_microseconds
+
+
+# Solvers of find_height_time_between_tides
+BISECT = 'bisect'
+NEWTON = 'newton'
+LOOKUP = 'lookup'
+
+
+def _derivative(compute_height, tide_time: float):
+	derivative = getattr(compute_height, 'derivative', None)
+	if derivative is not None:
+		return float(derivative(tide_time))
+	step = 1e-6
+	return (compute_height(tide_time + step) - compute_height(tide_time - step)) / (2 * step)
+
+
+def solve_tide_hour(compute_height, height_to_find: float, start_tide_hour: float, end_tide_hour: float,
+					tolerance: float, max_iterations=50):
+	"""
+	Finds the tide hour where a tide curve reaches a height, with a safeguarded Newton method.
+
+	The result is the limit of the bisection of find_height_time_between_tides: when the
+	height is not reached between the two tide hours, it is the end towards which the
+	bisection moves.
+
+	Parameters:
+	- compute_height: the tide height function, using its `derivative` method when it has one.
+	- height_to_find: the height to find.
+	- start_tide_hour, end_tide_hour: the 12-based tide hours bracketing the search.
+	- tolerance: the precision of the result, in tide hours.
+	- max_iterations: the maximum number of Newton or bisection steps, after which the middle
+	  of the remaining bracket is returned.
+
+	Returns:
+	- The tide hour, as a float.
+	"""
+	start_height = compute_height(start_tide_hour)
+	end_height = compute_height(end_tide_hour)
+	# g < 0 where the bisection moves its start, and g >= 0 where it moves its end
+	sign = 1.0 if start_height < end_height else -1.0
+
+	def g(tide_time):
+		return sign * (compute_height(tide_time) - height_to_find)
+
+	low, high = start_tide_hour, end_tide_hour
+	g_low, g_high = g(low), g(high)
+	if g_low >= 0:
+		return low
+	if g_high < 0:
+		return high
+
+	# Start from the secant point, then take Newton steps, falling back to bisection
+	# whenever a step leaves the bracket
+	x = low + (high - low) * g_low / (g_low - g_high)
+	for _ in range(max_iterations):
+		g_x = g(x)
+		if g_x < 0:
+			low = x
+		else:
+			high = x
+		slope = sign * _derivative(compute_height, x)
+		next_x = x - g_x / slope if slope != 0 else low - 1
+		if not (low < next_x < high):
+			next_x = low + (high - low) / 2
+		if abs(next_x - x) <= tolerance or high - low <= tolerance:
+			return next_x
+		x = next_x
+	return low + (high - low) / 2
+
+
+def _debug_bisection(start_time: int, end_time: int, start_time_12_hours: float, end_time_12_hours: float,
+					 start_height: float, end_height: float, mid_time: int = None, mid_time_12_hours: float = None,
+					 mid_height: float = None):
+	"""Prints a step of the bisection of find_height_time_between_tides, converting its times only when debugging."""
+	start_time, end_time = epoch_microseconds_to_datetime(start_time), epoch_microseconds_to_datetime(end_time)
+	if mid_time is None:
+		debug(f"Start time: {start_time}, end time: {end_time}")
+		debug(f"12-hours-based: Start time: {start_time_12_hours:.1f}, end time: {end_time_12_hours:.1f}")
+		debug(f"Start height: {start_height:.1f}, end height: {end_height:.1f}")
+		return
+	debug(f"Start time: {start_time}, end time: {end_time}, mid time: {epoch_microseconds_to_datetime(mid_time)}")
+	debug(f"12-hours-based start time: {start_time_12_hours:.1f}, end time: {end_time_12_hours:.1f}, mid time: {mid_time_12_hours:.1f}")
+	debug(f"Start height: {start_height:.1f}, end height: {end_height:.1f}, mid height: {mid_height:.1f}")
 
 
 def find_height_time_between_tides(*, height_to_find: float,
 								   first_tide_info: (TideHeight, int),
 								   second_tide_info: (TideHeight, int),
 								   compute_height_for_hw: bool,
-								   compute_height_for_first_tide: bool):
+								   compute_height_for_first_tide: bool,
+								   solver=BISECT,
+								   tolerance=datetime.timedelta(seconds=1)):
 	"""
 	Finds the time between two tides when the tide height is equal to a given height.
 
@@ -18,20 +111,25 @@ def find_height_time_between_tides(*, height_to_find: float,
 	- second_tide_info: A tuple (tide_height, day_number) representing the second tide.
 	- compute_height_for_hw: A boolean indicating whether to compute the height for high water (HW).
 	- compute_height_for_first_tide: A boolean indicating whether to compute the height for the first tide.
+	- solver: BISECT to bisect the time interval down to a minute, NEWTON to solve for the
+	  tide hour with a safeguarded Newton method, or LOOKUP to interpolate it in the cached
+	  InverseCurve of the curve, within its `max_error`; the tide hour is then converted to
+	  a time once.
+	- tolerance: The precision of the NEWTON solver, as a timedelta.
 
 	Returns:
-	- A tuple (day_number, time) representing the day number and time of the tide height.`
+	- A tuple (day_number, time) representing the day number and time of the tide height.
+	  The time is a datetime on the EPOCH date of the first tide, plus the days to the tide height.
 	"""
 
 	first_tide, first_tide_day_number = first_tide_info
 	second_tide, second_tide_day_number = second_tide_info
-	start_date = datetime.date.today()
-	end_date = start_date + datetime.timedelta(
-		days=second_tide_day_number - first_tide_day_number)
-	debug(f"Start date: {start_date}, end date: {end_date}, First tide day number: {first_tide_day_number}, Second tide day number: {second_tide_day_number}")
+	debug(f"First tide day number: {first_tide_day_number}, Second tide day number: {second_tide_day_number}")
 
-	start_time = datetime.datetime.combine(start_date, first_tide.time)
-	end_time = datetime.datetime.combine(end_date, second_tide.time)
+	# Times are integer microseconds since EPOCH, the deterministic reference date of the first tide
+	start_time = time_to_microseconds(first_tide.time)
+	end_time = (second_tide_day_number - first_tide_day_number) * MICROSECONDS_PER_DAY + \
+		time_to_microseconds(second_tide.time)
 
 	if compute_height_for_first_tide:
 		if compute_height_for_hw:
@@ -55,22 +153,34 @@ def find_height_time_between_tides(*, height_to_find: float,
 	start_height = tide_for_calculations.compute_height(start_time_12_hours)
 	end_height = tide_for_calculations.compute_height(end_time_12_hours)
 
+	if solver in (NEWTON, LOOKUP):
+		tide_hours = end_time_12_hours - start_time_12_hours
+		duration = end_time - start_time
+		if solver == NEWTON:
+			tolerance = tolerance // datetime.timedelta(microseconds=1)
+			tide_hour = solve_tide_hour(
+				tide_for_calculations.compute_height, height_to_find, start_time_12_hours, end_time_12_hours,
+				tolerance=tolerance / abs(duration) * tide_hours if duration else tide_hours)
+		else:
+			tide_hour = float(shared_inverse_cache.get(tide_for_calculations.compute_height).tide_hour(
+				height_to_find, start_time_12_hours, end_time_12_hours))
+		start_time = start_time + scale_microseconds(duration, (tide_hour - start_time_12_hours) / tide_hours)
+	elif solver != BISECT:
+		raise ValueError(f"Unknown solver {solver!r}.")
+
 	debug(f"First tide")
 	debug_func(first_tide.print)
 	debug(f"Second tide")
 	debug_func(second_tide.print)
 
-	debug(f"Start time: {start_time}, end time: {end_time}")
-	debug(f"12-hours-based: Start time: {start_time_12_hours:.1f}, end time: {end_time_12_hours:.1f}")
-	debug(f"Start height: {start_height:.1f}, end height: {end_height:.1f}")
+	debug_func(_debug_bisection, start_time, end_time, start_time_12_hours, end_time_12_hours, start_height, end_height)
 
-	while (end_time - start_time) > datetime.timedelta(minutes=1):  # Precision threshold
-		mid_time = start_time + (end_time - start_time) / 2
+	while solver == BISECT and end_time - start_time > MICROSECONDS_PER_MINUTE:  # Precision threshold
+		mid_time = start_time + divide_round_half_even(end_time - start_time, 2)
 		mid_time_12_hours = start_time_12_hours + (end_time_12_hours - start_time_12_hours) / 2
-		debug(f"Start time: {start_time}, end time: {end_time}, mid time: {mid_time}")
-		debug(f"12-hours-based start time: {start_time_12_hours:.1f}, end time: {end_time_12_hours:.1f}, mid time: {mid_time_12_hours:.1f}")
 		mid_height = tide_for_calculations.compute_height(mid_time_12_hours)
-		debug(f"Start height: {start_height:.1f}, end height: {end_height:.1f}, mid height: {mid_height:.1f}")
+		debug_func(_debug_bisection, start_time, end_time, start_time_12_hours, end_time_12_hours,
+				   start_height, end_height, mid_time, mid_time_12_hours, mid_height)
 
 		if (mid_height < height_to_find and start_height < end_height) or (
 				mid_height > height_to_find and start_height > end_height):
@@ -81,13 +191,150 @@ def find_height_time_between_tides(*, height_to_find: float,
 			end_time_12_hours = mid_time_12_hours
 
 	# Reset precision to minutes
-	start_time = start_time.replace(second=0, microsecond=0)
+	start_time -= start_time % MICROSECONDS_PER_MINUTE
 
-	start_day_number = first_tide_day_number
-	if start_time.day > start_date.day:
-		start_day_number += start_time.day - start_date.day
-	debug(f"Start day number: {start_day_number}, Start time: {start_time}, End time: {end_time}")
+	start_day_number = first_tide_day_number + start_time // MICROSECONDS_PER_DAY
+	start_time = epoch_microseconds_to_datetime(start_time)
+	debug(f"Start day number: {start_day_number}, Start time: {start_time}, End time: {epoch_microseconds_to_datetime(end_time)}")
 
 	return start_day_number, start_time
 
 
+class _CurveRows:
+	"""
+	Evaluates one tide curve per row of a (rows x columns) array of tide hours, with a single
+	broadcast HarmonicModel when all the curves are harmonic, else one call per distinct curve.
+	"""
+
+	def __init__(self, curves: list):
+		self.curves = curves
+		self.model = None
+		if curves and all(isinstance(c, HarmonicModel) and c.shape == () for c in curves) and \
+				len({c.centered_on_hw for c in curves}) == 1:
+			column = (slice(None), np.newaxis)
+			self.model = HarmonicModel(
+				min_water_factor=np.array([c.min_water_factor for c in curves], dtype=float)[column],
+				max_water_factor=np.array([c.max_water_factor for c in curves], dtype=float)[column],
+				neap_factor=np.array([c.neap_factor for c in curves], dtype=float)[column],
+				centered_on_hw=curves[0].centered_on_hw)
+		else:
+			self.groups = {}
+			for row, curve in enumerate(curves):
+				self.groups.setdefault(id(curve), (curve, []))[1].append(row)
+
+	def _apply(self, method: str, tide_time: np.ndarray):
+		if self.model is not None:
+			return getattr(self.model, method)(tide_time) if method else self.model(tide_time)
+		result = np.empty(tide_time.shape)
+		for curve, rows in self.groups.values():
+			if method:
+				result[rows] = [[_derivative(curve, t) for t in row] for row in tide_time[rows]]
+			else:
+				result[rows] = [[curve(t) for t in row] for row in tide_time[rows]]
+		return result
+
+	def __call__(self, tide_time: np.ndarray):
+		return self._apply('', tide_time)
+
+	def derivative(self, tide_time: np.ndarray):
+		return self._apply('derivative', tide_time)
+
+
+def solve_tide_hours(curves: list, heights_to_find, start_tide_hours, end_tide_hours, tolerance: float,
+					 max_iterations=50, clamp=False):
+	"""
+	The vectorized `solve_tide_hour`: solves many curves for many heights in lock-step.
+
+	Parameters:
+	- curves: one tide height function per row.
+	- heights_to_find: a 1-D array of heights, one per column.
+	- start_tide_hours, end_tide_hours: 1-D arrays of the 12-based tide hours bracketing each row.
+	- tolerance: the precision of the results, in tide hours.
+	- max_iterations: the maximum number of Newton or bisection steps.
+	- clamp: whether heights a curve does not reach give the bracketing tide hour towards which
+	  the bisection converges, like `solve_tide_hour`, instead of NaN.
+
+	Returns:
+	- A (rows x heights) float array of tide hours, NaN where the curve does not reach the height
+	  between the bracketing tide hours, unless `clamp` is set.
+	"""
+	rows = _CurveRows(curves)
+	heights_to_find = np.asarray(heights_to_find, dtype=float)[np.newaxis, :]
+	shape = (len(curves), heights_to_find.shape[1])
+	low = np.broadcast_to(np.asarray(start_tide_hours, dtype=float)[:, np.newaxis], shape).copy()
+	high = np.broadcast_to(np.asarray(end_tide_hours, dtype=float)[:, np.newaxis], shape).copy()
+	start, end = low.copy(), high.copy()
+
+	sign = np.where(rows(low) < rows(high), 1.0, -1.0)
+	g_low = sign * (rows(low) - heights_to_find)
+	g_high = sign * (rows(high) - heights_to_find)
+	reached = (g_low < 0) & (g_high >= 0)
+	at_start = g_low == 0
+
+	with np.errstate(divide='ignore', invalid='ignore'):
+		x = np.where(reached, low + (high - low) * g_low / (g_low - g_high), low)
+		active = reached.copy()
+		for _ in range(max_iterations):
+			if not active.any():
+				break
+			g_x = sign * (rows(x) - heights_to_find)
+			low = np.where(active & (g_x < 0), x, low)
+			high = np.where(active & (g_x >= 0), x, high)
+			next_x = x - g_x / (sign * rows.derivative(x))
+			outside = ~((low < next_x) & (next_x < high))
+			next_x = np.where(outside, low + (high - low) / 2, next_x)
+			converged = (np.abs(next_x - x) <= tolerance) | (high - low <= tolerance)
+			x = np.where(active, next_x, x)
+			active &= ~converged
+	if clamp:
+		return np.where(reached, x, np.where(g_low >= 0, start, end))
+	return np.where(reached, x, np.where(at_start, start, np.nan))
+
+
+def find_height_times(*, tide_days: list[TideDay], heights_to_find, brackets=None, index: TideIndex = None,
+					  tolerance=datetime.timedelta(seconds=1)):
+	"""
+	Finds the times when the tide crosses many heights, between many pairs of successive tides.
+
+	Each bracket is a LW / HW pair of successive tides, solved on the curve of its HW like the
+	intervals of `determine_min_water_height_interval` do: tide hours 0 to 6 when rising to the
+	HW, and 6 to 12 when falling from it.  All the (bracket, height) pairs are solved at once,
+	with the lock-step Newton iteration of `solve_tide_hours`.
+
+	Parameters:
+	- tide_days: List of TideDay objects, or a TideTable.
+	- heights_to_find: an array of heights.
+	- brackets: an array of TideIndex ordinals; bracket `o` spans tides `o` and `o + 1`.
+	  Defaults to every pair of successive tides.
+	- index: an optional TideIndex of tide_days, built if not given.
+	- tolerance: the precision of the solver, as a timedelta.
+
+	Returns:
+	- A (brackets x heights) numpy datetime64[m] array of the crossing times, floored to the minute
+	  like `find_height_time_between_tides`, and NaT where the tide does not cross the height, or
+	  where the bracket is not a LW / HW pair.
+	"""
+	if index is None:
+		index = TideIndex(tide_days)
+	if brackets is None:
+		brackets = np.arange(max(index.tides_count - 1, 0))
+	first = np.asarray(brackets, dtype=np.int64)
+	second = first + 1
+	is_rising = (index.types[first] == LW_CODE) & (index.types[second] == HW_CODE)
+	is_falling = (index.types[first] == HW_CODE) & (index.types[second] == LW_CODE)
+
+	hw_ordinals = np.where(is_rising, second, first)
+	curves = [index.tide(int(o)).compute_height for o in hw_ordinals]
+	start_tide_hours = np.where(is_rising, 0.0, 6.0)
+	start_times = index.times[first]
+	durations = index.times[second] - start_times
+	with np.errstate(divide='ignore', invalid='ignore'):
+		tolerances = np.where(durations > 0, tolerance / datetime.timedelta(microseconds=1) / durations * 6, 6)
+	tide_hours = solve_tide_hours(curves, heights_to_find, start_tide_hours, start_tide_hours + 6,
+								  tolerance=float(tolerances.min()) if len(tolerances) else 0.0)
+
+	valid = (is_rising | is_falling)[:, np.newaxis] & ~np.isnan(tide_hours)
+	offsets = np.where(valid, (tide_hours - start_tide_hours[:, np.newaxis]) / 6, 0.0) * durations[:, np.newaxis]
+	times = start_times[:, np.newaxis] + np.rint(offsets).astype(np.int64)
+	minutes = np.floor_divide(times, MICROSECONDS_PER_MINUTE)
+	return np.where(valid, minutes, np.datetime64('NaT', 'm').astype(np.int64)).astype('datetime64[m]')
@@ -1,9 +1,15 @@
 import datetime
 
+import numpy as np
+
 from src.lib import debug
+from src.tide_columns import LW_CODE, HW_CODE
+from src.tide_index import TideIndex
 from src.tide_find import find_this_or_next_water, find_previous_tide, find_next_tide
-from src.tide_height_find import find_height_time_between_tides
+from src.tide_height_find import find_height_time_between_tides, solve_tide_hours, BISECT
 from src.tide_tables import TideHeight, TideDay
+from src.tide_time_utils import MICROSECONDS_PER_MINUTE, datetime_to_epoch_microseconds, time_to_microseconds, \
+	microseconds_to_time
 
 
 class TidePointInTime:
@@ -39,7 +45,9 @@ def determine_water_height_interval(life_cycle,
 									tide_days: list[TideDay],
 									day_number: int, tide_number: int,
 									height_to_find: float,
-									tide_duration: datetime.datetime = None):
+									tide_duration: datetime.datetime = None,
+									index=None,
+									solver=BISECT):
 	"""
 	Determines the interval during which the tide height is at least or at most a given height,
 	depending on the life_cycle parameter:
@@ -53,6 +61,8 @@ def determine_water_height_interval(life_cycle,
 	- tide_number: The tide number (1-based index) within the start day to start the search from.
 	- height_to_find: The height to find between the two tides.
 	- tide_duration: The typical duration of a tide cycle, used at the start and end of the tidal data.
+	- index: An optional TideIndex of tide_days, for O(1) tide lookups instead of scans.
+	- solver: The solver of find_height_time_between_tides, BISECT, NEWTON or LOOKUP.
 
 	Returns:
 	- A TideInterval object representing the interval during which the tide height is at least or at most the given height.
@@ -62,12 +72,12 @@ def determine_water_height_interval(life_cycle,
 	# in the parameter
 	cw, cw_day_number, cw_tide_number = find_this_or_next_water(
 		tide_days=tide_days, life_cycle=life_cycle,
-		day_number=day_number, tide_number=tide_number)
+		day_number=day_number, tide_number=tide_number, index=index)
 
 	prev_tide, prev_tide_day_number, _ = find_previous_tide(
-		tide_days=tide_days, day_number=day_number, tide_number=cw_tide_number)
+		tide_days=tide_days, day_number=day_number, tide_number=cw_tide_number, index=index)
 	next_tide, next_tide_day_number, _ = find_next_tide(
-		tide_days=tide_days, day_number=day_number, tide_number=cw_tide_number)
+		tide_days=tide_days, day_number=day_number, tide_number=cw_tide_number, index=index)
 
 	if cw is None:
 		raise ValueError("No high water found in the provided data.")
@@ -77,14 +87,15 @@ def determine_water_height_interval(life_cycle,
 	if tide_duration is None:
 		tide_duration = datetime.timedelta(hours=6, minutes=20)
 
-	cw_full_time = datetime.datetime.combine(datetime.datetime.now(), cw.time)
+	cw_time = time_to_microseconds(cw.time)
+	tide_duration = tide_duration // datetime.timedelta(microseconds=1)
 	if next_tide is None:
 		# We are at the end of the tidal data
 		# Set a fake next tide, based on a typical tide duration
 		# We copy the previous tide values, except for the time
 		next_tide_day_number = prev_tide_day_number + 1
 		next_tide = TideHeight(
-			time=(cw_full_time + tide_duration).time(),
+			time=microseconds_to_time(cw_time + tide_duration),
 			height=prev_tide.height,
 			life_cycle=prev_tide.type,
 			neap_level=prev_tide.neap_level,
@@ -97,7 +108,7 @@ def determine_water_height_interval(life_cycle,
 		# We copy the next tide values, except for the time
 		prev_tide_day_number = next_tide_day_number - 1
 		prev_tide = TideHeight(
-			time=(cw_full_time - tide_duration).time(),
+			time=microseconds_to_time(cw_time - tide_duration),
 			height=next_tide.height,
 			life_cycle=next_tide.type,
 			neap_level=next_tide.neap_level,
@@ -110,7 +121,8 @@ def determine_water_height_interval(life_cycle,
 		first_tide_info=(prev_tide, prev_tide_day_number),
 		second_tide_info=(cw, day_number),
 		compute_height_for_hw=(life_cycle == TideHeight.HW),
-		compute_height_for_first_tide=False)
+		compute_height_for_first_tide=False,
+		solver=solver)
 
 	# Find the second time corresponding to the given height
 	end_day_number, end_time = find_height_time_between_tides(
@@ -118,7 +130,8 @@ def determine_water_height_interval(life_cycle,
 		first_tide_info=(cw, day_number),
 		second_tide_info=(next_tide, next_tide_day_number),
 		compute_height_for_hw=(life_cycle == TideHeight.HW),
-		compute_height_for_first_tide=True)
+		compute_height_for_first_tide=True,
+		solver=solver)
 
 	return TideInterval(
 		start=TidePointInTime(day_number=start_day_number, time=start_time),
@@ -129,7 +142,9 @@ def determine_water_height_interval(life_cycle,
 def determine_min_water_height_interval(tide_days: list[TideDay],
 										day_number: int, tide_number: int,
 										height_to_find: float,
-										tide_duration: datetime.datetime = None):
+										tide_duration: datetime.datetime = None,
+										index=None,
+										solver=BISECT):
 	"""
 	Determines the interval during which the tide height is at least a given height.
 
@@ -139,6 +154,8 @@ def determine_min_water_height_interval(tide_days: list[TideDay],
 	- tide_number: The tide number (1-based index) within the start day to start the search from.
 	- height_to_find: The height to find between the two tides.
 	- tide_duration: The typical duration of a tide cycle, used at the start and end of the tidal data.
+	- index: An optional TideIndex of tide_days, for O(1) tide lookups instead of scans.
+	- solver: The solver of find_height_time_between_tides, BISECT, NEWTON or LOOKUP.
 
 	Returns:
 	- A TideInterval object representing the interval during which the tide height is at least the given height.
@@ -149,14 +166,18 @@ def determine_min_water_height_interval(tide_days: list[TideDay],
 		day_number=day_number,
 		tide_number=tide_number,
 		height_to_find=height_to_find,
-		tide_duration=tide_duration
+		tide_duration=tide_duration,
+		index=index,
+		solver=solver
 	)
 
 
 def determine_max_water_height_intervals(tide_days: list[TideDay],
 										 day_number: int, tide_number: int,
 										 height_to_find: float,
-										 tide_duration: datetime.datetime = None):
+										 tide_duration: datetime.datetime = None,
+										 index=None,
+										 solver=BISECT):
 	"""
 	Determines the intervals during which the tide height is at most a given height.
 
@@ -166,6 +187,8 @@ def determine_max_water_height_intervals(tide_days: list[TideDay],
 	- tide_number: The tide number (1-based index) within the start day to start the search from.
 	- height_to_find: The height to find between the two tides.
 	- tide_duration: The typical duration of a tide cycle, used at the start and end of the tidal data.
+	- index: An optional TideIndex of tide_days, for O(1) tide lookups instead of scans.
+	- solver: The solver of find_height_time_between_tides, BISECT, NEWTON or LOOKUP.
 
 	Returns:
 	- A list of two TideInterval objects representing the intervals during which the tide height is at most the given height:
@@ -175,10 +198,10 @@ def determine_max_water_height_intervals(tide_days: list[TideDay],
 
 	_, hw_day_number, hw_tide_number = find_this_or_next_water(
 		tide_days=tide_days, life_cycle=TideHeight.HW,
-		day_number=day_number, tide_number=tide_number)
+		day_number=day_number, tide_number=tide_number, index=index)
 
 	_, prev_lw_day_number, prev_lw_tide_number = find_previous_tide(
-		tide_days=tide_days, day_number=hw_day_number, tide_number=hw_tide_number)
+		tide_days=tide_days, day_number=hw_day_number, tide_number=hw_tide_number, index=index)
 
 	interval_before_hw = determine_water_height_interval(
 		life_cycle=TideHeight.LW,
@@ -186,11 +209,13 @@ def determine_max_water_height_intervals(tide_days: list[TideDay],
 		day_number=prev_lw_day_number,
 		tide_number=prev_lw_tide_number,
 		height_to_find=height_to_find,
-		tide_duration=tide_duration
+		tide_duration=tide_duration,
+		index=index,
+		solver=solver
 	)
 
 	_, next_lw_day_number, next_lw_tide_number = find_next_tide(
-		tide_days=tide_days, day_number=hw_day_number, tide_number=hw_tide_number)
+		tide_days=tide_days, day_number=hw_day_number, tide_number=hw_tide_number, index=index)
 
 	interval_after_hw = determine_water_height_interval(
 		life_cycle=TideHeight.LW,
@@ -198,7 +223,154 @@ def determine_max_water_height_intervals(tide_days: list[TideDay],
 		day_number=next_lw_day_number,
 		tide_number=next_lw_tide_number,
 		height_to_find=height_to_find,
-		tide_duration=tide_duration
+		tide_duration=tide_duration,
+		index=index,
+		solver=solver
 	)
 
 	return [interval_before_hw, interval_after_hw]
+
+
+def _limb_times(tide_hours: np.ndarray, start_tide_hours: np.ndarray, start_times: np.ndarray, end_times: np.ndarray):
+	"""Converts tide hours on 6-hour limbs to epoch microseconds between the limb start and end times."""
+	offsets = (tide_hours - start_tide_hours) / 6 * (end_times - start_times)
+	return start_times + np.rint(offsets).astype(np.int64)
+
+
+def center_water_windows(index: TideIndex, center_waters: np.ndarray, heights: np.ndarray, above=True, *,
+						 tide_duration: datetime.timedelta = None, tolerance=datetime.timedelta(seconds=1)):
+	"""
+	Computes the unmerged window around each given HW (or LW), for many heights at once, like
+	`determine_water_height_interval` does around one tide.
+
+	Parameters:
+	- index: The TideIndex of the tides.
+	- center_waters: The ordinals of the HW (or LW, for `above=False`) tides.
+	- heights: A 1-D array of heights.
+	- above, tide_duration, tolerance: as in `scan_height_windows`.
+
+	Returns:
+	- A tuple (starts, ends) of (heights x center waters) int64 arrays of the window bounds, in
+	  minutes since EPOCH; a window that does not start before it ends is empty.
+	"""
+	if tide_duration is None:
+		tide_duration = datetime.timedelta(hours=6, minutes=20)
+	duration = tide_duration // datetime.timedelta(microseconds=1)
+
+	cw = np.asarray(center_waters, dtype=np.int64)
+	cw_times = index.times[cw]
+	previous_times = np.where(cw > 0, index.times[np.maximum(cw - 1, 0)], cw_times - duration)
+	next_times = np.where(cw + 1 < index.tides_count, index.times[np.minimum(cw + 1, index.tides_count - 1)],
+						  cw_times + duration)
+
+	# On the curve of the center water, the HW is at tide hour 6 and the LW at 0 or 12
+	before_tide_hours = np.full(len(cw), 0.0 if above else 6.0)
+	after_tide_hours = np.full(len(cw), 6.0 if above else 0.0)
+	curves = [index.tide(int(o)).compute_height for o in cw]
+	tolerance_hours = tolerance / tide_duration * 6
+	before = solve_tide_hours(curves, heights, before_tide_hours, before_tide_hours + 6,
+							  tolerance=tolerance_hours, clamp=True)
+	after = solve_tide_hours(curves, heights, after_tide_hours, after_tide_hours + 6,
+							 tolerance=tolerance_hours, clamp=True)
+
+	column = (slice(None), np.newaxis)
+	starts = _limb_times(before, before_tide_hours[column], previous_times[column], cw_times[column])
+	ends = _limb_times(after, after_tide_hours[column], cw_times[column], next_times[column])
+	return starts.T // MICROSECONDS_PER_MINUTE, ends.T // MICROSECONDS_PER_MINUTE
+
+
+def merge_windows(starts: np.ndarray, ends: np.ndarray):
+	"""
+	Drops the empty windows, and merges the windows that touch or overlap the previous one,
+	of many rows of windows at once.
+
+	Parameters:
+	- starts, ends: (rows x windows) arrays of window bounds, each row in time order.
+
+	Returns:
+	- A tuple (rows, starts, ends) of 1-D arrays: the row and the bounds of each merged window,
+	  sorted by row, then time.
+	"""
+	rows = np.broadcast_to(np.arange(starts.shape[0])[:, np.newaxis], starts.shape)
+	is_window = starts < ends
+	rows, starts, ends = rows[is_window], starts[is_window], ends[is_window]
+	if len(starts) == 0:
+		return rows, starts, ends
+
+	# Shifting each row's windows past the previous row's makes the running maximum restart at every row
+	shifts = rows * (int(ends.max() - starts.min()) + 2)
+	running_ends = np.maximum.accumulate(ends + shifts) - shifts
+	is_first = np.concatenate(([True], (starts[1:] > running_ends[:-1]) | (rows[1:] != rows[:-1])))
+	first = np.flatnonzero(is_first)
+	return rows[first], starts[first], np.maximum.reduceat(ends, first)
+
+
+def scan_fleet_height_windows(tide_days: list[TideDay], heights, above=True,
+							  start: datetime.datetime = None, end: datetime.datetime = None, *,
+							  tide_duration: datetime.timedelta = None, index: TideIndex = None,
+							  tolerance=datetime.timedelta(seconds=1)):
+	"""
+	The fleet version of `scan_height_windows`: finds the windows of many heights, e.g. the
+	drafts plus clearance margins of many vessels, in one shared pass over the tides.
+
+	The neighbours of each HW (or LW) are resolved once, and the curves of all the tides are
+	evaluated together for all the distinct heights, by `center_water_windows`.  Equal heights
+	are solved once, and the windows of all the heights are merged at once by `merge_windows`,
+	so the cost is a sort of the heights plus one solve per tide and distinct height.
+
+	Parameters:
+	- tide_days: List of TideDay objects, or a TideTable.
+	- heights: A sequence of heights, in any order, possibly repeated.
+	- above, start, end, tide_duration, index, tolerance: as in `scan_height_windows`.
+
+	Returns:
+	- A list of (windows x 2) numpy datetime64[m] arrays, the windows of each height, in the
+	  order of `heights`.
+	"""
+	if index is None:
+		index = TideIndex(tide_days)
+	distinct_heights, height_of = np.unique(np.asarray(heights, dtype=float), return_inverse=True)
+	center_waters = np.flatnonzero(index.types == (HW_CODE if above else LW_CODE))
+	groups, window_starts, window_ends = merge_windows(*center_water_windows(
+		index, center_waters, distinct_heights, above, tide_duration=tide_duration, tolerance=tolerance))
+
+	keep = np.ones(len(window_starts), dtype=bool)
+	if start is not None:
+		keep &= window_ends >= datetime_to_epoch_microseconds(start) // MICROSECONDS_PER_MINUTE
+	if end is not None:
+		keep &= window_starts <= datetime_to_epoch_microseconds(end) // MICROSECONDS_PER_MINUTE
+	windows = np.stack((window_starts[keep], window_ends[keep]), axis=-1).astype('datetime64[m]')
+	bounds = np.searchsorted(groups[keep], np.arange(len(distinct_heights) + 1))
+	windows_of = [windows[bounds[i]:bounds[i + 1]] for i in range(len(distinct_heights))]
+	return [windows_of[i] for i in height_of]
+
+
+def scan_height_windows(tide_days: list[TideDay], height: float, above=True,
+						start: datetime.datetime = None, end: datetime.datetime = None, *,
+						tide_duration: datetime.timedelta = None, index: TideIndex = None,
+						tolerance=datetime.timedelta(seconds=1)):
+	"""
+	Finds all the windows during which the tide height is at least, or at most, a given height.
+
+	Every HW (or LW, for `above=False`) is solved at once: like `determine_water_height_interval`,
+	the window around it spans from the crossing of the height between the previous tide and
+	the HW, to the crossing between the HW and the next tide, both on the curve of the HW.
+	The first and last tides get a synthetic previous / next tide, `tide_duration` away.
+	Windows around a tide that does not reach the height are dropped, and windows that touch
+	or overlap are merged.
+
+	Parameters:
+	- tide_days: List of TideDay objects, or a TideTable.
+	- height: The height of the windows.
+	- above: Whether to find the windows where the height is at least (HW) or at most (LW) `height`.
+	- start, end: Optional datetimes; only the windows overlapping [start, end] are returned.
+	- tide_duration: The typical duration of a tide cycle, used at the start and end of the tidal data.
+	- index: An optional TideIndex of tide_days, built if not given.
+	- tolerance: The precision of the crossing times, as a timedelta.
+
+	Returns:
+	- A (windows x 2) numpy datetime64[m] array of the (start, end) of each window, floored to the
+	  minute like `find_height_time_between_tides`.
+	"""
+	return scan_fleet_height_windows(tide_days, [height], above=above, start=start, end=end,
+									 tide_duration=tide_duration, index=index, tolerance=tolerance)[0]
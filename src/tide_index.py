@@ -0,0 +1,186 @@
+import datetime
+
+import numpy as np
+
+from src.tide_columns import TideTable, LIFE_CYCLE_CODES, LW_CODE, HW_CODE
+from src.tide_tables import TideDay, TideHeight
+from src.tide_time_utils import MICROSECONDS_PER_MINUTE, datetime_to_epoch_microseconds, \
+	epoch_microseconds_to_datetime, timedelta_to_twelve_based_tide_hours
+
+# Code of the tides that are neither HW nor LW
+OTHER_CODE = -1
+
+
+def _previous_of_mask(mask: np.ndarray):
+	"""For each position, the last position at or before it where `mask` is set, or -1."""
+	return np.maximum.accumulate(np.where(mask, np.arange(len(mask)), -1)) if len(mask) else np.empty(0, dtype=np.int64)
+
+
+def _next_of_mask(mask: np.ndarray):
+	"""For each position, the first position at or after it where `mask` is set, or -1."""
+	n = len(mask)
+	if n == 0:
+		return np.empty(0, dtype=np.int64)
+	first = np.minimum.accumulate(np.where(mask, np.arange(n), n)[::-1])[::-1]
+	return np.where(first == n, -1, first)
+
+
+class TideIndex:
+	"""
+	A flat index over the tides of a list of TideDay objects, or of a TideTable.
+
+	Tides are numbered with a global 0-based ordinal, in time order.  Converting between
+	(day_number, tide_number) and ordinals, and finding the previous / next HW or LW of
+	any tide, are O(1) array lookups.  Finding the tides around any datetime is a binary
+	search over the sorted tide times.  The index must be rebuilt if the tide days change.
+
+	Attributes:
+	- tide_days: the indexed tide days.
+	- day_offsets: int64 prefix offsets, day `i` holds the ordinals `day_offsets[i]:day_offsets[i + 1]`.
+	- day_of_tide: the 0-based day index of each tide.
+	- types: the int8 life cycle code of each tide, LW_CODE, HW_CODE or OTHER_CODE.
+	- times: the int64 microseconds since EPOCH of each tide, sorted.
+	"""
+
+	def __init__(self, tide_days: list[TideDay]):
+		self.tide_days = tide_days
+		if isinstance(tide_days, TideTable):
+			self.day_offsets = tide_days.day_offsets
+			self.types = tide_days.types
+			self.times = tide_days.times * MICROSECONDS_PER_MINUTE
+		else:
+			self.day_offsets = np.concatenate(([0], np.cumsum([len(d.heights) for d in tide_days], dtype=np.int64)))
+			self.types = np.array([LIFE_CYCLE_CODES.get(tide.type, OTHER_CODE)
+								   for tide_day in tide_days for tide in tide_day.heights], dtype=np.int8)
+			self.times = np.array([datetime_to_epoch_microseconds(datetime.datetime.combine(tide_day.date, tide.time))
+								   for tide_day in tide_days for tide in tide_day.heights], dtype=np.int64)
+		self.day_of_tide = np.repeat(np.arange(len(self.day_offsets) - 1), np.diff(self.day_offsets))
+
+		# Rows: LW_CODE, HW_CODE, then any water; each entry is the ordinal of the last / first
+		# tide of the row's type at or before / at or after the tide, or -1
+		masks = (self.types == LW_CODE, self.types == HW_CODE, self.types != OTHER_CODE)
+		self._last_of_type = np.array([_previous_of_mask(mask) for mask in masks]).reshape(3, -1)
+		self._first_of_type = np.array([_next_of_mask(mask) for mask in masks]).reshape(3, -1)
+
+	@property
+	def tides_count(self):
+		return len(self.types)
+
+	def ordinal(self, day_number: int, tide_number: int):
+		"""Returns the global ordinal of the tide at the given 1-based day and tide numbers."""
+		return int(self.day_offsets[day_number - 1]) + tide_number - 1
+
+	def position(self, ordinal: int):
+		"""Returns the 1-based (day_number, tide_number) of the tide at the given ordinal."""
+		day_index = int(self.day_of_tide[ordinal])
+		return day_index + 1, ordinal - int(self.day_offsets[day_index]) + 1
+
+	def tide(self, ordinal: int):
+		"""Returns the TideHeight at the given ordinal."""
+		day_index = int(self.day_of_tide[ordinal])
+		return self.tide_days[day_index].heights[ordinal - int(self.day_offsets[day_index])]
+
+	def _row(self, life_cycle):
+		return 2 if life_cycle is None else LIFE_CYCLE_CODES[life_cycle]
+
+	def previous_of_type(self, ordinal: int, life_cycle: str = None):
+		"""
+		Returns the ordinal of the last tide of the given type (HW, LW, or either if None)
+		strictly before `ordinal`, or -1 if there is none.
+		"""
+		if ordinal <= 0:
+			return -1
+		return int(self._last_of_type[self._row(life_cycle), min(ordinal, self.tides_count) - 1])
+
+	def next_of_type(self, ordinal: int, life_cycle: str = None):
+		"""
+		Returns the ordinal of the first tide of the given type (HW, LW, or either if None)
+		strictly after `ordinal`, or -1 if there is none.
+		"""
+		if ordinal + 1 >= self.tides_count:
+			return -1
+		return int(self._first_of_type[self._row(life_cycle), max(ordinal + 1, 0)])
+
+	def _found(self, ordinal: int):
+		if ordinal < 0:
+			return None, 0, 0
+		return self.tide(ordinal), *self.position(ordinal)
+
+	def previous_tide(self, day_number: int, tide_number: int):
+		"""The `find_previous_tide` lookup: returns (tide_height, day_number, tide_number), or (None, 0, 0)."""
+		return self._found(self.previous_of_type(self.ordinal(day_number, tide_number)))
+
+	def next_tide(self, day_number: int, tide_number: int):
+		"""The `find_next_tide` lookup: returns (tide_height, day_number, tide_number), or (None, 0, 0)."""
+		return self._found(self.next_of_type(self.ordinal(day_number, tide_number)))
+
+	def datetime_of(self, ordinal: int):
+		"""Returns the datetime of the tide at the given ordinal."""
+		return epoch_microseconds_to_datetime(self.times[ordinal])
+
+	def bracket(self, when: datetime.datetime):
+		"""
+		Finds the tides surrounding a datetime, in O(log n).
+
+		Parameters:
+		- when: a naive datetime.
+
+		Returns:
+		- A tuple (previous, next) of (tide_height, day_number, tide_number) tuples: the last tide
+		  at or before `when`, and the first tide after it; (None, 0, 0) when there is none.
+		"""
+		next_ordinal = int(np.searchsorted(self.times, datetime_to_epoch_microseconds(when), side='right'))
+		return self._found(next_ordinal - 1), self._found(next_ordinal if next_ordinal < self.tides_count else -1)
+
+	def bracket_many(self, timestamps):
+		"""
+		The vectorized `bracket`: finds the tides surrounding many timestamps in one binary search.
+
+		Parameters:
+		- timestamps: an array of numpy datetime64, or a sequence of naive datetimes.
+
+		Returns:
+		- A tuple (previous, next) of int64 ordinal arrays, with -1 where there is no such tide.
+		"""
+		times = np.asarray(timestamps, dtype='datetime64[us]').astype(np.int64)
+		next_ordinals = np.searchsorted(self.times, times, side='right')
+		return next_ordinals - 1, np.where(next_ordinals < self.tides_count, next_ordinals, -1)
+
+	def closest_of_type(self, when: datetime.datetime, life_cycle: str):
+		"""
+		Returns the ordinal of the tide of the given type closest to `when`, the earliest one
+		on a tie, or -1 if there is none.
+		"""
+		when_time = datetime_to_epoch_microseconds(when)
+		at_or_before = int(np.searchsorted(self.times, when_time, side='right')) - 1
+		previous = at_or_before
+		if previous < 0 or self.types[previous] != LIFE_CYCLE_CODES[life_cycle]:
+			previous = self.previous_of_type(at_or_before, life_cycle)
+		following = self.next_of_type(at_or_before, life_cycle)
+		if previous < 0 or following < 0:
+			return max(previous, following)
+		return previous if when_time - self.times[previous] <= self.times[following] - when_time else following
+
+	def tide_at(self, when: datetime.datetime):
+		"""
+		Returns the previous and next tide events at a datetime, the `bracket` of `when`: a tuple
+		(previous, next) of (tide_height, day_number, tide_number) tuples, (None, 0, 0) when there is none.
+		"""
+		return self.bracket(when)
+
+	def height_at(self, when: datetime.datetime):
+		"""
+		Computes the tide height at any datetime, from the curve of the closest high water,
+		like pytide does from `find_closest_high_water`.
+
+		Parameters:
+		- when: a naive datetime.
+
+		Returns:
+		- The tide height, in meters.
+		"""
+		ordinal = self.closest_of_type(when, TideHeight.HW)
+		if ordinal < 0:
+			raise ValueError("No high water found in the provided data.")
+		hw_diff = when - self.datetime_of(ordinal)
+		return self.tide(ordinal).compute_height(timedelta_to_twelve_based_tide_hours(hw_diff))
@@ -0,0 +1,147 @@
+import datetime
+
+import numpy as np
+
+from src.tide_height_intervals import TideInterval, merge_windows
+from src.tide_time_utils import MINUTES_PER_DAY
+
+
+def as_epoch_minutes(when):
+	"""Converts a naive datetime or a numpy datetime64 to minutes since EPOCH."""
+	return int(np.datetime64(when, 'm').astype(np.int64))
+
+
+def _duration_minutes(duration):
+	"""Converts a timedelta or a numpy timedelta64 to minutes."""
+	return int(np.timedelta64(duration, 'm').astype(np.int64))
+
+
+def _minutes_of_day(t: datetime.time):
+	return t.hour * 60 + t.minute
+
+
+class IntervalSet:
+	"""
+	A set of time windows, stored as sorted arrays of their start and end times.
+
+	The windows are kept normalized: sorted, non-empty, and disjoint, windows that touch or
+	overlap being merged.  A window [start, end) covers its start minute, not its end minute.
+	Every operation is vectorized, and linear in the number of windows, up to a binary search.
+
+	Attributes:
+	- starts, ends: int64 arrays of the window bounds, in minutes since EPOCH.
+	"""
+
+	def __init__(self, starts=(), ends=()):
+		starts = np.asarray(starts, dtype=np.int64)
+		ends = np.asarray(ends, dtype=np.int64)
+		order = np.argsort(starts, kind='stable')
+		_, self.starts, self.ends = merge_windows(starts[order][np.newaxis, :], ends[order][np.newaxis, :])
+
+	@classmethod
+	def _of(cls, starts: np.ndarray, ends: np.ndarray):
+		"""Makes a set of windows that are already normalized."""
+		interval_set = cls.__new__(cls)
+		interval_set.starts = starts
+		interval_set.ends = ends
+		return interval_set
+
+	@classmethod
+	def from_windows(cls, windows):
+		"""Makes a set of (windows x 2) numpy datetime64 (start, end) pairs, e.g. from `scan_height_windows`."""
+		windows = np.asarray(windows, dtype='datetime64[m]').reshape(-1, 2).astype(np.int64)
+		return cls(windows[:, 0], windows[:, 1])
+
+	@classmethod
+	def from_intervals(cls, intervals: list[TideInterval], initial_date: datetime.date):
+		"""
+		Makes a set of TideInterval objects, e.g. from `determine_min_water_height_interval`.
+		The day numbers are relative to `initial_date`, like in `TideInterval.print`.
+		"""
+		initial_day = as_epoch_minutes(initial_date) // MINUTES_PER_DAY
+
+		def minutes_of(point):
+			return (initial_day + point.day_number - 1) * MINUTES_PER_DAY + \
+				point.time.hour * 60 + point.time.minute
+
+		return cls([minutes_of(interval.start) for interval in intervals],
+				   [minutes_of(interval.end) for interval in intervals])
+
+	@classmethod
+	def daily(cls, start, end, daily_start: datetime.time, daily_end: datetime.time):
+		"""
+		Makes the set of the daily windows between two times of the day, e.g. operating hours,
+		clipped to [start, end).  An end before the start spans midnight.
+		"""
+		start, end = as_epoch_minutes(start), as_epoch_minutes(end)
+		days = np.arange(start // MINUTES_PER_DAY - 1, end // MINUTES_PER_DAY + 1) * MINUTES_PER_DAY
+		daily_start, daily_end = _minutes_of_day(daily_start), _minutes_of_day(daily_end)
+		if daily_end <= daily_start:
+			daily_end += MINUTES_PER_DAY
+		return cls._of(days + daily_start, days + daily_end) & cls._of(np.array([start]), np.array([end]))
+
+	def __len__(self):
+		return len(self.starts)
+
+	def __eq__(self, other):
+		return isinstance(other, IntervalSet) and \
+			np.array_equal(self.starts, other.starts) and np.array_equal(self.ends, other.ends)
+
+	def __repr__(self):
+		return f"{type(self).__name__}({self.windows.tolist()!r})"
+
+	@property
+	def windows(self):
+		"""The windows, as a (windows x 2) datetime64[m] array."""
+		return np.stack((self.starts, self.ends), axis=-1).astype('datetime64[m]')
+
+	@property
+	def duration(self):
+		"""The total duration of the windows, as a timedelta."""
+		return datetime.timedelta(minutes=int(np.sum(self.ends - self.starts)))
+
+	def union(self, other: 'IntervalSet'):
+		starts = np.concatenate((self.starts, other.starts))
+		ends = np.concatenate((self.ends, other.ends))
+		# The stable sort of two sorted runs is a linear merge
+		order = np.argsort(starts, kind='stable')
+		_, starts, ends = merge_windows(starts[order][np.newaxis, :], ends[order][np.newaxis, :])
+		return type(self)._of(starts, ends)
+
+	def intersection(self, other: 'IntervalSet'):
+		# The windows of other that overlap each window of self are other[first:last]
+		first = np.searchsorted(other.ends, self.starts, side='right')
+		last = np.searchsorted(other.starts, self.ends, side='left')
+		counts = np.maximum(last - first, 0)
+		mine = np.repeat(np.arange(len(self)), counts)
+		theirs = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(first, counts)
+		return type(self)._of(np.maximum(self.starts[mine], other.starts[theirs]),
+							  np.minimum(self.ends[mine], other.ends[theirs]))
+
+	def complement(self, start, end):
+		"""Returns the gaps between the windows within [start, end)."""
+		start, end = as_epoch_minutes(start), as_epoch_minutes(end)
+		gaps = type(self)._of(np.concatenate(([np.iinfo(np.int64).min], self.ends)),
+							  np.concatenate((self.starts, [np.iinfo(np.int64).max])))
+		return gaps & type(self)._of(np.array([start]), np.array([end]))
+
+	def difference(self, other: 'IntervalSet'):
+		if len(self) == 0:
+			return self
+		return self & other.complement(self.starts[0].astype('datetime64[m]'), self.ends[-1].astype('datetime64[m]'))
+
+	__or__ = union
+	__and__ = intersection
+	__sub__ = difference
+
+	def longer_than(self, duration):
+		"""Returns the windows that last at least `duration`, a timedelta or numpy timedelta64."""
+		keep = self.ends - self.starts >= _duration_minutes(duration)
+		return type(self)._of(self.starts[keep], self.ends[keep])
+
+	def merge_adjacent(self, max_gap):
+		"""Merges the windows separated by at most `max_gap`, a timedelta or numpy timedelta64."""
+		if len(self) == 0:
+			return self
+		first = np.flatnonzero(np.concatenate(([True], self.starts[1:] - self.ends[:-1] > _duration_minutes(max_gap))))
+		return type(self)._of(self.starts[first], np.append(self.ends[first[1:] - 1], self.ends[-1]))
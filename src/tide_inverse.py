@@ -0,0 +1,98 @@
+from collections import OrderedDict
+
+import numpy as np
+
+
+def _sample(compute_height, tide_hours: np.ndarray):
+	heights = np.asarray(compute_height(tide_hours), dtype=float)
+	if heights.shape != tide_hours.shape:
+		# Not a NumPy curve
+		heights = np.array([compute_height(h) for h in tide_hours], dtype=float)
+	return heights
+
+
+class InverseCurve:
+	"""
+	The inverse of a tide curve on its two limbs, from a dense sample of the curve.
+
+	The curve is sampled on the tide hours 0 to 6 and 6 to 12.  Each limb is made monotonic
+	with a running maximum or minimum, so a linear interpolation of the tide hour against the
+	height is monotonic too, and answers in O(log samples).
+
+	Attributes:
+	- samples: the number of samples per limb.
+	- max_error: the largest error of the interpolated tide hours, in tide hours, measured at
+	  the middle of the samples over the monotonic range of the limbs: where the curve moves
+	  towards the end of its limb, between the heights of the ends.  Elsewhere, around a turn
+	  of the tide where the curve is not monotonic up to the end of its limb, a height has
+	  several tide hours, and the lookup gives the first one along the limb.
+	"""
+
+	def __init__(self, compute_height, samples=1024):
+		self.samples = samples
+		self._limbs = {}
+		errors = []
+		for start, end in ((0, 6), (6, 12)):
+			tide_hours = np.linspace(start, end, samples)
+			raw_heights = _sample(compute_height, tide_hours)
+			middles = (tide_hours[1:] + tide_hours[:-1]) / 2
+			middle_heights = _sample(compute_height, middles)
+			is_rising = raw_heights[0] < raw_heights[-1]
+			if is_rising:
+				heights = np.maximum.accumulate(raw_heights)
+				limb_hours = tide_hours
+			else:
+				# np.interp needs increasing heights, reverse the falling limbs
+				limb_hours, heights = tide_hours[::-1], np.minimum.accumulate(raw_heights)[::-1]
+			self._limbs[start, end] = (heights, limb_hours)
+
+			# The heights of the monotonic range have a single tide hour, the middle they are sampled at
+			sign = 1 if is_rising else -1
+			low, high = sorted((raw_heights[0], raw_heights[-1]))
+			monotonic = (sign * np.diff(raw_heights) > 0) & (low < middle_heights) & (middle_heights < high)
+			if monotonic.any():
+				errors.append(np.max(np.abs(np.interp(middle_heights[monotonic], heights, limb_hours) -
+											middles[monotonic])))
+		self.max_error = float(max(errors, default=0.0))
+
+	def tide_hour(self, height_to_find, start_tide_hour: float, end_tide_hour: float):
+		"""
+		Returns the tide hour(s) where the curve reaches the given height(s), between the tide
+		hours 0 and 6, or 6 and 12.  Heights the limb does not reach give the end towards which
+		the bisection of find_height_time_between_tides converges.
+		"""
+		heights, tide_hours = self._limbs[start_tide_hour, end_tide_hour]
+		return np.interp(height_to_find, heights, tide_hours)
+
+
+class InverseCurveCache:
+	"""
+	A bounded LRU cache of InverseCurve objects, keyed by their curve.
+	Harmonic curves compare by their parameters, so equal curves share one inverse.
+	"""
+
+	def __init__(self, maxsize=256, samples=1024):
+		self.maxsize = maxsize
+		self.samples = samples
+		self._inverses = OrderedDict()
+
+	def get(self, compute_height):
+		inverse = self._inverses.get(compute_height)
+		if inverse is not None:
+			self._inverses.move_to_end(compute_height)
+			return inverse
+
+		inverse = InverseCurve(compute_height, samples=self.samples)
+		self._inverses[compute_height] = inverse
+		if len(self._inverses) > self.maxsize:
+			self._inverses.popitem(last=False)
+		return inverse
+
+	def clear(self):
+		self._inverses.clear()
+
+	def __len__(self):
+		return len(self._inverses)
+
+
+shared_inverse_cache = InverseCurveCache()
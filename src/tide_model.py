@@ -2,27 +2,145 @@ import numpy as np
 
 NEAP_MAX = 5.0
 
+# The resolution of the curve parameters when curves are compared, a power of
+# two so that quantizing is exact and gives the same result on floats and NumPy arrays
+CURVE_QUANTUM = 2.0 ** -40
+
+
+def quantize_curve_parameter(value):
+	"""
+	Rounds a curve parameter, or an array of them, to the nearest multiple of CURVE_QUANTUM.
+
+	Parameters:
+	- value: a float or a NumPy array of floats.
+
+	Returns:
+	- The quantized float, or array of floats.
+	"""
+	if np.ndim(value) > 0:
+		return np.rint(np.asarray(value, dtype=float) / CURVE_QUANTUM) * CURVE_QUANTUM
+	return round(value / CURVE_QUANTUM) * CURVE_QUANTUM
+
+
 # Source https://www.vims.edu/research/units/labgroups/tc_tutorial/tide_analysis.php
-def semidiurnal_tide(*, min_water_factor=0.0, max_water_factor=0.0, neap_factor=0.0, centered_on_hw=True):
-	def compute(tide_time):
-		nonlocal min_water_factor, max_water_factor
-		def constituent(speed_degrees):
-			interval_between_hw_and_lw = 6.1
-			half_amplitude = 0.5
-			constituent_phase = interval_between_hw_and_lw / 2 if centered_on_hw else 0
-			speed_radians = speed_degrees * np.pi / 180
-			return half_amplitude + half_amplitude * np.cos(speed_radians * tide_time - constituent_phase)
-
-		moon_amplitude = 3.2 + 0.1 * neap_factor
-		solar_amplitude = 0.3 + 0.05 * neap_factor
-		moon_speed = 28.9 + 0.2 * neap_factor
-		solar_speed = 30.0
-		total_amplitude = moon_amplitude + solar_amplitude
-		base_height = 0
-		if min_water_factor > max_water_factor:
+class HarmonicModel:
+	"""
+	A semidiurnal tide curve built from a moon and a solar constituent.
+
+	All the coefficients (amplitudes, speeds in radians, phase and the min/max water
+	factor normalization) are computed once, in the constructor.  Calling the model
+	with a 12-based tide hour, or with a NumPy array of them, returns the tide height.
+
+	The factors may also be NumPy arrays (e.g. one neap level per curve); the model
+	then evaluates all the curves in a single broadcast NumPy call.
+
+	Attributes:
+	- min_water_factor, max_water_factor, neap_factor: the parameters the curve was built from.
+	- centered_on_hw: whether tide hour 6 is the high water of the curve.
+	"""
+	INTERVAL_BETWEEN_HW_AND_LW = 6.1
+	HALF_AMPLITUDE = 0.5
+	SOLAR_SPEED = 30.0
+
+	def __init__(self, *, min_water_factor=0.0, max_water_factor=0.0, neap_factor=0.0, centered_on_hw=True):
+		self.min_water_factor = min_water_factor
+		self.max_water_factor = max_water_factor
+		self.neap_factor = neap_factor
+		self.centered_on_hw = centered_on_hw
+
+		is_array = any(np.ndim(f) > 0 for f in (min_water_factor, max_water_factor, neap_factor))
+		if is_array:
+			min_water_factor, max_water_factor, neap_factor = np.broadcast_arrays(
+				np.asarray(min_water_factor, dtype=float),
+				np.asarray(max_water_factor, dtype=float),
+				np.asarray(neap_factor, dtype=float))
+			min_water_factor = np.minimum(min_water_factor, max_water_factor)
+		elif min_water_factor > max_water_factor:
 			min_water_factor = max_water_factor
-		if max_water_factor > 0:
-			total_amplitude *= (1.7 + 0.2 * neap_factor)/(max_water_factor + min_water_factor)
-			base_height = min_water_factor + 0.6 * neap_factor
-		return (base_height + moon_amplitude * constituent(moon_speed) + solar_amplitude * constituent(solar_speed)) / total_amplitude
-	return compute
+
+		self._moon_amplitude = 3.2 + 0.1 * neap_factor
+		self._solar_amplitude = 0.3 + 0.05 * neap_factor
+		self._moon_speed = (28.9 + 0.2 * neap_factor) * np.pi / 180
+		self._solar_speed = self.SOLAR_SPEED * np.pi / 180
+		self._phase = self.INTERVAL_BETWEEN_HW_AND_LW / 2 if centered_on_hw else 0
+
+		total_amplitude = self._moon_amplitude + self._solar_amplitude
+		if is_array:
+			has_factors = max_water_factor > 0
+			with np.errstate(divide='ignore', invalid='ignore'):
+				scale = (1.7 + 0.2 * neap_factor) / (max_water_factor + min_water_factor)
+			self._total_amplitude = np.where(has_factors, total_amplitude * scale, total_amplitude)
+			self._base_height = np.where(has_factors, min_water_factor + 0.6 * neap_factor, 0.0)
+		elif max_water_factor > 0:
+			self._total_amplitude = total_amplitude * ((1.7 + 0.2 * neap_factor) / (max_water_factor + min_water_factor))
+			self._base_height = min_water_factor + 0.6 * neap_factor
+		else:
+			self._total_amplitude = total_amplitude
+			self._base_height = 0
+
+	@property
+	def key(self):
+		"""
+		The quantized (min_water_factor, max_water_factor, neap_factor, centered_on_hw) of the curve.
+		Curves with the same key compute the same heights, up to the quantization.
+		"""
+		return tuple(quantize_curve_parameter(f) if np.ndim(f) == 0 else tuple(quantize_curve_parameter(f).flat)
+					 for f in (self.min_water_factor, self.max_water_factor, self.neap_factor)) + (self.centered_on_hw,)
+
+	def __eq__(self, other):
+		return isinstance(other, HarmonicModel) and self.shape == other.shape and self.key == other.key
+
+	def __hash__(self):
+		return hash(self.key)
+
+	@property
+	def shape(self):
+		"""The shape of the curve parameters, () for a single curve."""
+		return np.shape(self._moon_amplitude)
+
+	def __call__(self, tide_time):
+		"""
+		Computes the tide height at the given 12-based tide hour(s).
+		The tide hours broadcast against the curve parameters using the usual NumPy rules.
+		"""
+		return self._evaluate(tide_time, self._moon_speed, self._moon_amplitude,
+							  self._solar_amplitude, self._base_height, self._total_amplitude)
+
+	def grid(self, tide_time):
+		"""
+		Computes the tide heights of every curve at every tide hour.
+
+		Parameters:
+		- tide_time: a scalar or an array of 12-based tide hours.
+
+		Returns:
+		- An array of shape `self.shape + np.shape(tide_time)`, e.g. (neap levels x times).
+		"""
+		expand = (...,) + (np.newaxis,) * np.ndim(tide_time)
+		return self._evaluate(
+			tide_time,
+			*(np.asarray(c)[expand] for c in (self._moon_speed, self._moon_amplitude, self._solar_amplitude,
+											  self._base_height, self._total_amplitude)))
+
+	def derivative(self, tide_time):
+		"""
+		Computes the derivative of the tide height, in meters per tide hour, at the given 12-based tide hour(s).
+		"""
+		half = self.HALF_AMPLITUDE
+		moon = -half * self._moon_speed * np.sin(self._moon_speed * tide_time - self._phase)
+		solar = -half * self._solar_speed * np.sin(self._solar_speed * tide_time - self._phase)
+		return (self._moon_amplitude * moon + self._solar_amplitude * solar) / self._total_amplitude
+
+	def _evaluate(self, tide_time, moon_speed, moon_amplitude, solar_amplitude, base_height, total_amplitude):
+		half = self.HALF_AMPLITUDE
+		moon = half + half * np.cos(moon_speed * tide_time - self._phase)
+		solar = half + half * np.cos(self._solar_speed * tide_time - self._phase)
+		return (base_height + moon_amplitude * moon + solar_amplitude * solar) / total_amplitude
+
+
+def semidiurnal_tide(*, min_water_factor=0.0, max_water_factor=0.0, neap_factor=0.0, centered_on_hw=True):
+	return HarmonicModel(
+		min_water_factor=min_water_factor,
+		max_water_factor=max_water_factor,
+		neap_factor=neap_factor,
+		centered_on_hw=centered_on_hw)
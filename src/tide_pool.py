@@ -0,0 +1,106 @@
+import datetime
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from src.tide_closest_hw import find_closest_high_water
+from src.tide_columns import TideTable
+from src.tide_height_intervals import determine_min_water_height_interval
+from src.tide_shared import SharedTableHandle, publish_table, attach_table
+
+
+class MinWaterIntervalQuery:
+	"""
+	A `determine_min_water_height_interval` request, to run with `run_queries`.
+
+	Attributes:
+	- day_number, tide_number, height_to_find, tide_duration: the arguments of the request.
+	"""
+
+	def __init__(self, *, day_number: int, tide_number: int, height_to_find: float,
+				 tide_duration: datetime.timedelta = None):
+		self.day_number = day_number
+		self.tide_number = tide_number
+		self.height_to_find = height_to_find
+		self.tide_duration = tide_duration
+
+	def run(self, tide_days):
+		return determine_min_water_height_interval(
+			tide_days=tide_days,
+			day_number=self.day_number,
+			tide_number=self.tide_number,
+			height_to_find=self.height_to_find,
+			tide_duration=self.tide_duration)
+
+
+class ClosestHighWaterQuery:
+	"""
+	A `find_closest_high_water` request, to run with `run_queries`.
+
+	Attributes:
+	- day_number, given_time: the arguments of the request.
+	"""
+
+	def __init__(self, *, day_number: int, given_time: datetime.time):
+		self.day_number = day_number
+		self.given_time = given_time
+
+	def run(self, tide_days):
+		return find_closest_high_water(tide_days=tide_days, day_number=self.day_number, given_time=self.given_time)
+
+
+# The tide days of the worker process, sent once by the pool initializer
+_worker_tide_days = None
+
+
+def _init_worker(tide_days):
+	global _worker_tide_days
+	if isinstance(tide_days, SharedTableHandle):
+		tide_days = attach_table(tide_days)
+	_worker_tide_days = tide_days
+
+
+def _run_chunk(queries):
+	return [query.run(_worker_tide_days) for query in queries]
+
+
+def run_queries(tide_days, queries: list, *, max_workers=None, chunk_size=None):
+	"""
+	Runs many tide queries, fanned out across processes.
+
+	The tide days are sent once to each worker, not with every query.  A TideTable is
+	published in shared memory for the duration of the call, and the workers attach
+	to it without copying it, so the pool uses a single table's worth of memory.
+	A list of TideDay objects is pickled to each worker.
+
+	Parameters:
+	- tide_days: a list of TideDay objects, a TideTable, or the SharedTableHandle of a
+	  table published with `publish_table`.
+	- queries: the queries, e.g. MinWaterIntervalQuery or ClosestHighWaterQuery objects;
+	  any picklable object with a `run(tide_days)` method.
+	- max_workers: the number of worker processes, defaults to the number of CPUs.
+	- chunk_size: the number of queries sent to a worker at a time, defaults to
+	  an even split in four chunks per worker.
+
+	Returns:
+	- The list of the query results, in the order of the queries.
+	  The first exception raised by a query, e.g. a ValueError, is raised again.
+	"""
+	if not queries:
+		return []
+	if max_workers is None:
+		max_workers = os.cpu_count() or 1
+	if chunk_size is None:
+		chunk_size = max(1, -(-len(queries) // (max_workers * 4)))
+
+	chunks = [queries[i:i + chunk_size] for i in range(0, len(queries), chunk_size)]
+	shared_table = None
+	if isinstance(tide_days, TideTable):
+		shared_table = publish_table(tide_days)
+		tide_days = shared_table.handle
+	try:
+		with ProcessPoolExecutor(max_workers=min(max_workers, len(chunks)),
+								 initializer=_init_worker, initargs=(tide_days,)) as executor:
+			return [result for chunk_results in executor.map(_run_chunk, chunks) for result in chunk_results]
+	finally:
+		if shared_table is not None:
+			shared_table.close()
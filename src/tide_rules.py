@@ -0,0 +1,202 @@
+import datetime
+
+import numpy as np
+
+from src.tide_columns import LW_CODE, HW_CODE
+from src.tide_height_intervals import center_water_windows, merge_windows
+from src.tide_index import TideIndex
+from src.tide_interval_set import IntervalSet, as_epoch_minutes
+from src.tide_tables import TideDay
+
+
+class ClearanceRule:
+	"""
+	A standing request for the windows during which the tide height is at least the draft of a
+	vessel plus its under keel clearance, optionally only between given times of the day.
+
+	Attributes:
+	- name: the unique name of the rule.
+	- draft, under_keel_clearance: the threshold of the rule is their sum.
+	- above: whether the windows are where the height is at least (True) or at most (False)
+	  the threshold, e.g. for an air draft.
+	- daily_start, daily_end: optional times of the day the windows are restricted to; an end
+	  before the start spans midnight.
+	- days: the horizon of `RuleEngine.upcoming`.
+	"""
+
+	def __init__(self, name: str, *, draft: float, under_keel_clearance: float = 0.0, above=True,
+				 daily_start: datetime.time = None, daily_end: datetime.time = None, days: int = 14):
+		self.name = name
+		self.draft = draft
+		self.under_keel_clearance = under_keel_clearance
+		self.above = above
+		self.daily_start = daily_start
+		self.daily_end = daily_end
+		self.days = days
+
+	@property
+	def threshold(self):
+		return self.draft + self.under_keel_clearance
+
+	@property
+	def key(self):
+		"""The rules with the same key have the same windows."""
+		return self.above, self.threshold, self.daily_start, self.daily_end
+
+
+class WindowIndex(IntervalSet):
+	"""
+	The windows of a rule, an IntervalSet with queries.
+
+	The windows are disjoint and sorted, so both arrays are sorted, and every query is one or
+	two binary searches, O(log n + k) for k windows returned.  Like every IntervalSet, the
+	windows and the query ranges are half-open: [start, end) covers its start minute, not its
+	end minute, so the queries agree with `&` and `-`.  They return numpy datetime64[m]
+	(start, end) pairs.
+	"""
+
+	def _windows(self, first: int, last: int):
+		return np.stack((self.starts[first:last], self.ends[first:last]), axis=-1).astype('datetime64[m]')
+
+	def _window(self, i: int):
+		return self._windows(i, i + 1)[0]
+
+	def overlapping(self, start, end):
+		"""Returns the windows that overlap [start, end), as a (windows x 2) datetime64[m] array."""
+		first = np.searchsorted(self.ends, as_epoch_minutes(start), side='right')
+		last = np.searchsorted(self.starts, as_epoch_minutes(end), side='left')
+		return self._windows(first, max(first, last))
+
+	def within(self, start, end):
+		"""Returns the windows contained in [start, end), as a (windows x 2) datetime64[m] array."""
+		first = np.searchsorted(self.starts, as_epoch_minutes(start), side='left')
+		last = np.searchsorted(self.ends, as_epoch_minutes(end), side='right')
+		return self._windows(first, max(first, last))
+
+	def containing(self, when):
+		"""Returns the window that contains `when`, or None."""
+		i = int(np.searchsorted(self.starts, as_epoch_minutes(when), side='right')) - 1
+		if i < 0 or self.ends[i] <= as_epoch_minutes(when):
+			return None
+		return self._window(i)
+
+	def next_after(self, when):
+		"""Returns the first window that starts after `when`, or None."""
+		i = int(np.searchsorted(self.starts, as_epoch_minutes(when), side='right'))
+		return self._window(i) if i < len(self) else None
+
+
+class RuleEngine:
+	"""
+	Evaluates many ClearanceRule objects against the same tides, and indexes their windows.
+
+	The rules share their work: the windows around every HW (or LW) are solved once per distinct
+	threshold, for all the thresholds at once, with `center_water_windows`.  When the tides are
+	extended, e.g. with `tide_columns.extend`, `refresh` only solves the windows around the new
+	tides, and the last old one, whose next tide was unknown.
+
+	Attributes:
+	- tide_days: List of TideDay objects, or a TideTable.
+	- rules: the rules, by name.
+	- index: the TideIndex of the tides, as of the last evaluation.
+	"""
+
+	def __init__(self, tide_days: list[TideDay], rules=(), *, tide_duration: datetime.timedelta = None,
+				 tolerance=datetime.timedelta(seconds=1)):
+		self.tide_days = tide_days
+		self.tide_duration = tide_duration
+		self.tolerance = tolerance
+		self.rules = {}
+		self.index = TideIndex(tide_days)
+		# By `above`: the ordinals of the center waters, and the windows around them by threshold
+		self._center_waters = {above: self._center_waters_of(above) for above in (True, False)}
+		self._windows = {True: {}, False: {}}
+		self._indexes = {}
+		self.add_rules(rules)
+
+	def _center_waters_of(self, above: bool):
+		return np.flatnonzero(self.index.types == (HW_CODE if above else LW_CODE))
+
+	def _solve(self, above: bool, thresholds: list, center_waters: np.ndarray):
+		return center_water_windows(self.index, center_waters, np.array(thresholds, dtype=float), above,
+									tide_duration=self.tide_duration, tolerance=self.tolerance)
+
+	def add_rules(self, rules):
+		"""Adds rules, solving the thresholds that no other rule has yet."""
+		rules = list(rules)
+		for rule in rules:
+			if rule.name in self.rules:
+				raise ValueError(f"A rule named {rule.name!r} already exists.")
+		for above in (True, False):
+			windows = self._windows[above]
+			thresholds = sorted({rule.threshold for rule in rules if rule.above == above} - windows.keys())
+			if thresholds:
+				starts, ends = self._solve(above, thresholds, self._center_waters[above])
+				for threshold, threshold_starts, threshold_ends in zip(thresholds, starts, ends):
+					windows[threshold] = (threshold_starts, threshold_ends)
+		for rule in rules:
+			self.rules[rule.name] = rule
+		self._index_rules(rules)
+
+	def remove_rule(self, name: str):
+		"""Removes a rule, and the windows of its threshold when no other rule uses them."""
+		rule = self.rules.pop(name)
+		self._indexes.pop(name)
+		if all((other.above, other.threshold) != (rule.above, rule.threshold) for other in self.rules.values()):
+			del self._windows[rule.above][rule.threshold]
+
+	def refresh(self):
+		"""
+		Updates the windows after tides were appended to the tide days.
+
+		Returns:
+		- The number of center waters solved again.
+		"""
+		old_tides_count = self.index.tides_count
+		self.index = TideIndex(self.tide_days)
+		if self.index.tides_count == old_tides_count:
+			return 0
+
+		solved = 0
+		for above in (True, False):
+			center_waters = self._center_waters_of(above)
+			# The windows around the center waters before the last old tide are final
+			kept = int(np.searchsorted(center_waters, old_tides_count - 1))
+			self._center_waters[above] = center_waters
+			windows = self._windows[above]
+			if not windows:
+				continue
+			thresholds = sorted(windows)
+			starts, ends = self._solve(above, thresholds, center_waters[kept:])
+			for threshold, threshold_starts, threshold_ends in zip(thresholds, starts, ends):
+				old_starts, old_ends = windows[threshold]
+				windows[threshold] = (np.concatenate((old_starts[:kept], threshold_starts)),
+									  np.concatenate((old_ends[:kept], threshold_ends)))
+			solved += len(center_waters) - kept
+		self._index_rules(self.rules.values())
+		return solved
+
+	def _index_rules(self, rules):
+		# Rules with the same key share their WindowIndex
+		indexes = {}
+		for rule in rules:
+			if rule.key not in indexes:
+				indexes[rule.key] = self._index_rule(rule)
+			self._indexes[rule.name] = indexes[rule.key]
+
+	def _index_rule(self, rule: ClearanceRule):
+		starts, ends = self._windows[rule.above][rule.threshold]
+		_, starts, ends = merge_windows(starts[np.newaxis, :], ends[np.newaxis, :])
+		windows = WindowIndex._of(starts, ends)
+		if rule.daily_start is None or rule.daily_end is None or len(windows) == 0:
+			return windows
+		return windows & IntervalSet.daily(starts[0].astype('datetime64[m]'), ends[-1].astype('datetime64[m]'),
+										   rule.daily_start, rule.daily_end)
+
+	def __getitem__(self, name: str):
+		"""Returns the WindowIndex of the windows of a rule."""
+		return self._indexes[name]
+
+	def upcoming(self, name: str, when):
+		"""Returns the windows of a rule that overlap the `days` of the rule from `when`."""
+		return self[name].overlapping(when, np.datetime64(when, 'm') + np.timedelta64(self.rules[name].days, 'D'))
@@ -0,0 +1,114 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from src.tide_columns import TideTable
+
+# Alignment of the columns inside the shared block, in bytes
+COLUMN_ALIGNMENT = 8
+
+
+class SharedTableHandle:
+	"""
+	A small, picklable reference to a table published in shared memory, to send to
+	worker processes instead of the table itself.
+
+	Attributes:
+	- name: the name of the shared memory block.
+	- layout: a list of (column name, dtype string, length, offset in bytes) tuples.
+	- tide_model: the tide model of the table.
+	"""
+
+	def __init__(self, *, name: str, layout: list, tide_model):
+		self.name = name
+		self.layout = layout
+		self.tide_model = tide_model
+
+
+class SharedTable:
+	"""
+	A table published in a single shared memory block, owned by the publishing process.
+
+	Close the shared table, or use it as a context manager, once the workers are done:
+	the block is then unlinked, tables attached in other processes stay valid until
+	they are garbage collected.
+
+	Attributes:
+	- handle: the SharedTableHandle to pass to `attach_table`.
+	"""
+
+	def __init__(self, shm: shared_memory.SharedMemory, handle: SharedTableHandle):
+		self._shm = shm
+		self.handle = handle
+
+	def close(self):
+		if self._shm is not None:
+			self._shm.close()
+			self._shm.unlink()
+			self._shm = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+
+def publish_table(table: TideTable):
+	"""
+	Copies the columns of a table into one shared memory block.
+
+	Parameters:
+	- table: the TideTable to publish.
+
+	Returns:
+	- A SharedTable owning the block; its `handle` attaches to it from any process.
+	"""
+	layout = []
+	size = 0
+	for name in TideTable.COLUMNS:
+		column = getattr(table, name)
+		size = -(-size // COLUMN_ALIGNMENT) * COLUMN_ALIGNMENT
+		layout.append((name, column.dtype.str, len(column), size))
+		size += column.nbytes
+
+	shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+	for name, dtype, length, offset in layout:
+		np.ndarray(length, dtype=dtype, buffer=shm.buf, offset=offset)[:] = getattr(table, name)
+	return SharedTable(shm, SharedTableHandle(name=shm.name, layout=layout, tide_model=table.tide_model))
+
+
+def _attach_shared_memory(name: str):
+	try:
+		# The publisher owns the block, do not let this process' resource tracker unlink it
+		return shared_memory.SharedMemory(name=name, track=False)
+	except TypeError:
+		# Before Python 3.13, attaching always registers the block; pool workers share the
+		# resource tracker of the publisher, where the block is already registered
+		return shared_memory.SharedMemory(name=name)
+
+
+def attach_table(handle: SharedTableHandle):
+	"""
+	Attaches to a table published with `publish_table`, without copying it.
+
+	The columns of the returned table are read-only views of the shared block, so
+	every query function taking `tide_days` runs directly against the shared buffers.
+	Extending the attached table copies its columns into private buffers first.
+
+	Parameters:
+	- handle: the SharedTableHandle of the published table.
+
+	Returns:
+	- A TideTable backed by the shared memory block.
+	"""
+	shm = _attach_shared_memory(handle.name)
+	columns = {}
+	for name, dtype, length, offset in handle.layout:
+		column = np.ndarray(length, dtype=dtype, buffer=shm.buf, offset=offset)
+		column.flags.writeable = False
+		columns[name] = column
+	table = TideTable(**columns, tide_model=handle.tide_model)
+	# Keep the block mapped as long as the table is alive
+	table._shared_memory = shm
+	return table
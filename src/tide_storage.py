@@ -0,0 +1,172 @@
+import datetime
+import hashlib
+import json
+import struct
+
+import numpy as np
+
+from src.tide_columns import TideTable
+from src.tide_constituents import ConstituentTide
+from src.tide_model import semidiurnal_tide
+
+# File layout: MAGIC, the format version and the header length as little-endian uint32 / uint64,
+# the JSON header, then the columns, each aligned on COLUMN_ALIGNMENT bytes
+MAGIC = b'PYTIDETB'
+FORMAT_VERSION = 2
+COLUMN_ALIGNMENT = 64
+_PREAMBLE = struct.Struct('<8sIQ')
+
+
+def _align(offset: int):
+	return -(-offset // COLUMN_ALIGNMENT) * COLUMN_ALIGNMENT
+
+
+# The (min_water_factor, max_water_factor, neap_factor) of the curves, and the tide hours,
+# sampled by the fingerprint of a tide model
+_FINGERPRINT_CURVES = ((2.0, 5.0, 0.0), (2.0, 5.0, 2.5), (1.0, 4.0, 5.0), (0.0, 0.0, 1.0))
+_FINGERPRINT_TIDE_HOURS = np.linspace(0, 12, 25)
+
+
+def tide_model_fingerprint(tide_model):
+	"""
+	Returns a hash of the heights of a few curves of a tide model, which changes with the
+	coefficients of the model, e.g. those of semidiurnal_tide.  The heights are rounded to
+	1e-9 meters, so that the hash does not depend on the last bits of the platform math.
+	"""
+	digest = hashlib.blake2b(digest_size=16)
+	for min_water_factor, max_water_factor, neap_factor in _FINGERPRINT_CURVES:
+		curve = tide_model(min_water_factor=min_water_factor, max_water_factor=max_water_factor,
+						   neap_factor=neap_factor)
+		heights = np.asarray(curve(_FINGERPRINT_TIDE_HOURS), dtype=float)
+		# Adding 0 turns the rounded -0.0 into 0.0
+		digest.update((np.round(heights, 9) + 0.0).tobytes())
+	return digest.hexdigest()
+
+
+def encode_tide_model(tide_model):
+	"""
+	Returns the JSON description of a tide model, semidiurnal_tide or a ConstituentTide,
+	with the `tide_model_fingerprint` of its coefficients.
+	"""
+	if tide_model is semidiurnal_tide:
+		d = dict(name='semidiurnal')
+	elif isinstance(tide_model, ConstituentTide):
+		d = dict(name='constituents', **tide_model.to_dict())
+	else:
+		raise ValueError(f"Cannot save a table with the tide model {tide_model!r}, "
+						 f"only semidiurnal_tide and ConstituentTide are supported.")
+	return dict(d, fingerprint=tide_model_fingerprint(tide_model))
+
+
+def decode_tide_model(d):
+	"""
+	Rebuilds the tide model described by `encode_tide_model`, checking that its coefficients
+	did not change since, as the heights of the table were computed with them.
+	"""
+	if d['name'] == 'semidiurnal':
+		tide_model = semidiurnal_tide
+	elif d['name'] == 'constituents':
+		tide_model = ConstituentTide.from_dict(d)
+	else:
+		raise ValueError(f"Unknown tide model {d['name']!r}.")
+	if d.get('fingerprint') != tide_model_fingerprint(tide_model):
+		raise ValueError(f"The {d['name']} tide model coefficients changed since the table was saved.")
+	return tide_model
+
+
+def encode_parameter(value):
+	"""The JSON encoder of the datetime and timedelta generation parameters."""
+	if isinstance(value, datetime.datetime):
+		return dict(datetime=value.isoformat())
+	if isinstance(value, datetime.timedelta):
+		return dict(microseconds=value // datetime.timedelta(microseconds=1))
+	raise TypeError(f"Cannot save the generation parameter {value!r}.")
+
+
+def decode_parameter(d):
+	"""The JSON object hook decoding the parameters encoded by `encode_parameter`."""
+	if d.keys() == {'datetime'}:
+		return datetime.datetime.fromisoformat(d['datetime'])
+	if d.keys() == {'microseconds'}:
+		return datetime.timedelta(microseconds=d['microseconds'])
+	return d
+
+
+def save_table(path, table: TideTable, *, parameters: dict = None):
+	"""
+	Saves a table in the binary tide table format.
+
+	Parameters:
+	- path: the path of the file to write.
+	- table: the TideTable to save; its tide model must be semidiurnal_tide or a ConstituentTide.
+	- parameters: the generate_tide_table() arguments of the table, stored in the header;
+	  the values may be JSON types, datetimes and timedeltas.
+	"""
+	columns = []
+	offset = 0
+	for name in TideTable.COLUMNS:
+		column = getattr(table, name)
+		columns.append((name, column.dtype.str, len(column), offset))
+		offset = _align(offset + column.nbytes)
+	header = json.dumps(dict(
+		version=FORMAT_VERSION,
+		tide_model=encode_tide_model(table.tide_model),
+		parameters={} if parameters is None else parameters,
+		columns=columns), default=encode_parameter).encode()
+	data_start = _align(_PREAMBLE.size + len(header))
+
+	with open(path, 'wb') as f:
+		f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+		f.write(header)
+		for name, _, _, column_offset in columns:
+			f.seek(data_start + column_offset)
+			f.write(np.ascontiguousarray(getattr(table, name)).tobytes())
+		# Make the file cover the padding of the last column
+		f.truncate(max(f.tell(), data_start + offset))
+
+
+def read_table_header(path):
+	"""
+	Reads the header of a file in the binary tide table format.
+
+	Returns:
+	- A dict with the `version`, the `tide_model` description, the generation `parameters`,
+	  the `columns` as (name, dtype, length, offset) lists and the `data_start` offset of the columns.
+	"""
+	with open(path, 'rb') as f:
+		preamble = f.read(_PREAMBLE.size)
+		if len(preamble) < _PREAMBLE.size:
+			raise ValueError(f"{path} is not a tide table file.")
+		magic, version, header_length = _PREAMBLE.unpack(preamble)
+		if magic != MAGIC:
+			raise ValueError(f"{path} is not a tide table file.")
+		if version > FORMAT_VERSION:
+			raise ValueError(f"{path} has the format version {version}, newer than the supported version {FORMAT_VERSION}.")
+		header = json.loads(f.read(header_length), object_hook=decode_parameter)
+	header['data_start'] = _align(_PREAMBLE.size + header_length)
+	return header
+
+
+def load_table(path):
+	"""
+	Opens a table saved with `save_table`, memory-mapping its columns.
+
+	The columns are read-only views of a single `numpy.memmap` of the file, so opening a
+	table of any size is immediate, and only the pages that the queries touch are read.
+
+	Parameters:
+	- path: the path of the file.
+
+	Returns:
+	- The TideTable; it keeps no generation state, so it cannot be extended in place.
+	"""
+	header = read_table_header(path)
+	data = np.memmap(path, dtype=np.uint8, mode='r')
+	columns = {}
+	for name, dtype, length, offset in header['columns']:
+		start = header['data_start'] + offset
+		end = start + length * np.dtype(dtype).itemsize
+		if end > len(data):
+			raise ValueError(f"{path} is truncated, its column {name!r} ends at {end} bytes, after {len(data)} bytes.")
+		columns[name] = data[start:end].view(dtype)
+	return TideTable(**columns, tide_model=decode_tide_model(header['tide_model']))
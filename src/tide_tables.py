@@ -1,27 +1,40 @@
+import copy
 import datetime
+import itertools
+
+import numpy as np
 
 from src.lib import debug, debug_func
+from src.tide_curves import shared_curve_registry
 from src.tide_model import NEAP_MAX, semidiurnal_tide
 
 
-def reset_day(d=datetime.datetime.now()):
+def reset_day(d: datetime.datetime = None):
+	"""Returns the start of the month of `d`, defaulting to the month of the call."""
+	if d is None:
+		d = datetime.datetime.now()
 	return d.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
 
 
+def flat_tide(tide_time):
+	"""The default tide height function, a flat tide; unlike a lambda, it can be pickled."""
+	return 0.0
+
+
 class TideHeight:
 	LW = 'low water'
 	HW = 'high water'
 
 	# Constructs a tide height object
-	# @param time: the time of the tide height, a datetime.time() object
+	# @param time: the time of the tide height, a datetime.time() object; defaults to midnight
 	# @param height: the height of the tide, a float number representing meters
 	# @param life_cycle: the type of tide height (high or low water)
 	# @param neap_level: the neap level of the tide, a float number between 0 (springs) and NEAP_MAX (neaps)
 	# @param compute_height: the function that computes the tide height
 	def __init__(self, *,
-				 time=datetime.datetime.now().time(), height=0.0, life_cycle=LW,
+				 time=datetime.time(), height=0.0, life_cycle=LW,
 				 neap_level=0.0,
-				 compute_height=lambda time: 0.0):
+				 compute_height=flat_tide):
 		self.time = time
 		self.height = height
 		self.type = life_cycle
@@ -110,17 +123,290 @@ class NeapDirection:
 		debug(f"step: {self.step}, start_from_offset: {self.start_from_offset}, tide_range_should_increase: {self.tide_range_should_increase}")
 		pass
 
+	def levels_until_end(self, neap_level: float, tide_range_should_increase: bool):
+		"""
+		Returns the neap levels that get_next() visits from neap_level, moving in the given
+		direction, until springs or neaps is reached (inclusive).
+		Returns None if the neap level never reaches springs or neaps, i.e. the step is 0.
+		"""
+		levels = []
+		while True:
+			neap_level = self._decrement(neap_level) if tide_range_should_increase else self._increment(neap_level)
+			levels.append(neap_level)
+			if neap_level == (0.0 if tide_range_should_increase else self.get_max()):
+				return levels
+			if self.step == 0:
+				return None
+
+	def state_after(self, steps: int):
+		"""
+		Computes, in closed form, the neap state after `steps` calls to get_next(), starting
+		from get_start() and reversing at each springs and neaps, like generate_tide_days does.
+		The cost only depends on the cycle length, not on the number of steps.
+
+		Returns:
+		- A tuple (neap_level, tide_range_should_increase, reversal_count, reversed_at_last_step).
+		"""
+		neap_level = self.get_start()
+		towards_springs = self.tide_range_should_increase
+		if steps == 0:
+			return neap_level, towards_springs, 0, False
+
+		first = self.levels_until_end(neap_level, towards_springs)
+		if first is None:
+			return neap_level, towards_springs, 0, False
+		if steps <= len(first):
+			reversed_now = steps == len(first)
+			return first[steps - 1], towards_springs != reversed_now, int(reversed_now), reversed_now
+
+		# From springs or neaps on, the levels repeat with a period of two half cycles
+		towards_springs = not towards_springs
+		second = self.levels_until_end(first[-1], towards_springs)
+		if second is None:
+			return first[-1], towards_springs, 1, False
+		third = self.levels_until_end(second[-1], not towards_springs)
+		cycles, position = divmod(steps - len(first) - 1, len(second) + len(third))
+		reversal_count = 1 + 2 * cycles
+		if position < len(second):
+			reversed_now = position == len(second) - 1
+			return second[position], towards_springs != reversed_now, reversal_count + reversed_now, reversed_now
+		position -= len(second)
+		reversed_now = position == len(third) - 1
+		return third[position], towards_springs == reversed_now, reversal_count + 1 + reversed_now, reversed_now
+
+
+# Water factor adjustments, in steps of 0.04 (min) and 0.06 (max), after each number
+# of reversals: the factors increase for two reversals, then the direction of the
+# adjustment changes every three reversals, so the pattern repeats every six reversals
+WATER_FACTOR_STEPS = (0, 1, 2, 1, 0, -1)
+
+
+def water_factor_sequence(min_water_factor, max_water_factor, reversal_count: int):
+	"""
+	Returns the arrays of the min and max water factors after 0 to `reversal_count` springs / neaps
+	reversals.  The adjustments are added one at a time, like the generation loop always did,
+	so the factors are the same floats, rounding included.
+	"""
+	steps = np.array(WATER_FACTOR_STEPS)[np.arange(reversal_count + 1) % len(WATER_FACTOR_STEPS)]
+	adjustments = np.diff(steps).astype(float)
+	min_water_factors = np.add.accumulate(np.concatenate(([min_water_factor], 0.04 * adjustments)))
+	max_water_factors = np.add.accumulate(np.concatenate(([max_water_factor], 0.06 * adjustments)))
+	return min_water_factors, max_water_factors
+
+
+def water_factors_after(min_water_factor, max_water_factor, reversal_count: int):
+	"""Returns the (min_water_factor, max_water_factor) after the given number of springs / neaps reversals."""
+	min_water_factors, max_water_factors = water_factor_sequence(min_water_factor, max_water_factor, reversal_count)
+	return float(min_water_factors[-1]), float(max_water_factors[-1])
+
+
+def _adjust_water_factors(water_factors: tuple, reversal_count: int):
+	"""Returns the water factors after one more reversal than `reversal_count`, from the factors after it."""
+	adjustment = WATER_FACTOR_STEPS[(reversal_count + 1) % len(WATER_FACTOR_STEPS)] - \
+		WATER_FACTOR_STEPS[reversal_count % len(WATER_FACTOR_STEPS)]
+	return water_factors[0] + 0.04 * adjustment, water_factors[1] + 0.06 * adjustment
+
+
+class GenerationState:
+	"""
+	The state of the tide generation loop, right before generating the tide at `tide_index`.
+
+	A state can be built at the start of a generation, or in closed form at any tide index
+	with `generation_state_at()`, and passed to `iter_tide_days()` to resume the generation.
+
+	Attributes:
+	- tide_index: the 0-based index of the next tide, counted from the start of the generation.
+	- date: the datetime of the next tide.
+	- life_cycle: the type of the next tide (high or low water).
+	- neap_dir: the NeapDirection, holding the current direction.
+	- neap_level: the neap level of the next tide.
+	- neaps_cycle_count: the number of tides generated with the current neap level (0 or 1).
+	- tide_hour, old_low_tide_hour: the 12-based tide hour of the next tide, and of the last low water.
+	- reversal_count: the number of springs / neaps reversals so far.
+	- base_water_factors: the (min, max) water factors at the start of the generation.
+	- curve_water_factors: the (min, max) water factors of the current tide height function.
+	- day_neap_level: the neap level to use for the current day instead of the level of
+	  its last tide, set at the start of the generation and when springs or neaps is reached.
+	"""
+
+	def __init__(self, *, date: datetime.datetime, time_delta: datetime.timedelta,
+				 life_cycle: str, neap_dir: NeapDirection,
+				 min_water_factor, max_water_factor, should_vary_water_factors: bool,
+				 tide_model=semidiurnal_tide):
+		self.tide_index = 0
+		self.date = date
+		self.time_delta = time_delta
+		self.life_cycle = life_cycle
+		self.neap_dir = neap_dir
+		self.neap_level = neap_dir.get_start()
+		self.neaps_cycle_count = 0
+		self.tide_hour = 6 if life_cycle == TideHeight.HW else 0
+		self.old_low_tide_hour = 12 if self.tide_hour == 6 else 0
+		self.reversal_count = 0
+		self.base_water_factors = (min_water_factor, max_water_factor)
+		self.curve_water_factors = self.base_water_factors
+		self.should_vary_water_factors = should_vary_water_factors
+		self.day_neap_level = self.neap_level
+		self.tide_model = tide_model
+		self._compute_height = None
+		# The water factors after _water_factors_count reversals, adjusted one reversal at a time
+		self._water_factors = self.base_water_factors
+		self._water_factors_count = 0
+
+	@property
+	def water_factors(self):
+		"""The current (min_water_factor, max_water_factor)."""
+		if not self.should_vary_water_factors:
+			return self.base_water_factors
+		if self._water_factors_count == self.reversal_count - 1:
+			self._water_factors = _adjust_water_factors(self._water_factors, self._water_factors_count)
+			self._water_factors_count += 1
+		elif self._water_factors_count != self.reversal_count:
+			self._water_factors = water_factors_after(*self.base_water_factors, self.reversal_count)
+			self._water_factors_count = self.reversal_count
+		return self._water_factors
+
+	def compute_height(self):
+		"""Returns the tide height function of the next tide."""
+		if self._compute_height is None:
+			min_water_factor, max_water_factor = self.curve_water_factors
+			self._compute_height = shared_curve_registry.get(
+				self.tide_model,
+				min_water_factor=min_water_factor,
+				max_water_factor=max_water_factor,
+				neap_factor=self.neap_level
+			)
+		return self._compute_height
+
+	def copy(self):
+		state = copy.copy(self)
+		state.neap_dir = copy.copy(self.neap_dir)
+		return state
 
-# Generates a list of tide days with heights and times, starting from
-# a specified date and neap level.
+	def next_tide_height(self):
+		"""Generates the next tide height and advances the state past it."""
+		tide_height = TideHeight(
+			time=self.date.time(),
+			height=self.compute_height()(self.tide_hour),
+			life_cycle=self.life_cycle,
+			neap_level=self.neap_level,
+			compute_height=self.compute_height()
+		)
+		self.life_cycle = TideHeight.HW if self.life_cycle == TideHeight.LW else TideHeight.LW
+		self.tide_hour, self.old_low_tide_hour = next_tide_hour(self.tide_hour, self.old_low_tide_hour)
+
+		self.date = self.date + self.time_delta
+		self.tide_index += 1
+
+		self.neaps_cycle_count += 1
+		if self.neaps_cycle_count == 2:
+			self.neap_level = self.neap_dir.get_next(self.neap_level)
+			self.curve_water_factors = self.water_factors
+			self._compute_height = None
+			self.neaps_cycle_count = 0
+			if self.neap_dir.is_at_end(self.neap_level):
+				self.day_neap_level = self.neap_level
+				self.neap_dir.reverse()
+				# The factors change with the reversal count, starting with the next neap level
+				self.reversal_count += 1
+			debug(f"neap_level: {self.neap_level:.2f}, start_date: {self.date}")
+		return tide_height
+
+
+def next_tide_hour(tide_hour: int, old_low_tide_hour: int):
+	"""
+	Returns the 12-based tide hour of the next tide, and the updated tide hour of the last low water.
+	Low waters alternate between tide hour 0 and tide hour 12 of the high water curves.
+	"""
+	if tide_hour == 0:
+		return 6, old_low_tide_hour
+	if tide_hour == 6:
+		tide_hour = 12 if old_low_tide_hour == 0 else 0
+		return tide_hour, tide_hour
+	return 6, old_low_tide_hour
+
+
+def _tide_index_on_or_after(start_date: datetime.datetime, time_delta: datetime.timedelta,
+							date: datetime.datetime):
+	if date <= start_date:
+		return 0
+	return -((start_date - date) // time_delta)
+
+
+# Computes the generation state at any tide index in closed form, without replaying
+# the generation from start_date; the cost depends on the cycle length only, but for
+# one vectorized addition per reversal when the water factors vary.
+# Resuming iter_tide_days from a state computed at the first tide of a day yields
+# the same days as a generation started at start_date.
+#
+# @param tide_index: the 0-based index of the tide, counted from start_date
+# See iter_tide_days for the other parameters.
+def generation_state_at(tide_index: int, start_date: datetime.datetime,
+						cycle_length=0,
+						time_delta=datetime.timedelta(hours=6, minutes=0),
+						start_life_cycle=TideHeight.HW,
+						min_water_factor=2, max_water_factor=5, go_towards_springs=True,
+						start_days_after_neaps=None,
+						should_vary_water_factors=False,
+						tide_model=semidiurnal_tide):
+	neap_dir = NeapDirection(cycle_length=cycle_length,
+							 tide_range_should_increase=go_towards_springs,
+							 start_days_after_neaps=start_days_after_neaps)
+	state = GenerationState(
+		date=start_date, time_delta=time_delta, life_cycle=start_life_cycle, neap_dir=neap_dir,
+		min_water_factor=min_water_factor, max_water_factor=max_water_factor,
+		should_vary_water_factors=should_vary_water_factors, tide_model=tide_model)
+	if tide_index == 0:
+		return state
+
+	steps = tide_index // 2
+	neap_level, towards_springs, reversal_count, reversed_at_last_step = neap_dir.state_after(steps)
+
+	# The day neap level is kept from the start of the generation, or from the last
+	# springs or neaps, until the end of the current day
+	date = start_date + tide_index * time_delta
+	day_start = datetime.datetime.combine(date.date(), datetime.time())
+	day_first_index = _tide_index_on_or_after(start_date, time_delta, day_start)
+	day_neap_level = neap_dir.get_start() if day_first_index == 0 else None
+	for step in range(day_first_index // 2 + 1, steps + 1):
+		step_level, _, _, reversed_at_step = neap_dir.state_after(step)
+		if reversed_at_step:
+			day_neap_level = step_level
+
+	neap_dir.tide_range_should_increase = towards_springs
+	state.tide_index = tide_index
+	state.date = date
+	if tide_index % 2 == 1:
+		state.life_cycle = TideHeight.HW if start_life_cycle == TideHeight.LW else TideHeight.LW
+	state.neap_level = neap_level
+	state.neaps_cycle_count = tide_index % 2
+	# Tide hours repeat every four tides
+	for _ in range(tide_index % 4):
+		state.tide_hour, state.old_low_tide_hour = next_tide_hour(state.tide_hour, state.old_low_tide_hour)
+	state.reversal_count = reversal_count
+	# The current curve was built before the factors were adjusted for its own reversal
+	if should_vary_water_factors:
+		state.curve_water_factors = water_factors_after(
+			min_water_factor, max_water_factor, reversal_count - reversed_at_last_step)
+	state.day_neap_level = day_neap_level
+	return state
+
+
+# Generates tide days with heights and times, starting from
+# a specified date and neap level, yielding each day as soon as it is complete.
 # As the tide heights are added, neap level progresses in the indicated
 # direction (towards springs or neaps).
 # As a Springs or Neaps is reached, direction is reversed and the cycle
 # continues for the number of days to generate.
+# The neap direction, water factors and reversal state are carried across days,
+# so the generator can feed an unbounded horizon in constant memory.
 #
-# @param start_date: the date of the tide, a datetime object
-# @param heights_count: the number of heights to generate
-# @param days_count: the number of days to generate; if missing, it defaults to cycle_length
+# @param start_date: the date of the tide, a datetime object; defaults to the time of the call
+# @param heights_count: the number of heights to generate; None generates heights
+# indefinitely when days_count is missing, cycling through springs and neaps when
+# cycle_length is present
+# @param days_count: the number of days to generate; if missing, it defaults to cycle_length,
+# unless heights_count is None
 # @param cycle_length: the number of days in a neaps - springs cycle; if present, it overrides
 # heights_count and generates a full cycle
 # @param time_delta: the time difference between heights
@@ -130,125 +416,119 @@ class NeapDirection:
 # @param go_towards_springs: a boolean value that indicates
 # if the tide range should initially increase (i.e. progress towards springs),
 # or decrease (i.e. progress towards neaps)
-def generate_tide_days(start_date=datetime.datetime.now(),
-					   days_count=0, heights_count=1, cycle_length=0,
-					   time_delta=datetime.timedelta(hours=6, minutes=0),
-					   start_life_cycle=TideHeight.HW,
-					   min_water_factor=2, max_water_factor=5, go_towards_springs=True,
-					   start_days_after_neaps=None,
-					   should_vary_water_factors=False):
-
-	tide_days = []
-	tide_heights = []
-	old_a_date = start_date
-	current_life_cycle = start_life_cycle
-	reversal_count = 0  # Counter for the number of reversals
-	increase_factors = True  # Direction of adjustment, True for increase, False for decrease
-
-	if days_count == 0:
+# @param tide_model: the factory of the tide height functions, called with the water factors
+# and the neap level; defaults to semidiurnal_tide, see also ConstituentTide
+# @param state: a GenerationState to resume the generation from, e.g. from generation_state_at;
+# it overrides the other generation parameters and is advanced in place
+def iter_tide_days(start_date=None,
+				   days_count=0, heights_count=1, cycle_length=0,
+				   time_delta=datetime.timedelta(hours=6, minutes=0),
+				   start_life_cycle=TideHeight.HW,
+				   min_water_factor=2, max_water_factor=5, go_towards_springs=True,
+				   start_days_after_neaps=None,
+				   should_vary_water_factors=False,
+				   tide_model=semidiurnal_tide,
+				   state: GenerationState = None):
+
+	if days_count == 0 and heights_count is not None:
 		days_count = cycle_length
 	if days_count > 0:
 		heights_count = days_count * 4
 
-	neap_dir = NeapDirection(cycle_length=cycle_length,
-							 tide_range_should_increase=go_towards_springs,
-							 start_days_after_neaps=start_days_after_neaps)
-	neap_level = neap_dir.get_start()
-
-	compute_current_height = semidiurnal_tide(
-		min_water_factor=min_water_factor,
-		max_water_factor=max_water_factor,
-		neap_factor=neap_level
-	)
-
-	neaps_cycle_count = 0
-	old_neap_level = neap_level
-	tide_hour = 6 if current_life_cycle == TideHeight.HW else 0
-	old_low_tide_hour = 12 if tide_hour == 6 else 0
+	if state is None:
+		neap_dir = NeapDirection(cycle_length=cycle_length,
+								 tide_range_should_increase=go_towards_springs,
+								 start_days_after_neaps=start_days_after_neaps)
+		state = GenerationState(
+			date=datetime.datetime.now() if start_date is None else start_date,
+			time_delta=time_delta, life_cycle=start_life_cycle, neap_dir=neap_dir,
+			min_water_factor=min_water_factor, max_water_factor=max_water_factor,
+			should_vary_water_factors=should_vary_water_factors, tide_model=tide_model)
+
+	tide_heights = []
+	old_a_date = state.date
 	day_index = 0
-	for _ in range(0, heights_count):
-		tide_height = TideHeight(
-			time=start_date.time(),
-			height=compute_current_height(tide_hour),
-			life_cycle=current_life_cycle,
-			neap_level=neap_level,
-			compute_height = compute_current_height
-		)
-		tide_heights.append(tide_height)
-		current_life_cycle = TideHeight.HW if current_life_cycle == TideHeight.LW else TideHeight.LW
-
-		if tide_hour == 0:
-			tide_hour = 6
-		elif tide_hour == 6:
-			tide_hour = 12 if old_low_tide_hour == 0 else 0
-			old_low_tide_hour = tide_hour
-		else:
-			tide_hour = 6
-
-		start_date = start_date + time_delta
-
-		neaps_cycle_count += 1
-		if neaps_cycle_count == 2:
-			neap_level = neap_dir.get_next(neap_level)
-			compute_current_height = semidiurnal_tide(
-				min_water_factor=min_water_factor,
-				max_water_factor=max_water_factor,
-				neap_factor=neap_level
-			)
-			neaps_cycle_count = 0
-			if neap_dir.is_at_end(neap_level):
-				old_neap_level = neap_level
-				neap_dir.reverse()
-
-				if should_vary_water_factors:
-					reversal_count += 1
-
-					# Adjust the factors based on the current phase and reversal count
-					if reversal_count % 3 == 0:  # Change direction after every 3 reversals
-						increase_factors = not increase_factors
-
-					adjustment_min_abs = 0.04
-					adjustment_min = adjustment_min_abs if increase_factors else -adjustment_min_abs
-					adjustment_max_abs = 0.06
-					adjustment_max = adjustment_max_abs if increase_factors else -adjustment_max_abs
-					min_water_factor += adjustment_min
-					max_water_factor += adjustment_max
-			debug(f"neap_level: {neap_level:.2f}, start_date: {start_date}")
-
-		if start_date.day != old_a_date.day:
-			day_neap_level = neap_level
-			# old_neap_level is used for day 1 to make sure we start from the
+	heights_range = itertools.count() if heights_count is None else range(0, heights_count)
+	for _ in heights_range:
+		tide_heights.append(state.next_tide_height())
+
+		if state.date.day != old_a_date.day:
+			day_neap_level = state.neap_level
+			# day_neap_level is used for day 1 to make sure we start from the
 			# actual Neaps or Springs level
 			# also used when Neaps or Springs is in the middle of the generated array
-			if old_neap_level is not None:
-				day_neap_level = old_neap_level
-				old_neap_level = None
+			if state.day_neap_level is not None:
+				day_neap_level = state.day_neap_level
+				state.day_neap_level = None
 			tide_day = TideDay(
 				tide_date=old_a_date.date(),
 				neap_level=day_neap_level,
 				heights=tide_heights
 			)
-			tide_days.append(tide_day)
 			tide_heights = []
-			old_a_date = start_date
+			old_a_date = state.date
 			day_index += 1
 			debug(f"Adding new day #{day_index}, neap_level: {day_neap_level:.2f}, values")
 			debug_func(tide_day.print)
+			yield tide_day
 
 		if (days_count > 0) and (day_index == days_count):
 			break
 
-	if (days_count == 0 or len(tide_days) < days_count) and len(tide_heights) > 0:
+	if (days_count == 0 or day_index < days_count) and len(tide_heights) > 0:
 		tide_day = TideDay(
-			tide_date=start_date.date(),
-			neap_level=neap_level,
+			tide_date=state.date.date(),
+			neap_level=state.neap_level,
 			heights=tide_heights
 		)
-		debug(f"Adding last day, neap_level: {neap_level:.2f}, values")
+		debug(f"Adding last day, neap_level: {state.neap_level:.2f}, values")
 		debug_func(tide_day.print)
-		tide_days.append(tide_day)
+		yield tide_day
+
 
-	return tide_days
+# Generates the tide days of a window starting at window_date, without replaying the
+# generation from start_date: the generation state at the first tide of window_date is
+# computed in closed form, so the cost only depends on the window length.
+# The days are the same as those of a generation started at start_date.
+#
+# @param window_date: the date of the first day of the window, a datetime.date() object
+# @param days_count: the number of days in the window
+# See iter_tide_days for the other parameters.
+def generate_tide_days_window(window_date: datetime.date, days_count: int,
+							  start_date: datetime.datetime, cycle_length=0,
+							  time_delta=datetime.timedelta(hours=6, minutes=0),
+							  start_life_cycle=TideHeight.HW,
+							  min_water_factor=2, max_water_factor=5, go_towards_springs=True,
+							  start_days_after_neaps=None,
+							  should_vary_water_factors=False,
+							  tide_model=semidiurnal_tide):
+	tide_index = _tide_index_on_or_after(
+		start_date, time_delta, datetime.datetime.combine(window_date, datetime.time()))
+	state = generation_state_at(
+		tide_index, start_date=start_date, cycle_length=cycle_length, time_delta=time_delta,
+		start_life_cycle=start_life_cycle, min_water_factor=min_water_factor,
+		max_water_factor=max_water_factor, go_towards_springs=go_towards_springs,
+		start_days_after_neaps=start_days_after_neaps,
+		should_vary_water_factors=should_vary_water_factors, tide_model=tide_model)
+	return list(iter_tide_days(state=state, days_count=days_count))
+
+
+# Generates a list of tide days with heights and times, see iter_tide_days
+# for the parameters.
+def generate_tide_days(start_date=None,
+					   days_count=0, heights_count=1, cycle_length=0,
+					   time_delta=datetime.timedelta(hours=6, minutes=0),
+					   start_life_cycle=TideHeight.HW,
+					   min_water_factor=2, max_water_factor=5, go_towards_springs=True,
+					   start_days_after_neaps=None,
+					   should_vary_water_factors=False,
+					   tide_model=semidiurnal_tide):
+	return list(iter_tide_days(
+		start_date=start_date, days_count=days_count, heights_count=heights_count,
+		cycle_length=cycle_length, time_delta=time_delta, start_life_cycle=start_life_cycle,
+		min_water_factor=min_water_factor, max_water_factor=max_water_factor,
+		go_towards_springs=go_towards_springs, start_days_after_neaps=start_days_after_neaps,
+		should_vary_water_factors=should_vary_water_factors, tide_model=tide_model))
 
 
 def compute_max_hw(tide_days: list[TideDay]):
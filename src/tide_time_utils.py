@@ -1,8 +1,72 @@
 import datetime
 import random
 
+import numpy as np
+
 from src.tide_tables import TideHeight, TideDay
 
+# Reference of the integer minute timestamps used by the columnar tide tables
+EPOCH = datetime.datetime(1970, 1, 1)
+MINUTES_PER_DAY = 24 * 60
+MICROSECONDS_PER_MINUTE = 60 * 1000 * 1000
+MICROSECONDS_PER_DAY = MINUTES_PER_DAY * MICROSECONDS_PER_MINUTE
+
+
+def datetime_to_epoch_minutes(d: datetime.datetime):
+	"""Converts a naive datetime to whole minutes since EPOCH, dropping seconds."""
+	return (d - EPOCH) // datetime.timedelta(minutes=1)
+
+
+def epoch_minutes_to_datetime(minutes: int):
+	"""Converts minutes since EPOCH to a naive datetime."""
+	return EPOCH + datetime.timedelta(minutes=int(minutes))
+
+
+def datetime_to_epoch_microseconds(d: datetime.datetime):
+	"""Converts a naive datetime to microseconds since EPOCH."""
+	return (d - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def epoch_microseconds_to_datetime(microseconds: int):
+	"""Converts microseconds since EPOCH to a naive datetime."""
+	return EPOCH + datetime.timedelta(microseconds=int(microseconds))
+
+
+def time_to_microseconds(t: datetime.time):
+	"""Converts a datetime.time() to microseconds since midnight."""
+	return ((t.hour * 60 + t.minute) * 60 + t.second) * 1000000 + t.microsecond
+
+
+def microseconds_to_time(microseconds: int):
+	"""Converts microseconds since midnight, or since EPOCH, to the datetime.time() of that day."""
+	seconds, microsecond = divmod(int(microseconds) % MICROSECONDS_PER_DAY, 1000000)
+	minutes, second = divmod(seconds, 60)
+	return datetime.time(*divmod(minutes, 60), second, microsecond)
+
+
+def divide_round_half_even(numerator: int, denominator: int):
+	"""
+	Divides two integers, rounding half to even, like the division of a timedelta by an integer.
+	The denominator must be positive.
+	"""
+	quotient, remainder = divmod(numerator, denominator)
+	remainder *= 2
+	if remainder > denominator or (remainder == denominator and quotient % 2 == 1):
+		quotient += 1
+	return quotient
+
+
+def scale_microseconds(microseconds: int, factor: float):
+	"""Multiplies a duration in microseconds by a float, rounding like the product of a timedelta and a float."""
+	numerator, denominator = factor.as_integer_ratio()
+	return divide_round_half_even(microseconds * numerator, denominator)
+
+
+def epoch_minutes_to_time(minutes: int):
+	"""Converts minutes since EPOCH to the datetime.time() of that day."""
+	hour, minute = divmod(int(minutes) % MINUTES_PER_DAY, 60)
+	return datetime.time(hour, minute)
+
 
 def generate_random_time_between_tides(*, tide_days: list[TideDay],
 									   day_number: int, tide_number: int):
@@ -28,21 +92,21 @@ def generate_random_time_between_tides(*, tide_days: list[TideDay],
 		next_tide_day = tide_day  # No next day, so default to the current day
 		next_tide = TideHeight(time=datetime.time(23, 59))
 
-	# Convert tide times to datetime.datetime objects for easy manipulation
-	current_tide_datetime = datetime.datetime.combine(tide_day.date, current_tide.time)
-	next_tide_datetime = datetime.datetime.combine(next_tide_day.date, next_tide.time)
+	# Convert tide times to microseconds since the start of the current tide day
+	current_tide_time = time_to_microseconds(current_tide.time)
+	next_tide_time = (next_tide_day.date - tide_day.date).days * MICROSECONDS_PER_DAY + \
+		time_to_microseconds(next_tide.time)
 
-	# Generate a random datetime between the current tide and the next
-	if next_tide_datetime > current_tide_datetime:
-		random_datetime = current_tide_datetime + (
-					next_tide_datetime - current_tide_datetime) * random.random()
+	# Generate a random time between the current tide and the next
+	if next_tide_time > current_tide_time:
+		random_time = current_tide_time + scale_microseconds(next_tide_time - current_tide_time, random.random())
 	else:
-		# If next tide datetime is not greater (due to defaulting to 23:59), adjust logic as needed
-		# For simplicity, we default to current_tide_datetime for now
-		random_datetime = current_tide_datetime
+		# If next tide time is not greater (due to defaulting to 23:59), adjust logic as needed
+		# For simplicity, we default to current_tide_time for now
+		random_time = current_tide_time
 
-	# Return the time part of the random datetime
-	return random_datetime.time()
+	# Return the time part of the random time
+	return microseconds_to_time(random_time)
 
 
 def timedelta_to_twelve_based_tide_hours(td: datetime.timedelta):
@@ -68,3 +132,35 @@ def timedelta_to_twelve_based_tide_hours(td: datetime.timedelta):
 	return hours
 
 
+def offsets_to_seconds(offsets):
+	"""
+	Converts an array of offsets to float seconds, like `timedelta.total_seconds()`.
+
+	Parameters:
+	- offsets: a NumPy timedelta64 array, a sequence of timedeltas, or a float array of seconds.
+
+	Returns:
+	- A float64 array of seconds.
+	"""
+	offsets = np.asarray(offsets)
+	if offsets.dtype == object:
+		offsets = offsets.astype('timedelta64[us]')
+	if offsets.dtype.kind == 'm':
+		# total_seconds() divides the integer microseconds, exactly rounded
+		return offsets.astype('timedelta64[us]').astype(np.int64) / 1000000
+	return offsets.astype(float)
+
+
+def timedeltas_to_twelve_based_tide_hours(offsets):
+	"""
+	The array version of `timedelta_to_twelve_based_tide_hours`, with the same results.
+
+	Parameters:
+	- offsets: the offsets from HW, as accepted by `offsets_to_seconds`.
+
+	Returns:
+	- A float64 array of 12-based tide hours.
+	"""
+	hours = offsets_to_seconds(offsets) / 3600 + 6
+	hours = np.where(hours < 0, hours + 6, hours)
+	return np.where(hours > 12, hours - 12, hours)
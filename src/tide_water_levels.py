@@ -0,0 +1,118 @@
+import numpy as np
+
+from src.tide_columns import HW_CODE
+from src.tide_index import TideIndex
+from src.tide_model import HarmonicModel
+from src.tide_tables import TideDay
+
+MICROSECONDS_PER_HOUR = 3600 * 1000 * 1000
+
+
+class _HighWaterCurves:
+	"""
+	The curves of all the HWs of a table, evaluated for many (HW, tide hour) pairs at once: with a
+	single broadcast HarmonicModel when all the curves are harmonic, else one call per distinct HW.
+	"""
+
+	def __init__(self, curves: list):
+		self.curves = curves
+		self.parameters = None
+		if curves and all(isinstance(c, HarmonicModel) and c.shape == () for c in curves) and \
+				len({c.centered_on_hw for c in curves}) == 1:
+			self.parameters = {name: np.array([getattr(c, name) for c in curves], dtype=float)
+							   for name in ('min_water_factor', 'max_water_factor', 'neap_factor')}
+			self.centered_on_hw = curves[0].centered_on_hw
+
+	def __call__(self, hw: np.ndarray, tide_time: np.ndarray):
+		if self.parameters is not None:
+			model = HarmonicModel(**{name: values[hw] for name, values in self.parameters.items()},
+								  centered_on_hw=self.centered_on_hw)
+			return model(tide_time)
+		heights = np.empty(len(hw))
+		distinct_hws, hw_of = np.unique(hw, return_inverse=True)
+		for i, distinct_hw in enumerate(distinct_hws):
+			rows = hw_of == i
+			heights[rows] = self.curves[distinct_hw](tide_time[rows])
+		return heights
+
+
+def heights_at(tide_days: list[TideDay], timestamps, out: np.ndarray = None, *, index: TideIndex = None,
+			   chunk_size=1 << 16, with_brackets=False):
+	"""
+	Computes the tide height at many times, e.g. every minute of a year for a water level chart.
+
+	Each time is bracketed by the HW at or before it and the HW after it.  Like `TideIndex.height_at`,
+	each HW curve is evaluated at the 12-based tide hour of the time, 6 plus the hours since the HW.
+	The heights of the two curves are blended with a smoothstep weight of the position of the time
+	between the HWs, so the height is continuous across the changes of neap level and water factors,
+	and equals each HW curve at its HW.  Times before the first HW or after the last one only use
+	the closest HW curve.
+
+	Parameters:
+	- tide_days: List of TideDay objects, or a TideTable.
+	- timestamps: an array of numpy datetime64, e.g. a memory-mapped one, or a sequence of naive datetimes.
+	- out: an optional float array of the same length as `timestamps` to write the heights to,
+	  e.g. a `numpy.memmap`.
+	- index: an optional TideIndex of tide_days, built if not given.
+	- chunk_size: the number of times computed at once, bounding the temporary memory.
+	- with_brackets: whether to also return the tides around each time and its tide hour, e.g.
+	  to label the samples of a chart.
+
+	Returns:
+	- The float64 array of the heights, `out` if given.  With `with_brackets`, a tuple
+	  (heights, previous, next, tide_hours): the TideIndex ordinals of the tide at or before each
+	  time and of the tide after it, like `TideIndex.bracket_many`, with -1 where there is none,
+	  and the 12-based tide hour of each time on the curve of the HW at or before it, or of the
+	  first HW before it.
+	"""
+	if index is None:
+		index = TideIndex(tide_days)
+	hw_ordinals = np.flatnonzero(index.types == HW_CODE)
+	if len(hw_ordinals) == 0:
+		raise ValueError("No high water found in the provided data.")
+	hw_times = index.times[hw_ordinals]
+	curves = _HighWaterCurves([index.tide(int(o)).compute_height for o in hw_ordinals])
+
+	if not isinstance(timestamps, np.ndarray):
+		timestamps = np.asarray(timestamps, dtype='datetime64[us]')
+	if out is None:
+		out = np.empty(len(timestamps))
+	elif len(out) != len(timestamps):
+		raise ValueError(f"The output array has {len(out)} entries, for {len(timestamps)} timestamps.")
+
+	if with_brackets:
+		previous_tides = np.empty(len(timestamps), dtype=np.int64)
+		next_tides = np.empty(len(timestamps), dtype=np.int64)
+		tide_hours = np.empty(len(timestamps))
+
+	last_hw = len(hw_times) - 1
+	for start in range(0, len(timestamps), chunk_size):
+		times = timestamps[start:start + chunk_size].astype('datetime64[us]').astype(np.int64)
+		next_hw = np.searchsorted(hw_times, times, side='right')
+		previous_hw = np.maximum(next_hw - 1, 0)
+		next_hw = np.minimum(next_hw, last_hw)
+
+		previous_hours = (times - hw_times[previous_hw]) / MICROSECONDS_PER_HOUR
+		next_hours = (times - hw_times[next_hw]) / MICROSECONDS_PER_HOUR
+		span = hw_times[next_hw] - hw_times[previous_hw]
+		with np.errstate(divide='ignore', invalid='ignore'):
+			position = np.where(span > 0, (times - hw_times[previous_hw]) / span, 0.0)
+		# Before the first HW, only the first HW curve is used, from the position 1
+		position = np.where(times < hw_times[0], 1.0, np.clip(position, 0.0, 1.0))
+		weight = position * position * (3 - 2 * position)
+
+		heights = curves(next_hw, 6 + next_hours) * weight
+		has_previous = weight < 1
+		heights[has_previous] += curves(previous_hw[has_previous], 6 + previous_hours[has_previous]) * \
+			(1 - weight[has_previous])
+		out[start:start + len(times)] = heights
+
+		if with_brackets:
+			chunk = slice(start, start + len(times))
+			next_tides[chunk] = np.searchsorted(index.times, times, side='right')
+			previous_tides[chunk] = next_tides[chunk] - 1
+			next_tides[chunk] = np.where(next_tides[chunk] < index.tides_count, next_tides[chunk], -1)
+			tide_hours[chunk] = 6 + np.where(times < hw_times[0], next_hours, previous_hours)
+	if with_brackets:
+		return out, previous_tides, next_tides, tide_hours
+	return out
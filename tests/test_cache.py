@@ -0,0 +1,55 @@
+import datetime
+import os
+
+import numpy as np
+
+from src.tide_cache import TableCache
+from src.tide_columns import TideTable, generate_tide_table
+
+generation_params = dict(start_date=datetime.datetime(2024, 3, 1, 3, 10), cycle_length=7,
+						 time_delta=datetime.timedelta(hours=6, minutes=13), should_vary_water_factors=True)
+
+
+def test_repeated_generation_is_loaded(tmp_path):
+	cache = TableCache(tmp_path)
+	first = cache.generate_tide_table(**generation_params, days_count=40)
+	second = cache.generate_tide_table(**generation_params, days_count=40)
+	expected = generate_tide_table(**generation_params, days_count=40)
+	for name in TideTable.COLUMNS:
+		assert np.array_equal(getattr(first, name), getattr(expected, name)), name
+		assert np.array_equal(getattr(second, name), getattr(expected, name)), name
+	# Explicit defaults hit the same entry
+	cache.generate_tide_table(**generation_params, days_count=40, min_water_factor=2)
+	assert cache.stats() | dict(bytes=0) == dict(hits=2, misses=1, evictions=0, entries=1, bytes=0,
+												 max_bytes=cache.max_bytes)
+	assert [name for name in os.listdir(tmp_path) if not name.endswith(TableCache.SUFFIX)] == []
+
+
+def test_least_recently_used_tables_are_evicted(tmp_path):
+	cache = TableCache(tmp_path)
+	params = dict(generation_params, days_count=10)
+	for start_days_after_neaps in (1, 2):
+		cache.generate_tide_table(**params, start_days_after_neaps=start_days_after_neaps)
+	cache.max_bytes = cache.stats()['bytes']
+	os.utime(cache.path_of(cache.key(**params, start_days_after_neaps=1)), ns=(0, 0))
+	cache.generate_tide_table(**params, start_days_after_neaps=3)
+
+	assert cache.evictions == 1
+	assert not os.path.exists(cache.path_of(cache.key(**params, start_days_after_neaps=1)))
+	assert os.path.exists(cache.path_of(cache.key(**params, start_days_after_neaps=2)))
+
+
+def test_corrupt_files_are_generated_again(tmp_path):
+	cache = TableCache(tmp_path)
+	params = dict(generation_params, days_count=10)
+	expected = cache.generate_tide_table(**params)
+	path = cache.path_of(cache.key(**params))
+	size = os.path.getsize(path)
+	for content in (b'', b'garbage', open(path, 'rb').read()[:size - 100]):
+		with open(path, 'wb') as f:
+			f.write(content)
+		table = cache.generate_tide_table(**params)
+		for name in TideTable.COLUMNS:
+			assert np.array_equal(getattr(table, name), getattr(expected, name)), name
+	assert (cache.hits, cache.misses) == (0, 4)
+	assert os.path.getsize(path) == size
@@ -0,0 +1,92 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from src.tide_constituents import Constituent, ConstituentModel, ConstituentTide, \
+	BasisCache, CONSTITUENT_SPEEDS
+from src.tide_tables import reset_day, generate_tide_days, TideHeight
+
+
+def port_constituents():
+	return [
+		Constituent(name='M2', amplitude=1.8, phase=30),
+		Constituent(name='S2', amplitude=0.6, phase=60),
+		Constituent(name='N2', amplitude=0.35, phase=10),
+		Constituent(name='K2', amplitude=0.17, phase=62),
+		Constituent(name='K1', amplitude=0.1, phase=190),
+		Constituent(name='O1', amplitude=0.08, phase=40),
+		Constituent(name='P1', amplitude=0.03, phase=185),
+		Constituent(name='M4', amplitude=0.05, phase=120),
+	]
+
+
+def test_all_standard_constituents():
+	assert len(CONSTITUENT_SPEEDS) == 37
+	model = ConstituentModel(
+		[Constituent(name=name, amplitude=0.1, phase=i) for i, name in enumerate(CONSTITUENT_SPEEDS)],
+		datum=3.0)
+	tide_time = np.arange(0, 24 * 30, 1 / 60)
+	heights = model(tide_time)
+	assert heights.shape == tide_time.shape
+	for t in (0.0, 7.25, 100.5):
+		assert model(t) == pytest.approx(heights[int(round(t * 60))])
+
+
+def test_ports_share_basis():
+	cache = BasisCache()
+	tide_time = np.linspace(0, 48, 289)
+	port_a = ConstituentModel(port_constituents(), datum=2.0, basis_cache=cache)
+	port_b = ConstituentModel(
+		[Constituent(name=c.name, amplitude=c.amplitude * 2, phase=c.phase + 5) for c in port_constituents()],
+		basis_cache=cache)
+	assert port_a.basis(tide_time) is port_b.basis(tide_time)
+	assert port_b(tide_time) == pytest.approx([port_b(t) for t in tide_time])
+
+
+def test_basis_cache_is_bounded_by_bytes():
+	cache = BasisCache(max_bytes=300 * 16 * 8)
+	model = ConstituentModel(port_constituents(), datum=2.0, basis_cache=cache)
+	for count in (100, 150, 200):
+		model(np.linspace(0, 48, count))
+	assert cache.nbytes <= cache.max_bytes
+	assert len(cache._matrices) == 1
+
+	# Grids too large for the cache are evaluated in chunks, and not cached
+	tide_time = np.linspace(0, 24 * 40, 40 * 24 * 60).reshape(40, -1)
+	heights = model(tide_time)
+	assert cache.nbytes <= cache.max_bytes
+	assert heights.shape == tide_time.shape
+	expected = ConstituentModel(port_constituents(), datum=2.0, basis_cache=BasisCache(max_bytes=1 << 30))(tide_time)
+	np.testing.assert_allclose(heights, expected, atol=1e-12)
+
+
+def test_generate_with_constituent_tide():
+	tide_days = generate_tide_days(
+		start_date=(reset_day() + datetime.timedelta(hours=3, minutes=10)),
+		cycle_length=7, time_delta=datetime.timedelta(hours=6, minutes=20),
+		min_water_factor=1, max_water_factor=5,
+		tide_model=ConstituentTide(port_constituents()))
+	assert len(tide_days) == 7
+	for tide_day in tide_days:
+		for tide in tide_day.heights:
+			assert isinstance(tide.compute_height, ConstituentModel)
+			if tide.type == TideHeight.HW:
+				# The constituents have non-zero phases, the HW is still the highest water
+				assert tide.height == pytest.approx(tide.compute_height(np.arange(0, 24.84, 1 / 60)).max(), abs=1e-6)
+	springs_hw = tide_days[0].heights[0]
+	assert springs_hw.type == TideHeight.HW
+	assert springs_hw.height > tide_days[0].heights[1].height
+
+
+@pytest.mark.parametrize('constituents', [
+	port_constituents(),
+	[Constituent(name='M2', amplitude=1.0, phase=100), Constituent(name='K1', amplitude=0.4, phase=250)],
+])
+def test_constituent_curves_have_hw_at_tide_hour_6(constituents):
+	tide_model = ConstituentTide(constituents)
+	for neap_factor in (0.0, 2.5, 5.0):
+		curve = tide_model(min_water_factor=1, max_water_factor=5, neap_factor=neap_factor)
+		tide_time = np.arange(0, 24.84, 1 / 60)
+		assert curve.derivative(6.0) == pytest.approx(0, abs=1e-9)
+		assert curve(6.0) == pytest.approx(curve(tide_time).max(), abs=1e-6)
@@ -0,0 +1,40 @@
+import datetime
+import pickle
+
+from src.tide_curves import CurveRegistry, shared_curve_registry
+from src.tide_model import semidiurnal_tide, CURVE_QUANTUM
+from src.tide_tables import generate_tide_days
+
+
+def test_registry_interns_curves():
+	registry = CurveRegistry(maxsize=2)
+	curve = registry.get(semidiurnal_tide, min_water_factor=1.0, max_water_factor=4.0, neap_factor=2.5)
+	assert registry.get(semidiurnal_tide, min_water_factor=1, max_water_factor=4, neap_factor=2.5) is curve
+	assert registry.info() == dict(hits=1, misses=1, size=1, maxsize=2)
+	# Curves are built from the exact parameters
+	nearby = registry.get(semidiurnal_tide, min_water_factor=1.0, max_water_factor=4.0, neap_factor=2.5 + CURVE_QUANTUM / 4)
+	assert nearby is not curve and nearby.neap_factor == 2.5 + CURVE_QUANTUM / 4
+
+	registry.get(semidiurnal_tide, neap_factor=1.0)
+	registry.get(semidiurnal_tide, neap_factor=2.0)
+	assert len(registry) == 2
+	assert registry.get(semidiurnal_tide, min_water_factor=1.0, max_water_factor=4.0, neap_factor=2.5) is not curve
+	assert registry.misses == 5
+
+
+def test_generated_tides_share_curves():
+	tide_days = generate_tide_days(start_date=datetime.datetime(2024, 3, 1), days_count=60, cycle_length=7,
+								   time_delta=datetime.timedelta(hours=6, minutes=12))
+	tides = [tide for tide_day in tide_days for tide in tide_day.heights]
+	# One curve per neap level of the cycle, towards springs and towards neaps
+	assert len({id(tide.compute_height) for tide in tides}) == len({tide.neap_level for tide in tides}) <= 28
+	assert shared_curve_registry.hits > 0
+	for tide in tides:
+		expected = semidiurnal_tide(min_water_factor=2, max_water_factor=5, neap_factor=tide.neap_level)
+		assert tide.compute_height.neap_factor == tide.neap_level
+		assert tide.height in (expected(0), expected(6), expected(12))
+
+	curve = tide_days[0].heights[0].compute_height
+	copy = pickle.loads(pickle.dumps(curve))
+	assert copy == curve and hash(copy) == hash(curve)
+	assert copy(3.5) == curve(3.5)
@@ -1,9 +1,12 @@
 import datetime
 
+import numpy as np
 import pytest
 
-from src.tide_closest_hw import ClosestHighWater, find_closest_high_water
-from src.tide_tables import TideDay, TideHeight
+from src.tide_closest_hw import ClosestHighWater, find_closest_high_water, find_closest_high_waters, \
+	offsets_to_hw_hour_labels
+from src.tide_tables import TideDay, TideHeight, generate_tide_days
+from src.tide_time_utils import timedelta_to_twelve_based_tide_hours
 
 
 @pytest.fixture
@@ -133,3 +136,55 @@ def test_hw_zero_hour_difference():
 	hw_pos = ClosestHighWater(
 		time=datetime.time(12, 0), day_number=1, tide_number=2, hw_diff=td)
 	assert hw_pos.get_hw_hour_string() == "HW"
+
+
+@pytest.mark.parametrize('time_delta', [datetime.timedelta(hours=6), datetime.timedelta(hours=6, minutes=13)])
+def test_batch_matches_single_queries(time_delta):
+	tide_days = generate_tide_days(start_date=datetime.datetime(2024, 3, 1, 3, 10), days_count=10, cycle_length=7,
+								   time_delta=time_delta)
+	day_numbers, given_times = [], []
+	for day_number in range(1, 11):
+		for minutes in range(0, 24 * 60, 10):
+			day_numbers.append(day_number)
+			given_times.append(datetime.time(minutes // 60, minutes % 60))
+
+	closest = find_closest_high_waters(tide_days=tide_days, day_numbers=day_numbers, given_times=given_times)
+	labels = closest.hw_hour_strings()
+	tide_hours = closest.tide_hours()
+	for i, (day_number, given_time) in enumerate(zip(day_numbers, given_times)):
+		expected = find_closest_high_water(tide_days=tide_days, day_number=day_number, given_time=given_time)
+		assert (closest[i].time, closest[i].day_number, closest[i].tide_number, closest[i].hw_diff) == \
+			   (expected.time, expected.day_number, expected.tide_number, expected.hw_diff)
+		assert labels[i] == expected.get_hw_hour_string()
+		assert tide_hours[i] == timedelta_to_twelve_based_tide_hours(expected.hw_diff)
+
+	timestamps = [datetime.datetime(2024, 3, day_number, t.hour, t.minute) for day_number, t in zip(day_numbers, given_times)]
+	by_timestamps = find_closest_high_waters(tide_days=tide_days, timestamps=timestamps)
+	assert (by_timestamps.ordinals == closest.ordinals).all()
+	assert (by_timestamps.hw_diffs == closest.hw_diffs).all()
+
+
+def test_batch_breaks_ties_like_single_queries(sample_tide_days):
+	# 01:00 on day 2 is as close to 22:00 on day 1 as to 04:00 on day 2
+	day_numbers = [2, 2, 3, 3, 4, 1]
+	given_times = [datetime.time(1, 0), datetime.time(9, 30), datetime.time(9, 0), datetime.time(0, 0),
+				   datetime.time(21, 0), datetime.time(15, 0)]
+	closest = find_closest_high_waters(tide_days=sample_tide_days, day_numbers=day_numbers, given_times=given_times)
+	for i, (day_number, given_time) in enumerate(zip(day_numbers, given_times)):
+		expected = find_closest_high_water(tide_days=sample_tide_days, day_number=day_number, given_time=given_time)
+		assert (closest[i].day_number, closest[i].tide_number, closest[i].hw_diff) == \
+			   (expected.day_number, expected.tide_number, expected.hw_diff)
+
+
+def test_hw_hour_labels_match_single_labels():
+	offsets = [datetime.timedelta(minutes=m, seconds=s) for m in range(-15 * 60, 15 * 60, 7) for s in (-1, 0, 1, 59)]
+	offsets += [datetime.timedelta(minutes=30, seconds=59, microseconds=999999), datetime.timedelta(minutes=-30, seconds=-1)]
+	codes, labels = offsets_to_hw_hour_labels(np.array(offsets, dtype='timedelta64[us]'))
+	assert len(set(labels)) == len(labels)
+	for code, offset in zip(codes, offsets):
+		expected = ClosestHighWater(time=datetime.time(), day_number=1, tide_number=1, hw_diff=offset).get_hw_hour_string()
+		assert labels[code] == expected
+
+	other_codes, other_labels = offsets_to_hw_hour_labels(offsets[::-1])
+	assert (other_codes == codes[::-1]).all()
+	assert all(a is b for a, b in zip(labels, other_labels))
@@ -1,11 +1,14 @@
 import datetime
 
+import numpy as np
 import pytest
 
-from src.tide_height_intervals import determine_min_water_height_interval, \
-	determine_max_water_height_intervals
-from src.tide_model import semidiurnal_tide
-from src.tide_tables import TideDay, TideHeight
+from src.tide_height_intervals import determine_min_water_height_interval, determine_water_height_interval, \
+	determine_max_water_height_intervals, scan_height_windows, scan_fleet_height_windows
+from src.tide_height_find import BISECT, NEWTON, find_height_times, find_height_time_between_tides, solve_tide_hour
+from src.tide_index import TideIndex
+from src.tide_model import HarmonicModel, semidiurnal_tide
+from src.tide_tables import TideDay, TideHeight, generate_tide_days
 
 
 @pytest.fixture
@@ -172,3 +175,115 @@ def test_find_intervals_of_maximum_water_height_lw_is_last(sample_tide_days):
 	assert interval_after_hw.end.day_number == 4
 	assert interval_after_hw.end.time.time() == datetime.time(21, 40)
 
+
+@pytest.mark.parametrize('height_to_find', [3.2, 4.3, 5.5, 7.0, 1.0])
+def test_newton_solver_matches_bisection(sample_tide_days, height_to_find):
+	for day_number, tide_number in ((1, 1), (2, 3), (3, 1), (3, 3)):
+		expected = determine_min_water_height_interval(
+			tide_days=sample_tide_days, day_number=day_number, tide_number=tide_number,
+			height_to_find=height_to_find)
+		interval = determine_min_water_height_interval(
+			tide_days=sample_tide_days, day_number=day_number, tide_number=tide_number,
+			height_to_find=height_to_find, solver=NEWTON)
+		for point, expected_point in ((interval.start, expected.start), (interval.end, expected.end)):
+			# Bisection stops at most a minute before the root
+			assert datetime.timedelta(0) <= point.time - expected_point.time <= datetime.timedelta(minutes=1)
+			assert point.time.second == 0 and point.time.microsecond == 0
+
+
+def test_multi_height_solver_matches_single_solves():
+	tide_days = generate_tide_days(start_date=datetime.datetime(2024, 3, 1, 3, 10), days_count=6, cycle_length=7,
+								   time_delta=datetime.timedelta(hours=6, minutes=13),
+								   min_water_factor=2, max_water_factor=5)
+	index = TideIndex(tide_days)
+	heights = np.arange(0, 8, 0.25)
+	times = find_height_times(tide_days=tide_days, heights_to_find=heights, index=index)
+	assert times.shape == (index.tides_count - 1, len(heights))
+
+	crossings = 0
+	for ordinal in range(index.tides_count - 1):
+		first_tide, second_tide = index.tide(ordinal), index.tide(ordinal + 1)
+		first_day_number, _ = index.position(ordinal)
+		second_day_number, _ = index.position(ordinal + 1)
+		hw = first_tide if first_tide.type == TideHeight.HW else second_tide
+		tide_hours = (6, 12) if first_tide.type == TideHeight.HW else (0, 6)
+		low, high = sorted(hw.compute_height(h) for h in tide_hours)
+		for height, time in zip(heights, times[ordinal]):
+			if not low <= height <= high:
+				assert np.isnat(time)
+				continue
+			day_number, expected = find_height_time_between_tides(
+				height_to_find=height, first_tide_info=(first_tide, first_day_number),
+				second_tide_info=(second_tide, second_day_number), compute_height_for_hw=True,
+				compute_height_for_first_tide=first_tide.type == TideHeight.HW, solver=NEWTON)
+			date = index.datetime_of(ordinal).date() + datetime.timedelta(days=day_number - first_day_number)
+			assert time.astype(datetime.datetime) == datetime.datetime.combine(date, expected.time())
+			crossings += 1
+	assert crossings > 100
+
+
+@pytest.mark.parametrize('above', [True, False])
+def test_scan_height_windows_matches_intervals(above):
+	tide_days = generate_tide_days(start_date=datetime.datetime(2024, 3, 1, 3, 10), days_count=15, cycle_length=7,
+								   time_delta=datetime.timedelta(hours=6, minutes=13),
+								   min_water_factor=2, max_water_factor=5)
+	index = TideIndex(tide_days)
+	life_cycle = TideHeight.HW if above else TideHeight.LW
+	windows = scan_height_windows(tide_days, 4.3, above=above, index=index)
+
+	expected = []
+	for ordinal in range(index.tides_count):
+		if index.tide(ordinal).type != life_cycle:
+			continue
+		day_number, tide_number = index.position(ordinal)
+		interval = determine_water_height_interval(
+			life_cycle=life_cycle, tide_days=tide_days, day_number=day_number, tide_number=tide_number,
+			height_to_find=4.3, index=index, solver=NEWTON)
+		date = index.datetime_of(ordinal).date()
+		expected.append([datetime.datetime.combine(date + datetime.timedelta(days=point.day_number - day_number),
+												   point.time.time())
+						 for point in (interval.start, interval.end)])
+	assert [[t.astype(datetime.datetime) for t in window] for window in windows] == expected
+
+	start, end = expected[3][1], expected[6][0]
+	assert len(scan_height_windows(tide_days, 4.3, above=above, start=start, end=end, index=index)) == 4
+
+
+def test_scan_fleet_height_windows_matches_single_scans():
+	tide_days = generate_tide_days(start_date=datetime.datetime(2024, 3, 1, 3, 10), days_count=15, cycle_length=7,
+								   time_delta=datetime.timedelta(hours=6, minutes=13),
+								   min_water_factor=2, max_water_factor=5)
+	index = TideIndex(tide_days)
+	heights = [5.5, 1.0, 4.3, 9.0, 4.3, 2.2]
+	for above in (True, False):
+		windows = scan_fleet_height_windows(tide_days, heights, above=above, index=index)
+		assert len(windows) == len(heights)
+		for height, height_windows in zip(heights, windows):
+			np.testing.assert_array_equal(height_windows, scan_height_windows(tide_days, height, above=above, index=index))
+
+
+def test_height_time_across_midnight():
+	curve = HarmonicModel(min_water_factor=2, max_water_factor=5, neap_factor=0)
+	hw = TideHeight(time=datetime.time(21, 0), height=curve(6), life_cycle=TideHeight.HW, compute_height=curve)
+	lw = TideHeight(time=datetime.time(3, 20), height=curve(12), life_cycle=TideHeight.LW, compute_height=curve)
+	results = {solver: find_height_time_between_tides(
+		height_to_find=curve(9.5), first_tide_info=(hw, 7), second_tide_info=(lw, 8),
+		compute_height_for_hw=True, compute_height_for_first_tide=True, solver=solver) for solver in (BISECT, NEWTON)}
+	# 3.5 tide hours of 6h20 after 21:00, on the deterministic reference date of the first tide
+	assert results[NEWTON] == (8, datetime.datetime(1970, 1, 2, 0, 41))
+	assert results[BISECT][0] == 8
+	assert abs(results[BISECT][1] - results[NEWTON][1]) <= datetime.timedelta(minutes=1)
+
+
+def test_newton_solver_terminates_on_reversed_brackets():
+	curve = HarmonicModel(min_water_factor=2, max_water_factor=5, neap_factor=0)
+	lw = TideHeight(time=datetime.time(22, 10), height=curve(0), life_cycle=TideHeight.LW, compute_height=curve)
+	hw = TideHeight(time=datetime.time(16, 0), height=curve(6), life_cycle=TideHeight.HW, compute_height=curve)
+	# The second tide comes before the first one, the duration of the bracket is negative
+	day_number, time = find_height_time_between_tides(
+		height_to_find=curve(3), first_tide_info=(lw, 1), second_tide_info=(hw, 1),
+		compute_height_for_hw=True, compute_height_for_first_tide=False, solver=NEWTON)
+	assert day_number == 1
+	assert datetime.time(16, 0) <= time.time() <= datetime.time(22, 10)
+
+	assert solve_tide_hour(curve, curve(3), 0, 6, tolerance=-1) == pytest.approx(3, abs=1e-6)
@@ -1,4 +1,6 @@
-from src.tide_model import semidiurnal_tide
+import numpy as np
+
+from src.tide_model import semidiurnal_tide, HarmonicModel, NEAP_MAX
 
 
 def truncate(value):
@@ -65,3 +67,22 @@ def test_heights():
 	assert neaps_lw < neaps_hw
 	assert neaps_hw < springs_hw
 
+
+def test_harmonic_model_grid_matches_single_curves():
+	tide_factors = dict(min_water_factor=2, max_water_factor=5)
+	neap_levels = np.linspace(0, NEAP_MAX, 18)
+	tide_hours = np.linspace(0, 12, 73)
+	grid = HarmonicModel(**tide_factors, neap_factor=neap_levels).grid(tide_hours)
+	assert grid.shape == (18, 73)
+	for row, neap_level in zip(grid, neap_levels):
+		compute_height = semidiurnal_tide(**tide_factors, neap_factor=neap_level)
+		assert (row == compute_height(tide_hours)).all()
+		assert row[6 * 6] == compute_height(6)
+
+
+def test_harmonic_model_derivative():
+	compute_height = semidiurnal_tide(min_water_factor=2, max_water_factor=5, neap_factor=1.7)
+	tide_hours = np.linspace(0, 12, 49)
+	step = 1e-6
+	finite_differences = (compute_height(tide_hours + step) - compute_height(tide_hours - step)) / (2 * step)
+	assert np.allclose(compute_height.derivative(tide_hours), finite_differences, atol=1e-6)
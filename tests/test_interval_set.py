@@ -0,0 +1,109 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from src.tide_columns import HW_CODE, generate_tide_table
+from src.tide_height_find import NEWTON
+from src.tide_height_intervals import determine_min_water_height_interval, determine_max_water_height_intervals, \
+	scan_height_windows
+from src.tide_interval_set import IntervalSet
+from src.tide_index import TideIndex
+
+SPAN = 2000
+
+
+def random_set(rng, count):
+	starts = rng.integers(0, SPAN - 50, count)
+	return IntervalSet(starts, starts + rng.integers(0, 50, count))
+
+
+def covered(interval_set: IntervalSet):
+	minutes = np.zeros(SPAN, dtype=bool)
+	for start, end in zip(interval_set.starts, interval_set.ends):
+		minutes[start:end] = True
+	return minutes
+
+
+def minute(m: int):
+	return np.datetime64(m, 'm')
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_set_algebra_matches_minute_masks(seed):
+	rng = np.random.default_rng(seed)
+	a, b = random_set(rng, 40), random_set(rng, 30)
+	for interval_set in (a, b):
+		assert (interval_set.starts[1:] > interval_set.ends[:-1]).all()
+		assert (interval_set.starts < interval_set.ends).all()
+
+	assert np.array_equal(covered(a | b), covered(a) | covered(b))
+	assert np.array_equal(covered(a & b), covered(a) & covered(b))
+	assert np.array_equal(covered(a - b), covered(a) & ~covered(b))
+	assert a & b == b & a
+	assert a | b == b | a
+
+	complement = a.complement(minute(100), minute(1500))
+	expected = ~covered(a)
+	expected[:100] = expected[1500:] = False
+	assert np.array_equal(covered(complement), expected)
+
+	long = a.longer_than(datetime.timedelta(minutes=30))
+	assert (long.ends - long.starts >= 30).all()
+	assert len(long) == np.sum(a.ends - a.starts >= 30)
+
+	merged = a.merge_adjacent(np.timedelta64(20, 'm'))
+	assert (merged.starts[1:] - merged.ends[:-1] > 20).all()
+	assert covered(merged)[covered(a)].all()
+	assert merged.duration == a.duration + datetime.timedelta(
+		minutes=int(np.sum(np.where(a.starts[1:] - a.ends[:-1] <= 20, a.starts[1:] - a.ends[:-1], 0))))
+
+
+def test_empty_sets():
+	empty = IntervalSet()
+	a = IntervalSet([10, 30], [20, 40])
+	assert len(empty) == 0
+	assert a | empty == a
+	assert len(a & empty) == 0
+	assert a - empty == a
+	assert len(empty - a) == 0
+	assert empty.complement(minute(0), minute(50)) == IntervalSet([0], [50])
+	assert a.complement(minute(0), minute(50)) == IntervalSet([0, 20, 40], [10, 30, 50])
+
+
+def test_daily_windows_span_midnight():
+	start = datetime.datetime(2024, 3, 1, 12)
+	nights = IntervalSet.daily(start, start + datetime.timedelta(days=3), datetime.time(22), datetime.time(6))
+	assert nights.windows.astype(datetime.datetime).tolist() == [
+		[datetime.datetime(2024, 3, day, 22), datetime.datetime(2024, 3, day + 1, 6)] for day in (1, 2, 3)]
+
+
+def test_combined_tide_windows():
+	table = generate_tide_table(start_date=datetime.datetime(2024, 3, 1, 3, 10), days_count=10, cycle_length=7,
+								time_delta=datetime.timedelta(hours=6, minutes=13))
+	index = TideIndex(table)
+	initial_date = table[0].date
+	hw_positions = [index.position(o) for o in np.flatnonzero(index.types == HW_CODE)]
+
+	high = IntervalSet.from_intervals(
+		[determine_min_water_height_interval(tide_days=table, day_number=day_number, tide_number=tide_number,
+											 height_to_find=4.3, index=index, solver=NEWTON)
+		 for day_number, tide_number in hw_positions], initial_date)
+	low = IntervalSet.from_intervals(
+		[interval for day_number, tide_number in hw_positions[1:-1]
+		 for interval in determine_max_water_height_intervals(tide_days=table, day_number=day_number,
+															  tide_number=tide_number, height_to_find=1.2, index=index,
+															  solver=NEWTON)],
+		initial_date)
+	assert high == IntervalSet.from_windows(scan_height_windows(table, 4.3, index=index))
+	# The LW windows before the first HW and after the last HW are missing
+	scanned_low = IntervalSet.from_windows(scan_height_windows(table, 1.2, above=False, index=index))
+	assert low == scanned_low & IntervalSet(low.starts[:1], low.ends[-1:])
+	assert len(high & low) == 0
+
+	start = datetime.datetime.combine(initial_date, datetime.time())
+	operating = IntervalSet.daily(start, start + datetime.timedelta(days=10), datetime.time(6), datetime.time(20))
+	workable = (high | low) & operating
+	assert len(workable) > 0
+	assert workable.duration <= high.duration + low.duration
+	assert ((workable - operating).duration, (workable - high - low).duration) == (datetime.timedelta(0),) * 2
@@ -0,0 +1,54 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from src.tide_height_find import solve_tide_hour, LOOKUP, NEWTON
+from src.tide_height_intervals import determine_max_water_height_intervals
+from src.tide_inverse import InverseCurve, InverseCurveCache, shared_inverse_cache
+from src.tide_model import semidiurnal_tide
+from src.tide_tables import generate_tide_days
+
+
+@pytest.mark.parametrize('neap_factor', [0, 1.3, 3.0, 5.0])
+def test_inverse_curve_matches_exact_solver(neap_factor):
+	compute_height = semidiurnal_tide(min_water_factor=2, max_water_factor=5, neap_factor=neap_factor)
+	inverse = InverseCurve(compute_height)
+	assert inverse.max_error < 1e-3
+	for start, end in ((0, 6), (6, 12)):
+		low, high = sorted((compute_height(start), compute_height(end)))
+		for height in np.linspace(low, high, 200)[1:-1]:
+			expected = solve_tide_hour(compute_height, height, start, end, tolerance=1e-12)
+			assert abs(inverse.tide_hour(height, start, end) - expected) <= inverse.max_error
+		# Heights the limb does not reach clamp like the bisection
+		assert inverse.tide_hour(high + 1, start, end) == solve_tide_hour(compute_height, high + 1, start, end, 1e-9)
+		assert inverse.tide_hour(low - 1, start, end) == solve_tide_hour(compute_height, low - 1, start, end, 1e-9)
+
+
+def test_inverse_cache_shares_equal_curves():
+	cache = InverseCurveCache(maxsize=2)
+	inverse = cache.get(semidiurnal_tide(neap_factor=2.0))
+	assert cache.get(semidiurnal_tide(neap_factor=2.0)) is inverse
+	cache.get(semidiurnal_tide(neap_factor=3.0))
+	cache.get(semidiurnal_tide(neap_factor=4.0))
+	assert len(cache) == 2
+	assert cache.get(semidiurnal_tide(neap_factor=2.0)) is not inverse
+
+
+def test_lookup_solver_within_max_error():
+	tide_days = generate_tide_days(start_date=datetime.datetime(2024, 3, 1, 3, 10), days_count=20, cycle_length=7,
+								   time_delta=datetime.timedelta(hours=6, minutes=13),
+								   min_water_factor=2, max_water_factor=5)
+	# A tide hour spans about a twelfth of the 12h26 of a semidiurnal tide
+	max_error = max(shared_inverse_cache.get(tide.compute_height).max_error
+					for tide_day in tide_days for tide in tide_day.heights) * \
+		datetime.timedelta(hours=6, minutes=13) / 6 + datetime.timedelta(minutes=1)
+	for day_number in range(2, 19):
+		for height in (3.0, 4.0, 5.0):
+			expected = determine_max_water_height_intervals(tide_days=tide_days, day_number=day_number, tide_number=2,
+															height_to_find=height, solver=NEWTON)
+			intervals = determine_max_water_height_intervals(tide_days=tide_days, day_number=day_number, tide_number=2,
+															 height_to_find=height, solver=LOOKUP)
+			for interval, expected_interval in zip(intervals, expected):
+				assert abs(interval.start.time - expected_interval.start.time) <= max_error
+				assert abs(interval.end.time - expected_interval.end.time) <= max_error
@@ -1,7 +1,9 @@
 import datetime
+import itertools
 
 from src.tide_model import NEAP_MAX
-from src.tide_tables import reset_day, TideHeight, generate_tide_days, \
+from src.tide_tables import reset_day, TideHeight, generate_tide_days, iter_tide_days, water_factors_after, \
+	generate_tide_days_window, generation_state_at, \
 	compute_max_hw, compute_springs_mean, \
 	compute_max_lw, compute_neaps_mean
 from tests.libtest import systest_get_hw, systest_get_lw, \
@@ -193,3 +195,70 @@ def test_generate_four_neaps_four_springs_has_variations():
 	assert abs(first_neaps_lw - fourth_neaps_lw) < 0.4
 	assert abs(first_springs_hw - fourth_springs_hw) < 0.4
 	assert abs(first_springs_lw - fourth_springs_lw) < 0.4
+
+
+# The last tide of some days of the original generation loop, with the parameters of
+# test_unbounded_iter_tide_days_matches_loop: (day index, date, day neap level, time, type, height)
+LOOP_DAYS = [
+	(0, datetime.date(2024, 3, 1), 1.0, datetime.time(22, 10), TideHeight.LW, 2.699791708967345),
+	(7, datetime.date(2024, 3, 8), 4.000000000000001, datetime.time(18, 50), TideHeight.LW, 3.0986468964539147),
+	(50, datetime.date(2024, 4, 20), 3.0, datetime.time(19, 10), TideHeight.HW, 5.969617133155879),
+	(123, datetime.date(2024, 7, 2), 0.666666666666667, datetime.time(21, 30), TideHeight.LW, 2.7106436387577673),
+	(250, datetime.date(2024, 11, 6), 0.666666666666667, datetime.time(19, 50), TideHeight.HW, 6.4967426387335285),
+	(399, datetime.date(2025, 4, 4), 3.666666666666667, datetime.time(22, 10), TideHeight.LW, 3.1038429353643555),
+]
+
+
+def test_unbounded_iter_tide_days_matches_loop():
+	params = dict(
+		start_date=datetime.datetime(2024, 3, 1, 3, 10),
+		cycle_length=8, time_delta=datetime.timedelta(hours=6, minutes=20),
+		go_towards_springs=False, start_days_after_neaps=6,
+		should_vary_water_factors=True)
+
+	# An unbounded feed keeps cycling through springs and neaps
+	tide_days = list(itertools.islice(iter_tide_days(heights_count=None, **params), 400))
+	for day_index, date, neap_level, time, life_cycle, height in LOOP_DAYS:
+		tide_day = tide_days[day_index]
+		assert (tide_day.date, tide_day.neap_level) == (date, neap_level)
+		assert (tide_day.heights[-1].time, tide_day.heights[-1].type, tide_day.heights[-1].height) == \
+			   (time, life_cycle, height)
+	neap_levels = [tide_day.neap_level for tide_day in tide_days]
+	assert neap_levels.count(0.0) > 20 and neap_levels.count(NEAP_MAX) > 20
+
+	assert len(generate_tide_days(**params)) == 8
+	assert len(list(itertools.islice(iter_tide_days(days_count=60, **params), 45))) == 45
+
+
+def test_window_matches_generation_from_start():
+	params = dict(
+		start_date=(reset_day() + datetime.timedelta(hours=3, minutes=10)),
+		cycle_length=8, time_delta=datetime.timedelta(hours=6, minutes=20),
+		go_towards_springs=False, start_days_after_neaps=6,
+		should_vary_water_factors=True)
+	tide_days = generate_tide_days(days_count=3 * 365, **params)
+
+	for first_day in (0, 1, 200, 3 * 365 - 10):
+		window = generate_tide_days_window(tide_days[first_day].date, 10, **params)
+		assert len(window) == 10
+		for tide_day, window_day in zip(tide_days[first_day:], window):
+			assert window_day.date == tide_day.date
+			assert window_day.neap_level == tide_day.neap_level
+			assert [(t.time, t.type, t.height) for t in window_day.heights] == \
+				   [(t.time, t.type, t.height) for t in tide_day.heights]
+
+	state = generation_state_at(4 * 365 * 20, **params)
+	assert state.neap_level == generation_state_at(4 * 365 * 20 + 1, **params).neap_level
+	assert 0 <= state.neap_level <= NEAP_MAX
+	assert state.reversal_count > 900
+
+
+def test_water_factors_after_add_the_adjustments_one_at_a_time():
+	min_water_factor, max_water_factor = 2, 5
+	increase_factors = True
+	for reversal_count in range(1, 100):
+		if reversal_count % 3 == 0:
+			increase_factors = not increase_factors
+		min_water_factor += 0.04 if increase_factors else -0.04
+		max_water_factor += 0.06 if increase_factors else -0.06
+		assert water_factors_after(2, 5, reversal_count) == (min_water_factor, max_water_factor)
@@ -0,0 +1,62 @@
+import datetime
+import pickle
+
+from src.tide_closest_hw import find_closest_high_water
+from src.tide_columns import TideTable, generate_tide_table
+from src.tide_constituents import Constituent, ConstituentTide
+from src.tide_height_intervals import determine_min_water_height_interval
+from src.tide_pool import run_queries, MinWaterIntervalQuery, ClosestHighWaterQuery
+from src.tide_shared import publish_table, attach_table
+from src.tide_tables import generate_tide_days, TideHeight
+
+
+def test_tide_days_and_tables_are_picklable():
+	tide_model = ConstituentTide([Constituent(name='M2', amplitude=1.8, phase=30),
+								  Constituent(name='S2', amplitude=0.6, phase=60)])
+	tide_days = generate_tide_days(start_date=datetime.datetime(2024, 3, 1), days_count=10, cycle_length=7,
+								   min_water_factor=1.0, max_water_factor=4.0, tide_model=tide_model)
+	copy = pickle.loads(pickle.dumps(tide_days))
+	tide, copied_tide = tide_days[3].heights[1], copy[3].heights[1]
+	assert copied_tide.time == tide.time and copied_tide.height == tide.height
+	assert copied_tide.compute_height(4.2) == tide.compute_height(4.2)
+	assert pickle.loads(pickle.dumps(TideHeight())).compute_height(1.0) == 0.0
+
+	table = generate_tide_table(start_date=datetime.datetime(2024, 3, 1), days_count=10, cycle_length=7)
+	copied_table = pickle.loads(pickle.dumps(table))
+	assert (copied_table.heights == table.heights).all()
+	assert copied_table.curve(5)(3.0) == table.curve(5)(3.0)
+
+
+def test_run_queries_matches_serial_calls():
+	table = generate_tide_table(start_date=datetime.datetime(2024, 3, 1), days_count=30, cycle_length=7,
+								min_water_factor=1.0, max_water_factor=4.0)
+	queries = []
+	for day_number in range(2, 29):
+		queries.append(MinWaterIntervalQuery(day_number=day_number, tide_number=1, height_to_find=2.5))
+		queries.append(ClosestHighWaterQuery(day_number=day_number, given_time=datetime.time(13, 15)))
+
+	results = run_queries(table, queries, max_workers=2)
+	assert len(results) == len(queries)
+	for query, result in zip(queries, results):
+		if isinstance(query, MinWaterIntervalQuery):
+			expected = determine_min_water_height_interval(
+				tide_days=table, day_number=query.day_number, tide_number=1, height_to_find=2.5)
+			assert (result.start.day_number, result.start.time.time(), result.end.day_number, result.end.time.time()) == \
+				   (expected.start.day_number, expected.start.time.time(), expected.end.day_number, expected.end.time.time())
+		else:
+			expected = find_closest_high_water(tide_days=table, day_number=query.day_number,
+											   given_time=query.given_time)
+			assert (result.time, result.day_number, result.tide_number, result.hw_diff) == \
+				   (expected.time, expected.day_number, expected.tide_number, expected.hw_diff)
+
+
+def test_attached_table_shares_the_published_columns():
+	table = generate_tide_table(start_date=datetime.datetime(2024, 3, 1), days_count=20, cycle_length=7,
+								should_vary_water_factors=True)
+	with publish_table(table) as shared_table:
+		attached = attach_table(pickle.loads(pickle.dumps(shared_table.handle)))
+		for name in TideTable.COLUMNS:
+			assert (getattr(attached, name) == getattr(table, name)).all(), name
+		assert not attached.heights.flags.writeable
+		assert attached[4].heights[1].height == table[4].heights[1].height
+		assert attached.curve(17)(2.0) == table.curve(17)(2.0)
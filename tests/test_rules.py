@@ -0,0 +1,119 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from src.tide_columns import generate_tide_table, extend
+from src.tide_height_intervals import scan_height_windows
+from src.tide_interval_set import IntervalSet, as_epoch_minutes
+from src.tide_rules import ClearanceRule, RuleEngine
+
+generation_params = dict(start_date=datetime.datetime(2024, 3, 1, 3, 10), cycle_length=7,
+						 time_delta=datetime.timedelta(hours=6, minutes=13), should_vary_water_factors=True)
+
+rules = [
+	ClearanceRule('deep', draft=4.0, under_keel_clearance=0.5),
+	ClearanceRule('deep by day', draft=4.0, under_keel_clearance=0.5,
+				  daily_start=datetime.time(6), daily_end=datetime.time(20)),
+	ClearanceRule('shallow by night', draft=2.5, daily_start=datetime.time(20), daily_end=datetime.time(6)),
+	ClearanceRule('air draft', draft=3.0, above=False),
+]
+
+
+def in_daily_range(t: np.datetime64, rule: ClearanceRule):
+	minutes = int(t.astype(np.int64)) % (24 * 60)
+	start = rule.daily_start.hour * 60 + rule.daily_start.minute
+	end = rule.daily_end.hour * 60 + rule.daily_end.minute
+	return start <= minutes <= end if start < end else minutes >= start or minutes <= end
+
+
+def test_rule_windows():
+	table = generate_tide_table(**generation_params, days_count=30)
+	engine = RuleEngine(table, rules)
+
+	np.testing.assert_array_equal(engine['deep'].windows, scan_height_windows(table, 4.5))
+	np.testing.assert_array_equal(engine['air draft'].windows, scan_height_windows(table, 3.0, above=False))
+
+	for name, threshold in (('deep by day', 4.5), ('shallow by night', 2.5)):
+		rule = engine.rules[name]
+		windows = engine[name].windows
+		assert len(windows) > 0
+		height_windows = scan_height_windows(table, threshold)
+		for start, end in windows:
+			assert start < end
+			assert in_daily_range(start, rule) and in_daily_range(end, rule)
+			assert ((height_windows[:, 0] <= start) & (end <= height_windows[:, 1])).any()
+
+
+def test_window_queries():
+	table = generate_tide_table(**generation_params, days_count=30)
+	engine = RuleEngine(table, rules)
+	index = engine['deep by day']
+	windows = index.windows
+	start, end = windows[5, 0] + np.timedelta64(10, 'm'), windows[9, 1] - np.timedelta64(10, 'm')
+
+	np.testing.assert_array_equal(index.overlapping(start, end), windows[5:10])
+	np.testing.assert_array_equal(index.within(start, end), windows[6:9])
+	np.testing.assert_array_equal(index.containing(start), windows[5])
+	np.testing.assert_array_equal(index.containing(windows[5, 1] - np.timedelta64(1, 'm')), windows[5])
+	assert index.containing(windows[5, 1]) is None
+	np.testing.assert_array_equal(index.next_after(start), windows[6])
+	assert index.next_after(windows[-1, 0]) is None
+
+	when = windows[3, 0].astype(datetime.datetime)
+	upcoming = engine.upcoming('deep by day', when)
+	assert len(upcoming) > 0
+	assert (upcoming[:, 0] <= np.datetime64(when + datetime.timedelta(days=14), 'm')).all()
+	np.testing.assert_array_equal(upcoming[0], windows[3])
+
+
+def test_window_queries_agree_with_set_algebra():
+	table = generate_tide_table(**generation_params, days_count=30)
+	index = RuleEngine(table, rules)['deep by day']
+	one_minute = np.timedelta64(1, 'm')
+	for t in index.windows.ravel():
+		for when in (t - one_minute, t, t + one_minute):
+			query = IntervalSet([as_epoch_minutes(when)], [as_epoch_minutes(when + one_minute)])
+			assert (index.containing(when) is not None) == (len(index & query) > 0)
+			for end in (when + one_minute, when + 60 * one_minute):
+				query = IntervalSet([as_epoch_minutes(when)], [as_epoch_minutes(end)])
+				assert len(index.overlapping(when, end)) == len(index & query)
+
+
+def test_duplicate_rule_name():
+	engine = RuleEngine(generate_tide_table(**generation_params, days_count=5), rules)
+	with pytest.raises(ValueError):
+		engine.add_rules([ClearanceRule('deep', draft=1.0)])
+	engine.remove_rule('deep')
+	engine.add_rules([ClearanceRule('deep', draft=1.0)])
+	assert len(engine['deep']) > 0
+
+
+def test_removed_thresholds_are_not_solved_again():
+	table = generate_tide_table(**generation_params, days_count=10)
+	engine = RuleEngine(table, rules)
+	for i in range(20):
+		engine.add_rules([ClearanceRule(f'temporary {i}', draft=1.0 + i / 10)])
+		engine.remove_rule(f'temporary {i}')
+	# 'deep by day' still uses the threshold of 'deep'
+	engine.remove_rule('deep')
+	assert sorted(engine._windows[True]) == [2.5, 4.5]
+	assert sorted(engine._windows[False]) == [3.0]
+
+	extend(table, 5)
+	engine.refresh()
+	expected = RuleEngine(generate_tide_table(**generation_params, days_count=15), rules)
+	np.testing.assert_array_equal(engine['deep by day'].windows, expected['deep by day'].windows)
+
+
+def test_refresh_after_extend_matches_full_evaluation():
+	table = generate_tide_table(**generation_params, days_count=20)
+	engine = RuleEngine(table, rules)
+	extend(table, 10)
+	solved = engine.refresh()
+	assert 0 < solved < table.tides_count / 2
+
+	expected = RuleEngine(generate_tide_table(**generation_params, days_count=30), rules)
+	for rule in rules:
+		np.testing.assert_array_equal(engine[rule.name].windows, expected[rule.name].windows)
+	assert engine.refresh() == 0
@@ -0,0 +1,66 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from src.tide_columns import TideTable, generate_tide_table
+from src.tide_constituents import Constituent, ConstituentTide
+from src.tide_find import find_this_or_next_water, find_previous_tide
+from src.tide_height_intervals import determine_min_water_height_interval
+from src import tide_model
+from src.tide_storage import save_table, load_table, read_table_header
+from src.tide_tables import TideHeight
+
+generation_params = dict(start_date=datetime.datetime(2024, 3, 1, 3, 10), days_count=60, cycle_length=7,
+						 time_delta=datetime.timedelta(hours=6, minutes=13),
+						 min_water_factor=1.0, max_water_factor=4.0, should_vary_water_factors=True)
+
+
+def test_round_trip_reproduces_queries(tmp_path):
+	table = generate_tide_table(**generation_params)
+	save_table(tmp_path / 'port.tide', table, parameters=generation_params)
+	loaded = load_table(tmp_path / 'port.tide')
+
+	assert read_table_header(tmp_path / 'port.tide')['parameters'] == generation_params
+	for name in TideTable.COLUMNS:
+		column = getattr(loaded, name)
+		assert column.dtype == getattr(table, name).dtype
+		assert np.array_equal(column, getattr(table, name)), name
+	assert not loaded.times.flags.writeable
+
+	for day_number in range(2, 59):
+		for tide_days in (table, loaded):
+			tide, hw_day_number, hw_tide_number = find_this_or_next_water(
+				tide_days=tide_days, life_cycle=TideHeight.HW, day_number=day_number, tide_number=2)
+			interval = determine_min_water_height_interval(
+				tide_days=tide_days, day_number=day_number, tide_number=2, height_to_find=2.5)
+			previous_tide = find_previous_tide(tide_days=tide_days, day_number=hw_day_number, tide_number=hw_tide_number)
+			if tide_days is table:
+				expected = (tide.time, hw_day_number, hw_tide_number, interval.start.time, interval.end.time,
+							previous_tide[0].time)
+		assert (tide.time, hw_day_number, hw_tide_number, interval.start.time, interval.end.time,
+				previous_tide[0].time) == expected
+
+
+def test_round_trip_keeps_the_constituent_model(tmp_path):
+	tide_model = ConstituentTide([Constituent(name='M2', amplitude=1.8, phase=30),
+								  Constituent(name='S2', amplitude=0.6, phase=60)])
+	table = generate_tide_table(**dict(generation_params, tide_model=tide_model))
+	save_table(tmp_path / 'port.tide', table)
+	loaded = load_table(tmp_path / 'port.tide')
+	assert loaded.tide_model.to_dict() == tide_model.to_dict()
+	assert loaded.curve(33)(4.5) == table.curve(33)(4.5)
+
+
+def test_load_rejects_other_files(tmp_path):
+	(tmp_path / 'other.bin').write_bytes(b'not a tide table')
+	with pytest.raises(ValueError):
+		load_table(tmp_path / 'other.bin')
+
+
+def test_load_rejects_changed_model_coefficients(tmp_path, monkeypatch):
+	save_table(tmp_path / 'port.tide', generate_tide_table(**dict(generation_params, days_count=5)))
+	load_table(tmp_path / 'port.tide')
+	monkeypatch.setattr(tide_model.HarmonicModel, 'SOLAR_SPEED', 30.1)
+	with pytest.raises(ValueError, match='coefficients'):
+		load_table(tmp_path / 'port.tide')
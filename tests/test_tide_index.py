@@ -0,0 +1,85 @@
+import datetime
+
+import pytest
+
+from src.tide_columns import TideTable
+from src.tide_find import find_previous_tide, find_next_tide, find_this_or_next_water
+from src.tide_height_intervals import determine_min_water_height_interval, determine_max_water_height_intervals
+from src.tide_index import TideIndex
+from src.tide_tables import generate_tide_days, TideHeight
+
+
+def interval_times(interval):
+	return interval.start.day_number, interval.start.time.time(), interval.end.day_number, interval.end.time.time()
+
+
+@pytest.fixture(params=['list', 'table'])
+def tide_days(request):
+	tide_days = generate_tide_days(start_date=datetime.datetime(2024, 3, 1, 3, 10), days_count=20, cycle_length=7,
+								   time_delta=datetime.timedelta(hours=6, minutes=13))
+	return tide_days if request.param == 'list' else TideTable.from_tide_days(tide_days)
+
+
+def test_index_lookups_match_scans(tide_days):
+	index = TideIndex(tide_days)
+	ordinal = 0
+	for day_number, tide_day in enumerate(tide_days, start=1):
+		for tide_number in range(1, len(tide_day.heights) + 1):
+			assert index.ordinal(day_number, tide_number) == ordinal
+			assert index.position(ordinal) == (day_number, tide_number)
+			ordinal += 1
+			for find in (find_previous_tide, find_next_tide):
+				expected = find(tide_days=tide_days, day_number=day_number, tide_number=tide_number)
+				assert find(tide_days=tide_days, day_number=day_number, tide_number=tide_number, index=index) == expected
+			for life_cycle in (TideHeight.HW, TideHeight.LW):
+				try:
+					expected = find_this_or_next_water(tide_days=tide_days, life_cycle=life_cycle,
+													   day_number=day_number, tide_number=tide_number)
+				except (ValueError, AttributeError):
+					continue
+				assert find_this_or_next_water(tide_days=tide_days, life_cycle=life_cycle, day_number=day_number,
+											   tide_number=tide_number, index=index) == expected
+	assert ordinal == index.tides_count
+	assert index.previous_of_type(5, TideHeight.HW) == 3 + index.types[0]
+
+
+def test_intervals_with_index_match(tide_days):
+	index = TideIndex(tide_days)
+	for day_number in range(2, 19):
+		expected = determine_min_water_height_interval(tide_days=tide_days, day_number=day_number, tide_number=2,
+													   height_to_find=3.5)
+		interval = determine_min_water_height_interval(tide_days=tide_days, day_number=day_number, tide_number=2,
+													   height_to_find=3.5, index=index)
+		assert interval_times(interval) == interval_times(expected)
+		expected = determine_max_water_height_intervals(tide_days=tide_days, day_number=day_number, tide_number=2,
+														height_to_find=3.5)
+		intervals = determine_max_water_height_intervals(tide_days=tide_days, day_number=day_number, tide_number=2,
+														 height_to_find=3.5, index=index)
+		assert [interval_times(i) for i in intervals] == [interval_times(i) for i in expected]
+
+
+def test_bracket_finds_surrounding_tides(tide_days):
+	index = TideIndex(tide_days)
+	start = datetime.datetime.combine(tide_days[0].date, tide_days[0].heights[0].time)
+	timestamps = [start + datetime.timedelta(minutes=37 * k) for k in range(-3, 800)]
+	previous_ordinals, next_ordinals = index.bracket_many(timestamps)
+	for when, previous_ordinal, next_ordinal in zip(timestamps, previous_ordinals, next_ordinals):
+		(previous, _, _), (following, _, _) = index.bracket(when)
+		if previous is None:
+			assert previous_ordinal == -1 and when < start
+		else:
+			assert previous == index.tide(previous_ordinal)
+			assert index.datetime_of(previous_ordinal) <= when
+		if following is None:
+			assert next_ordinal == -1
+		else:
+			assert following == index.tide(next_ordinal) and index.datetime_of(next_ordinal) > when
+			assert next_ordinal == previous_ordinal + 1
+
+	assert index.tide_at(timestamps[100]) == index.bracket(timestamps[100])
+
+	# At a high water, the height is the height of the high water
+	day_number, tide_number = index.position(index.next_of_type(3, TideHeight.HW))
+	hw = tide_days[day_number - 1].heights[tide_number - 1]
+	assert index.height_at(datetime.datetime.combine(tide_days[day_number - 1].date, hw.time)) == \
+		   pytest.approx(hw.height, abs=1e-5)
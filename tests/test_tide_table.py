@@ -0,0 +1,114 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from src.tide_closest_hw import find_closest_high_water
+from src.tide_columns import TideTable, TideHeightView, generate_tide_table, extend
+from src.tide_height_intervals import determine_min_water_height_interval
+from src.tide_tables import reset_day, generate_tide_days, TideHeight, \
+	compute_max_hw, compute_max_lw, compute_springs_mean, compute_neaps_mean
+
+generation_params = dict(
+	start_date=(reset_day() + datetime.timedelta(hours=3, minutes=10)),
+	heights_count=0, days_count=30, cycle_length=8,
+	time_delta=datetime.timedelta(hours=6, minutes=20),
+	go_towards_springs=False, start_days_after_neaps=6,
+	should_vary_water_factors=True)
+
+
+def test_table_views_match_tide_days():
+	tide_days = generate_tide_days(**generation_params)
+	table = generate_tide_table(**generation_params)
+	assert len(table) == len(tide_days) == 30
+	assert table.nbytes / table.tides_count < 26
+
+	for tide_day, day_view in zip(tide_days, table):
+		assert day_view.date == tide_day.date
+		assert day_view.neap_level == pytest.approx(tide_day.neap_level)
+		assert len(day_view.heights) == len(tide_day.heights)
+		for tide, view in zip(tide_day.heights, day_view.heights):
+			assert view.time == tide.time
+			assert view.type == tide.type
+			assert view.height == pytest.approx(tide.height, abs=1e-5)
+			assert view.compute_height(3.5) == pytest.approx(tide.compute_height(3.5), abs=1e-5)
+			assert view.compute_height is tide.compute_height
+
+	assert table.max_height(TideHeight.HW) == pytest.approx(compute_max_hw(tide_days), abs=1e-5)
+	assert table.max_height(TideHeight.LW) == pytest.approx(compute_max_lw(tide_days), abs=1e-5)
+	assert compute_springs_mean(table) == pytest.approx(compute_springs_mean(tide_days), abs=1e-5)
+	assert compute_neaps_mean(table) == pytest.approx(compute_neaps_mean(tide_days), abs=1e-5)
+
+
+def test_queries_on_table():
+	tide_days = generate_tide_days(**generation_params)
+	table = TideTable.from_tide_days(tide_days)
+
+	closest_hw = find_closest_high_water(tide_days=table, day_number=4, given_time=datetime.time(13, 37))
+	expected = find_closest_high_water(tide_days=tide_days, day_number=4, given_time=datetime.time(13, 37))
+	assert (closest_hw.day_number, closest_hw.tide_number, closest_hw.hw_diff) == \
+		   (expected.day_number, expected.tide_number, expected.hw_diff)
+
+	interval = determine_min_water_height_interval(
+		tide_days=table, day_number=5, tide_number=2, height_to_find=4.3)
+	expected = determine_min_water_height_interval(
+		tide_days=tide_days, day_number=5, tide_number=2, height_to_find=4.3)
+	assert interval.start.time.time() == expected.start.time.time()
+	assert interval.end.time.time() == expected.end.time.time()
+
+
+def test_views_are_read_only_and_comparable():
+	table = generate_tide_table(**generation_params)
+	tide = table[2].heights[1]
+	assert tide == TideHeightView(table, tide.index)
+	assert table[2].heights.index(tide) == 1
+	with pytest.raises(AttributeError):
+		tide.height = 1.0
+	assert [t.time for t in table.to_tide_days()[-1].heights] == [t.time for t in table[-1].heights]
+
+
+@pytest.mark.parametrize('params', [
+	generation_params,
+	dict(generation_params, days_count=0, heights_count=7, start_life_cycle=TideHeight.LW),
+	dict(generation_params, days_count=200, cycle_length=9, go_towards_springs=True, start_days_after_neaps=None),
+	dict(generation_params, days_count=3, time_delta=datetime.timedelta(hours=5, minutes=10)),
+	dict(generation_params, days_count=365, start_date=datetime.datetime(2024, 1, 1, 3, 10, 45),
+		 time_delta=datetime.timedelta(hours=6, minutes=12, seconds=30)),
+])
+def test_bulk_generation_matches_loop(params):
+	expected = TideTable.from_tide_days(generate_tide_days(**params))
+	table = generate_tide_table(**params)
+	for column in ('times', 'heights', 'types', 'neap_levels', 'day_offsets', 'day_neap_levels',
+				   'factor_starts', 'min_water_factors', 'max_water_factors'):
+		assert (getattr(table, column) == getattr(expected, column)).all(), column
+
+
+@pytest.mark.parametrize('time_delta', [datetime.timedelta(hours=6, minutes=13), datetime.timedelta(hours=5, minutes=10),
+										datetime.timedelta(hours=6, minutes=12, seconds=30)])
+def test_extend_matches_single_generation(time_delta):
+	params = dict(start_date=datetime.datetime(2024, 3, 1, 3, 10), cycle_length=7,
+				  time_delta=time_delta, should_vary_water_factors=True)
+	table = generate_tide_table(days_count=5, **params)
+	for days in (3, 17, 40):
+		extend(table, days)
+
+	expected = generate_tide_table(days_count=80, **params)
+	tides_count, days_count = table.tides_count, len(table)
+	for column in ('times', 'heights', 'types', 'neap_levels'):
+		assert (getattr(table, column) == getattr(expected, column)[:tides_count]).all(), column
+	assert (table.day_offsets[:-1] == expected.day_offsets[:days_count]).all()
+	assert (table.day_neap_levels[:-1] == expected.day_neap_levels[:days_count - 1]).all()
+
+
+def test_append_keeps_previously_read_columns():
+	params = dict(start_date=datetime.datetime(2024, 3, 1, 3, 10), time_delta=datetime.timedelta(hours=6, minutes=13))
+	table = generate_tide_table(heights_count=7, **params)
+	extend(table, 3)
+	columns = {name: getattr(table, name) for name in TideTable.COLUMNS}
+	copies = {name: column.copy() for name, column in columns.items()}
+	# The first day of the appended table continues the last day of the table
+	table.append(generate_tide_table(heights_count=2, **dict(params, start_date=table.state.date)),
+				 merge_first_day=True)
+	for name, column in columns.items():
+		assert np.array_equal(column, copies[name]), name
+	assert table.day_offsets[len(copies['day_offsets']) - 1] > copies['day_offsets'][-1]
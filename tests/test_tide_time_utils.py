@@ -1,12 +1,14 @@
 import datetime
 
+import numpy as np
 import pytest
 
 from datetime import timedelta
 
 from src.tide_time_utils import generate_random_time_between_tides, \
-	timedelta_to_twelve_based_tide_hours
-from src.tide_tables import TideHeight, TideDay
+	timedelta_to_twelve_based_tide_hours, divide_round_half_even, scale_microseconds, \
+	time_to_microseconds, microseconds_to_time, timedeltas_to_twelve_based_tide_hours
+from src.tide_tables import TideHeight, TideDay, reset_day
 
 
 @pytest.fixture
@@ -52,3 +54,29 @@ def test_timedelta_to_twelve_based_tide_hours():
 	assert timedelta_to_twelve_based_tide_hours(timedelta(hours=6)) == 12.0
 	assert timedelta_to_twelve_based_tide_hours(timedelta(hours=2, minutes=30)) == 8.5
 	assert timedelta_to_twelve_based_tide_hours(timedelta(hours=7)) == 1
+
+
+def test_timedeltas_to_twelve_based_tide_hours():
+	offsets = [timedelta(minutes=m, microseconds=u) for m in range(-15 * 60, 15 * 60, 11) for u in (-1, 0, 1)]
+	expected = [timedelta_to_twelve_based_tide_hours(offset) for offset in offsets]
+	assert timedeltas_to_twelve_based_tide_hours(np.array(offsets, dtype='timedelta64[us]')).tolist() == expected
+	assert timedeltas_to_twelve_based_tide_hours(offsets).tolist() == expected
+	assert timedeltas_to_twelve_based_tide_hours([offset.total_seconds() for offset in offsets]).tolist() == expected
+
+
+@pytest.mark.parametrize('microseconds', [0, 1, 3, 5, 7, -7, 86_399_999_999, 22_380_000_001, -22_380_000_001])
+def test_integer_time_arithmetic_matches_timedelta(microseconds):
+	duration = timedelta(microseconds=microseconds)
+	for divisor in (1, 2, 3, 4):
+		assert divide_round_half_even(microseconds, divisor) == duration / divisor // timedelta(microseconds=1)
+	for factor in (0.0, 0.5, 0.1, 1 / 3, 0.999999, 2.5):
+		assert scale_microseconds(microseconds, factor) == duration * factor // timedelta(microseconds=1)
+	time = microseconds_to_time(microseconds)
+	assert time == (datetime.datetime(2024, 1, 2) + duration).time()
+	assert time_to_microseconds(time) == microseconds % (24 * 3600 * 1000 * 1000)
+
+
+def test_defaults_do_not_depend_on_import_time():
+	assert reset_day(datetime.datetime(2024, 3, 17, 5, 6)) == datetime.datetime(2024, 3, 1)
+	assert reset_day() == datetime.datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+	assert TideHeight().time == datetime.time()
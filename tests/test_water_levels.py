@@ -0,0 +1,81 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from src.tide_columns import HW_CODE, generate_tide_table
+from src.tide_constituents import Constituent, ConstituentTide
+from src.tide_index import TideIndex
+from src.tide_tables import TideHeight, generate_tide_days
+from src.tide_water_levels import heights_at
+
+generation_params = dict(start_date=datetime.datetime(2024, 3, 1, 3, 10), days_count=20, cycle_length=7,
+						 time_delta=datetime.timedelta(hours=6, minutes=13), should_vary_water_factors=True)
+
+
+def minutes_of(table):
+	start = np.datetime64(table[0].date, 'm')
+	return np.arange(start, start + np.timedelta64(len(table), 'D'), np.timedelta64(1, 'm'))
+
+
+def test_heights_at_high_waters_and_near_them():
+	table = generate_tide_table(**generation_params)
+	index = TideIndex(table)
+	hws = [index.datetime_of(o) for o in np.flatnonzero(index.types == HW_CODE)]
+	np.testing.assert_allclose(heights_at(table, hws, index=index), [index.height_at(hw) for hw in hws], atol=1e-9)
+
+	near = [hw + datetime.timedelta(minutes=m) for hw in hws[1:-1] for m in (-45, 30)]
+	np.testing.assert_allclose(heights_at(table, near, index=index), [index.height_at(t) for t in near], atol=0.02)
+
+
+def test_heights_are_continuous():
+	table = generate_tide_table(**generation_params)
+	heights = heights_at(table, minutes_of(table))
+	assert np.abs(np.diff(heights)).max() < 0.02
+	assert np.abs(np.diff(heights, 2)).max() < 1e-3
+
+
+def test_chunks_output_and_tide_days(tmp_path):
+	table = generate_tide_table(**generation_params)
+	timestamps = minutes_of(table)
+	expected = heights_at(table, timestamps)
+
+	out = np.lib.format.open_memmap(tmp_path / 'heights.npy', mode='w+', dtype=np.float32, shape=timestamps.shape)
+	assert heights_at(table, timestamps, out=out, chunk_size=1000) is out
+	np.testing.assert_allclose(out, expected, rtol=1e-6)
+	np.testing.assert_allclose(heights_at(generate_tide_days(**generation_params), timestamps), expected, atol=1e-5)
+
+	with pytest.raises(ValueError):
+		heights_at(table, timestamps, out=np.empty(10))
+
+
+def test_heights_with_brackets():
+	table = generate_tide_table(**generation_params)
+	index = TideIndex(table)
+	timestamps = minutes_of(table)[::37]
+	heights, previous, following, tide_hours = heights_at(table, timestamps, index=index, with_brackets=True,
+														  chunk_size=100)
+	np.testing.assert_array_equal(heights, heights_at(table, timestamps, index=index))
+	expected_previous, expected_following = index.bracket_many(timestamps)
+	np.testing.assert_array_equal(previous, expected_previous)
+	np.testing.assert_array_equal(following, expected_following)
+
+	hws = np.flatnonzero(index.types == HW_CODE)
+	for t, tide_hour in zip(timestamps[::50], tide_hours[::50]):
+		hw = index.previous_of_type(int(index.bracket_many([t])[0][0]) + 1, TideHeight.HW)
+		if hw < 0:
+			hw = hws[0]
+		hours = (t - np.datetime64(index.datetime_of(int(hw)), 'us')) / np.timedelta64(1, 'h')
+		assert tide_hour == pytest.approx(6 + hours)
+
+
+def test_constituent_curves():
+	tide_model = ConstituentTide([Constituent(name='M2', amplitude=1.8, phase=30),
+								  Constituent(name='S2', amplitude=0.6, phase=60)])
+	table = generate_tide_table(**generation_params, tide_model=tide_model)
+	index = TideIndex(table)
+	timestamps = minutes_of(table)[::7]
+	heights = heights_at(table, timestamps, index=index)
+	assert np.isfinite(heights).all()
+	hw = index.datetime_of(int(np.flatnonzero(index.types == HW_CODE)[3]))
+	assert heights_at(table, [hw], index=index)[0] == pytest.approx(index.height_at(hw))